@@ -7,6 +7,7 @@ from tkcalendar import DateEntry
 import os
 import version_info
 import sys
+import multiprocessing
 import pytz
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
@@ -21,6 +22,9 @@ import settings_manager
 import report_selection_window 
 import customtkinter as ctk 
 
+# در نسخه exe، پروسس‌های فرزندِ وارد کردن همزمان چند فایل باید قبل از ساخت پنجره‌ها اینجا متوقف شوند
+multiprocessing.freeze_support()
+
 db_manager.migrate_database()
 
 APP_VERSION = version_info.__version__
@@ -41,7 +45,7 @@ screen_height = root.winfo_screenheight()
 
 # ابعاد فرم اصلی
 main_form_width = 450
-main_form_height = 750
+main_form_height = 785
 
 # محاسبه موقعیت: 5% از بالا و سمت چپ (با یک فاصله مشخص)
 x_position = 50 
@@ -189,8 +193,18 @@ def refresh_error_checkboxes():
 
 
 def update_trade_count():
-    count = db_manager.get_total_trades_count()
-    trade_count_label.config(text=f"📈 تعداد تریدها: {count}")
+    # شمارنده‌ها از جداول خلاصه‌ای خوانده می‌شوند که تریگرهای دیتابیس به‌روز نگه می‌دارند (بدون اسکن تریدها)
+    summary = db_manager.get_trade_summary()
+    symbol_counts = db_manager.get_symbol_trade_counts()
+    summary_lines = [
+        f"📈 تعداد تریدها: {summary['trade_count']}",
+        f"✅ سود: {summary['profit_count']}   ❌ ضرر: {summary['loss_count']}   ⚖️ ریسک فری: {summary['rf_count']}",
+        f"💰 سود/ضرر کل: {summary['total_profit']}",
+    ]
+    if symbol_counts:
+        top_symbols = sorted(symbol_counts.items(), key=lambda item: item[1], reverse=True)[:5]
+        summary_lines.append(" | ".join(f"{symbol}: {count}" for symbol, count in top_symbols))
+    trade_count_label.config(text="\n".join(summary_lines))
 
 def add_labeled_entry(row, label_text, widget):
     label = tk.Label(main_frame, text=label_text, anchor='e', width=15)
@@ -287,23 +301,51 @@ def edit_errors_window(open_toplevel_windows_list=None): # <<< آرگومان ج
         if not selected:
             messagebox.showwarning("هشدار", "هیچ خطایی انتخاب نشده است.")
             return
-        
-        eid = selected[0]
-        err_text = tree.item(eid)["values"][0]
-        count = tree.item(eid)["values"][1]
 
-        if count > 0:
-            messagebox.showwarning("خطا", "فقط خطاهایی که استفاده نشده‌اند قابل حذف هستند.")
+        used_count = sum(int(tree.item(eid)["values"][1]) for eid in selected)
+        if used_count > 0 and not messagebox.askyesno(
+                "تأیید حذف",
+                f"خطاهای انتخاب شده در {used_count} مورد از تریدها استفاده شده‌اند.\n"
+                "آیا می‌خواهید از لیست و از همه این تریدها حذف شوند؟",
+                parent=window):
             return
-        
-        if db_manager.delete_error_from_list(eid):
-            tree.delete(eid)
+
+        if db_manager.delete_errors([int(eid) for eid in selected]) is not None:
             messagebox.showinfo("موفقیت", "خطا با موفقیت حذف شد.")
             refresh_error_checkboxes()
             refresh_edit_errors_treeview()
         else:
             messagebox.showerror("خطا", "خطایی در حذف خطا رخ داد.")
 
+    def merge_selected():
+        selected = tree.selection()
+        if len(selected) < 2:
+            messagebox.showwarning("هشدار", "برای ادغام حداقل دو خطا را انتخاب کنید.")
+            return
+
+        selected_titles = {str(tree.item(eid)["values"][0]): int(eid) for eid in selected}
+        most_used_eid = max(selected, key=lambda eid: int(tree.item(eid)["values"][1]))
+        target_title = simpledialog.askstring(
+            "ادغام خطاها",
+            "عنوان خطایی که بقیه در آن ادغام شوند:\n" + "\n".join(selected_titles),
+            initialvalue=str(tree.item(most_used_eid)["values"][0]),
+            parent=window)
+        if not target_title:
+            return
+
+        target_eid = selected_titles.get(target_title.strip())
+        if target_eid is None:
+            messagebox.showerror("خطا", "عنوان مقصد باید یکی از خطاهای انتخاب شده باشد.")
+            return
+
+        updated_count = db_manager.merge_errors(list(selected_titles.values()), target_eid)
+        if updated_count is not None:
+            messagebox.showinfo("موفقیت", f"خطاها ادغام شدند ({updated_count} ترید به‌روزرسانی شد).")
+            refresh_error_checkboxes()
+            refresh_edit_errors_treeview()
+        else:
+            messagebox.showerror("خطا", "خطایی در ادغام خطاها رخ داد.")
+
     def rename_selected():
         selected = tree.selection()
         if not selected:
@@ -351,6 +393,7 @@ def edit_errors_window(open_toplevel_windows_list=None): # <<< آرگومان ج
     # استفاده از ttk.Button برای دکمه‌ها
     ttk.Button(btn_frame, text="🗑 حذف", command=delete_selected).pack(side=tk.LEFT, padx=5) # <<< تغییر به ttk.Button
     ttk.Button(btn_frame, text="✏️ تغییر عنوان", command=rename_selected).pack(side=tk.LEFT, padx=5) # <<< تغییر به ttk.Button
+    ttk.Button(btn_frame, text="🔗 ادغام", command=merge_selected).pack(side=tk.LEFT, padx=5)
 
     tk.Label(add_error_section_frame, text="", anchor='w').pack(side=tk.LEFT, padx=5)
     new_error_entry = tk.Entry(add_error_section_frame, width=30)
@@ -361,8 +404,9 @@ def edit_errors_window(open_toplevel_windows_list=None): # <<< آرگومان ج
 
 def select_report_file():
     file_path = filedialog.askopenfilename(
-        title="انتخاب فایل گزارش اکسل متاتریدر 5",
-        filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
+        title="انتخاب فایل گزارش متاتریدر 5",
+        filetypes=[("MT5 reports", "*.xlsx *.html *.htm *.csv"), ("Excel files", "*.xlsx"),
+                   ("HTML files", "*.html *.htm"), ("CSV files", "*.csv"), ("All files", "*.*")]
     )
     if file_path:
         report_file_path_var.set(file_path)
@@ -381,12 +425,54 @@ def import_trades_from_report():
         report_file_path_var.set("")
         return
 
+    # فایل‌های خیلی بزرگ: بدون پیش‌نمایش و به صورت جریانی (دسته به دسته) وارد می‌شوند
+    if os.path.getsize(file_path) >= mt5_importer.STREAMING_IMPORT_MIN_FILE_SIZE:
+        use_streaming = messagebox.askyesno(
+            "فایل بزرگ",
+            "حجم این فایل زیاد است. آیا می‌خواهید تریدها بدون پیش‌نمایش و به صورت دسته‌ای مستقیماً وارد دیتابیس شوند؟\n"
+            "(تریدهای تکراری به طور خودکار رد می‌شوند)"
+        )
+        if use_streaming:
+            try:
+                imported_count, total_rows, duplicate_count, error_count, error_message = \
+                    mt5_importer.import_mt5_report_streaming(file_path)
+                if error_message:
+                    messagebox.showerror("خطا در وارد کردن",
+                                         f"خطایی در حین پردازش فایل رخ داد: {error_message}\n"
+                                         f"تعداد تریدهایی که قبل از خطا وارد شده‌اند: {imported_count}")
+                    update_trade_count()
+                    return
+                messagebox.showinfo("وارد کردن موفق",
+                                    f"تعداد ردیف‌های بخش Positions: {total_rows}\n"
+                                    f"تعداد تریدهای وارد شده: {imported_count}\n"
+                                    f"تعداد تریدهای تکراری: {duplicate_count}\n"
+                                    f"تعداد ردیف‌های رد شده (غیرمعتبر/فیلتر شده): {error_count}")
+                update_trade_count()
+            except Exception as e:
+                messagebox.showerror("خطا در وارد کردن", f"خطایی در حین پردازش فایل رخ داد: {e}")
+                print(f"Detailed import error: {e}")
+            return
+
     try:
-        prepared_trades_list, total_in_file, duplicate_count, error_count = \
-            mt5_importer.process_mt5_report_for_preview(file_path)
+        # اگر این فایل قبلاً وارد شده باشد، فقط ردیف‌های بعد از آخرین وارد کردن پردازش می‌شوند
+        prepared_trades_list, total_in_file, duplicate_count, error_count, pending_manifest = \
+            mt5_importer.process_mt5_report_incremental(file_path)
+        rows_label = "تعداد ردیف‌های جدید فایل (از آخرین وارد کردن)"
+
+        if pending_manifest is None:
+            reimport_all = messagebox.askyesno(
+                "بدون تغییر",
+                "این فایل از آخرین باری که وارد شده تغییری نکرده است.\n"
+                "آیا می‌خواهید کل فایل دوباره بررسی شود؟"
+            )
+            if not reimport_all:
+                return
+            prepared_trades_list, total_in_file, duplicate_count, error_count = \
+                mt5_importer.process_mt5_report_for_preview(file_path)
+            rows_label = "تعداد کل تریدها در فایل"
 
         msg = (f"گزارش آماده وارد کردن:\n"
-               f"تعداد کل تریدها در فایل: {total_in_file}\n"
+               f"{rows_label}: {total_in_file}\n"
                f"تعداد تریدهای جدید قابل وارد کردن: {len(prepared_trades_list)}\n"
                f"تعداد تریدهای تکراری (قبلاً در دیتابیس): {duplicate_count}\n"
                f"تعداد ردیف‌های رد شده (غیرمعتبر/فیلتر شده): {error_count}\n\n"
@@ -396,6 +482,9 @@ def import_trades_from_report():
         
         if confirm_import:
             actually_imported_count = mt5_importer.add_prepared_trades_to_db(prepared_trades_list)
+            if actually_imported_count or not prepared_trades_list:
+                # در صورت خطای درج، واترمارک جلو نمی‌رود تا این ردیف‌ها دفعه بعد دوباره بررسی شوند
+                mt5_importer.commit_import_manifest(pending_manifest)
             
             messagebox.showinfo("وارد کردن موفق", f"{actually_imported_count} ترید جدید با موفقیت وارد دیتابیس شد.")
             update_trade_count()
@@ -407,6 +496,59 @@ def import_trades_from_report():
         print(f"Detailed import error: {e}")
 
 
+def _import_trades_from_multiple_reports(paths):
+    try:
+        prepared_trades_list, total_in_files, duplicate_count, error_count, file_summaries = \
+            mt5_importer.process_mt5_reports_for_preview(paths)
+
+        if not file_summaries:
+            messagebox.showwarning("خطا", "هیچ فایل گزارشی (xlsx/html/csv) پیدا نشد.")
+            return
+
+        files_lines = []
+        for summary in file_summaries:
+            file_name = os.path.basename(summary['file'])
+            if summary['error']:
+                files_lines.append(f"• {file_name}: خطا در پردازش")
+            else:
+                files_lines.append(f"• {file_name}: {summary['prepared']} ترید جدید از {summary['total']} ردیف")
+
+        msg = (f"گزارش ترکیبی {len(file_summaries)} فایل:\n"
+               + "\n".join(files_lines) + "\n\n"
+               f"تعداد کل ردیف‌ها در فایل‌ها: {total_in_files}\n"
+               f"تعداد تریدهای جدید قابل وارد کردن: {len(prepared_trades_list)}\n"
+               f"تعداد تریدهای تکراری (در دیتابیس یا بین فایل‌ها): {duplicate_count}\n"
+               f"تعداد ردیف‌های رد شده (غیرمعتبر/فیلتر شده): {error_count}\n\n"
+               f"آیا مطمئن هستید که می‌خواهید تریدهای جدید را وارد دیتابیس کنید؟")
+
+        confirm_import = messagebox.askyesno("تأیید وارد کردن اطلاعات", msg)
+
+        if confirm_import:
+            actually_imported_count = mt5_importer.add_prepared_trades_to_db(prepared_trades_list)
+
+            messagebox.showinfo("وارد کردن موفق", f"{actually_imported_count} ترید جدید با موفقیت وارد دیتابیس شد.")
+            update_trade_count()
+        else:
+            messagebox.showinfo("لغو", "وارد کردن اطلاعات لغو شد.")
+
+    except Exception as e:
+        messagebox.showerror("خطا در وارد کردن", f"خطایی در حین پردازش فایل‌ها رخ داد: {e}")
+        print(f"Detailed multi-file import error: {e}")
+
+def import_trades_from_multiple_files():
+    file_paths = filedialog.askopenfilenames(
+        title="انتخاب چند فایل گزارش متاتریدر 5",
+        filetypes=[("MT5 reports", "*.xlsx *.html *.htm *.csv"), ("All files", "*.*")]
+    )
+    if file_paths:
+        _import_trades_from_multiple_reports(list(file_paths))
+
+def import_trades_from_folder():
+    folder_path = filedialog.askdirectory(title="انتخاب پوشه گزارش‌های متاتریدر 5")
+    if folder_path:
+        _import_trades_from_multiple_reports([folder_path])
+
+
 # --- ویجت‌های فرم اصلی ---
 
 # تاریخ
@@ -503,6 +645,15 @@ select_file_btn.grid(row=0, column=2, padx=5, pady=5)
 import_report_btn = tk.Button(report_import_frame, text="وارد کردن از گزارش", command=import_trades_from_report)
 import_report_btn.grid(row=1, column=0, columnspan=3, pady=5)
 
+multi_import_frame = tk.Frame(report_import_frame)
+multi_import_frame.grid(row=2, column=0, columnspan=3, pady=(0, 5))
+
+import_multi_files_btn = tk.Button(multi_import_frame, text="وارد کردن چند فایل...", command=import_trades_from_multiple_files)
+import_multi_files_btn.pack(side=tk.LEFT, padx=5)
+
+import_folder_btn = tk.Button(multi_import_frame, text="وارد کردن از پوشه...", command=import_trades_from_folder)
+import_folder_btn.pack(side=tk.LEFT, padx=5)
+
 # ابعاد اصلی فرم را در متغیرهای سراسری ذخیره می‌کنیم
 ORIGINAL_MAIN_FORM_WIDTH = main_form_width
 ORIGINAL_MAIN_FORM_HEIGHT = main_form_height
@@ -603,4 +754,6 @@ settings_menu.add_command(label="تنظیم سشن‌های معاملاتی..."
 
 update_main_timezone_display_callback() 
 
-root.mainloop()
\ No newline at end of file
+root.mainloop()
+# بستن اتصال مشترک دیتابیس (و ادغام فایل WAL) هنگام خروج از برنامه
+db_manager.close_db()
@@ -3,9 +3,14 @@
 import sqlite3
 import sys
 import os
-from decimal import Decimal, InvalidOperation
+import threading
+import hashlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation, ROUND_CEILING, ROUND_FLOOR
 import pytz
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 import json
 
 def get_resource_path(relative_path):
@@ -19,7 +24,7 @@ DATABASE_NAME = "trades.db"
 # تمام بلاک های مهاجرتی قبلی را در یک شمای نهایی جمع بندی کرده ایم.
 # برای هر تغییر ساختاری جدید در آینده، باید این ورژن را افزایش داده
 # و یک بلاک مهاجرت جدید (با ALTER TABLE) اضافه کنیم.
-DATABASE_SCHEMA_VERSION = 16 # <--- افزایش ورژن دیتابیس (اینجا تغییری نکرد)
+DATABASE_SCHEMA_VERSION = 24 # <--- افزایش ورژن دیتابیس (جداول خلاصه تریدها که با تریگر به‌روز می‌شوند)
 
 def _get_db_version(cursor):
     """
@@ -38,14 +43,200 @@ def _set_db_version(conn, cursor, version):
     cursor.execute("INSERT OR REPLACE INTO db_version (id, version) VALUES (1, ?)", (version,))
     conn.commit()
 
+# --- لایه اتصال مشترک ---
+# به جای باز و بسته کردن یک اتصال جدید در هر تابع، هر ترد یک اتصال ماندگار دارد.
+# اتصال در حالت WAL است تا خواندن‌ها (گزارش‌ها) با نوشتن‌ها (وارد کردن) قفل نشوند.
+
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",    # در حالت WAL امن است و هر commit را سریع‌تر می‌کند
+    "PRAGMA cache_size = -32000",     # حدود 32 مگابایت کش صفحات
+    "PRAGMA mmap_size = 268435456",   # 256 مگابایت
+    "PRAGMA temp_store = MEMORY",
+)
+
+# تعداد statementهای آماده (prepared) که sqlite3 برای هر اتصال کش می‌کند؛
+# کوئری‌های ثابت (مثل _TRADE_INSERT_SQL) بین فراخوانی‌ها دوباره پارس نمی‌شوند.
+_SQLITE_CACHED_STATEMENTS = 256
+
+_thread_local = threading.local()
+
+class _SharedConnection:
+    """
+    پوشش اتصال مشترک ترد. رفتار آن برای توابع موجود مثل یک اتصال معمولی است،
+    با این تفاوت که close() اتصال را نمی‌بندد و فقط تراکنش commit نشده را rollback می‌کند
+    (همان نتیجه‌ای که بستن یک اتصال بدون commit داشت).
+    """
+    def __init__(self, connection):
+        self._connection = connection
+
+    def commit(self):
+        # داخل db_manager.transaction() تصمیم commit با بلوک بیرونی است
+        if _thread_local.transaction_depth == 0:
+            self._connection.commit()
+
+    def rollback(self):
+        if _thread_local.transaction_depth == 0:
+            self._connection.rollback()
+        else:
+            # شکست یک تابع داخل transaction() باید کل تراکنش بیرونی را لغو کند، نه فقط بخشی از آن را
+            raise sqlite3.OperationalError("rollback requested inside db_manager.transaction()")
+
+    def close(self):
+        if self._connection.in_transaction and _thread_local.transaction_depth == 0:
+            self._connection.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+def _open_connection():
+    connection = sqlite3.connect(DATABASE_NAME, cached_statements=_SQLITE_CACHED_STATEMENTS)
+    connection.row_factory = sqlite3.Row
+    for pragma in _SQLITE_PRAGMAS:
+        connection.execute(pragma)
+    return connection
+
+def _get_shared_connection():
+    connection = getattr(_thread_local, 'connection', None)
+    # اتصال به ارث رسیده از fork یا اتصال به دیتابیس دیگری، قابل استفاده نیست
+    if connection is None or _thread_local.pid != os.getpid() or _thread_local.database_name != DATABASE_NAME:
+        connection = _open_connection()
+        _thread_local.connection = connection
+        _thread_local.pid = os.getpid()
+        _thread_local.database_name = DATABASE_NAME
+        _thread_local.transaction_depth = 0
+    return connection
+
+def close_db():
+    """
+    اتصال مشترک ترد فعلی را واقعاً می‌بندد (مثلاً هنگام خروج از برنامه یا قبل از جایگزینی فایل دیتابیس).
+    """
+    connection = getattr(_thread_local, 'connection', None)
+    if connection is not None:
+        connection.close()
+        _thread_local.connection = None
+
 def connect_db():
     """
-    به دیتابیس متصل شده و اتصال و کِرسور را برمی گرداند.
+    اتصال مشترک ترد فعلی به دیتابیس و یک کِرسور جدید را برمی گرداند.
     """
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
+    conn = _SharedConnection(_get_shared_connection())
     return conn, conn.cursor()
 
+@contextmanager
+def transaction():
+    """
+    یک تراکنش روی اتصال مشترک باز می‌کند و کِرسور را برمی‌گرداند؛ در پایان commit
+    و در صورت بروز خطا rollback می‌شود. تراکنش‌های تو در تو با SAVEPOINT پیاده می‌شوند.
+
+    مثال:
+        with db_manager.transaction() as cursor:
+            cursor.execute(...)
+    """
+    connection = _get_shared_connection()
+    cursor = connection.cursor()
+    depth = _thread_local.transaction_depth
+    if depth == 0:
+        if not connection.in_transaction:
+            connection.execute("BEGIN")
+    else:
+        cursor.execute(f"SAVEPOINT sp_{depth}")
+    _thread_local.transaction_depth = depth + 1
+    try:
+        yield cursor
+    except BaseException:
+        if depth == 0:
+            connection.rollback()
+        else:
+            cursor.execute(f"ROLLBACK TO sp_{depth}")
+            cursor.execute(f"RELEASE sp_{depth}")
+        raise
+    else:
+        if depth == 0:
+            connection.commit()
+        else:
+            cursor.execute(f"RELEASE sp_{depth}")
+    finally:
+        _thread_local.transaction_depth = depth
+
+# --- ستون‌های عددی صحیح (fixed-point) ---
+# مقادیر TEXT جدول trades (منبع اصلی) در کنار ستون‌های INTEGER مقیاس‌دار نگه داشته می‌شوند تا
+# SQL بتواند بدون CAST جمع و مقایسه کند؛ خواندن ردیف‌ها همان مقدار TEXT را (با کش Decimal) برمی‌گرداند.
+PROFIT_SCALE_DIGITS = 2  # profit_cents: سود/ضرر به سنت
+SIZE_SCALE_DIGITS = 2    # size_centilots: حجم به صدم لات
+PRICE_SCALE_DIGITS = 5   # entry_scaled / exit_scaled: قیمت با 5 رقم اعشار
+
+def _to_scaled_int(value, digits):
+    """
+    مقدار عددی (Decimal یا رشته) را به عدد صحیح مقیاس‌دار تبدیل می‌کند.
+    اگر مقدار نامعتبر باشد یا با این تعداد رقم اعشار دقیقاً قابل نمایش نباشد None برمی‌گرداند
+    (در این صورت مقدار TEXT منبع خواندن باقی می‌ماند).
+    """
+    if value is None or value == '':
+        return None
+    try:
+        decimal_value = value if isinstance(value, Decimal) else Decimal(str(value))
+    except InvalidOperation:
+        return None
+    if not decimal_value.is_finite():
+        return None
+    scaled = decimal_value.scaleb(digits)
+    if scaled != scaled.to_integral_value():
+        return None
+    return int(scaled)
+
+def _from_scaled_int(value, digits):
+    """
+    عدد صحیح مقیاس‌دار (مثلاً جمع profit_cents) را بدون پارس رشته به Decimal دقیق برمی‌گرداند.
+    """
+    return Decimal(value).scaleb(-digits)
+
+def _scaled_trade_values(entry, exit_price, size, actual_profit_amount):
+    return (
+        _to_scaled_int(entry, PRICE_SCALE_DIGITS),
+        _to_scaled_int(exit_price, PRICE_SCALE_DIGITS),
+        _to_scaled_int(size, SIZE_SCALE_DIGITS),
+        _to_scaled_int(actual_profit_amount, PROFIT_SCALE_DIGITS),
+    )
+
+def _split_errors(errors_string):
+    """
+    رشته خطاهای یک ترید (جدا شده با کاما) را به لیست عناوین تمیز شده تبدیل می‌کند.
+    """
+    if not errors_string:
+        return []
+    return [e.strip() for e in errors_string.split(',') if e.strip()]
+
+_SQLITE_MAX_IN_PARAMS = 900
+
+def _chunked(items, size=_SQLITE_MAX_IN_PARAMS):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _sync_trade_errors(cursor, trade_ids):
+    """
+    لینک‌های جدول trade_errors را برای تریدهای داده شده از روی ستون trades.errors بازسازی می‌کند.
+    عناوینی که در error_list نیستند به آن اضافه می‌شوند. commit بر عهده فراخواننده است.
+    """
+    trade_ids = list(trade_ids)
+    if not trade_ids:
+        return
+
+    error_ids = {}
+    for chunk in _chunked(trade_ids):
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f"DELETE FROM trade_errors WHERE trade_id IN ({placeholders})", chunk)
+        cursor.execute(f"SELECT id, errors FROM trades WHERE id IN ({placeholders}) AND errors IS NOT NULL AND errors != ''", chunk)
+        links = []
+        for trade_id, errors_string in cursor.fetchall():
+            for error_text in _split_errors(errors_string):
+                if error_text not in error_ids:
+                    cursor.execute("INSERT OR IGNORE INTO error_list (error) VALUES (?)", (error_text,))
+                    cursor.execute("SELECT id FROM error_list WHERE error = ?", (error_text,))
+                    error_ids[error_text] = cursor.fetchone()[0]
+                links.append((trade_id, error_ids[error_text]))
+        cursor.executemany("INSERT OR IGNORE INTO trade_errors (trade_id, error_id) VALUES (?, ?)", links)
+
 def migrate_database():
     """
     دیتابیس را به آخرین نسخه اسکیمای مورد نیاز مهاجرت می دهد.
@@ -144,7 +335,181 @@ def migrate_database():
             """)
             _set_db_version(conn, cursor, 16)
             current_db_version = 16
+
+        if current_db_version < 17:
+            print("Migrating to version 17: Creating normalized 'trade_errors' table and backfilling from trades.errors.")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS trade_errors (
+                    trade_id INTEGER NOT NULL,
+                    error_id INTEGER NOT NULL
+                )
+            """)
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_trade_errors_trade_id ON trade_errors (trade_id, error_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_trade_errors_error_id ON trade_errors (error_id, trade_id)")
+            # حذف خودکار لینک‌ها هنگام حذف ترید یا حذف یک خطا از لیست
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_trades_delete_errors AFTER DELETE ON trades
+                BEGIN
+                    DELETE FROM trade_errors WHERE trade_id = OLD.id;
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_error_list_delete_links AFTER DELETE ON error_list
+                BEGIN
+                    DELETE FROM trade_errors WHERE error_id = OLD.id;
+                END
+            """)
+            cursor.execute("SELECT id FROM trades WHERE errors IS NOT NULL AND errors != ''")
+            _sync_trade_errors(cursor, [row[0] for row in cursor.fetchall()])
+            _set_db_version(conn, cursor, 17)
+            current_db_version = 17
+
+        if current_db_version < 18:
+            print("Migrating to version 18: Creating 'import_manifest' table for incremental re-imports.")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS import_manifest (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    file_path TEXT UNIQUE NOT NULL,
+                    file_size INTEGER NOT NULL,
+                    file_mtime REAL NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    max_close_time_utc TEXT,
+                    max_position_id INTEGER,
+                    imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            _set_db_version(conn, cursor, 18)
+            current_db_version = 18
+
+        if current_db_version < 19:
+            print("Migrating to version 19: Adding scaled INTEGER columns (entry_scaled, exit_scaled, size_centilots, profit_cents) to 'trades'.")
+            cursor.execute("PRAGMA table_info(trades)")
+            existing_columns = {row['name'] for row in cursor.fetchall()}
+            for column_name in ('entry_scaled', 'exit_scaled', 'size_centilots', 'profit_cents'):
+                if column_name not in existing_columns:
+                    cursor.execute(f"ALTER TABLE trades ADD COLUMN {column_name} INTEGER")
+            cursor.execute("SELECT id, entry, exit, size, actual_profit_amount FROM trades")
+            cursor.executemany(
+                "UPDATE trades SET entry_scaled = ?, exit_scaled = ?, size_centilots = ?, profit_cents = ? WHERE id = ?",
+                [_scaled_trade_values(row['entry'], row['exit'], row['size'], row['actual_profit_amount']) + (row['id'],)
+                 for row in cursor.fetchall()]
+            )
+            _set_db_version(conn, cursor, 19)
+            current_db_version = 19
+
+        if current_db_version < 20:
+            print("Migrating to version 20: Adding 'opened_at_utc' epoch column and time indexes to 'trades'.")
+            cursor.execute("PRAGMA table_info(trades)")
+            if 'opened_at_utc' not in {row['name'] for row in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE trades ADD COLUMN opened_at_utc INTEGER")
+            cursor.execute(f"UPDATE trades SET opened_at_utc = {_TRADE_UTC_EPOCH_SQL}")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_opened_at_utc ON trades (opened_at_utc)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_symbol_opened_at_utc ON trades (symbol, opened_at_utc)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_profit_opened_at_utc ON trades (profit, opened_at_utc)")
+            # اگر تاریخ/ساعت تریدی ویرایش شود، epoch هم همگام می‌ماند
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_trades_opened_at_utc AFTER UPDATE OF date, time ON trades
+                BEGIN
+                    UPDATE trades SET opened_at_utc = CAST(strftime('%s', NEW.date || ' ' || NEW.time) AS INTEGER)
+                    WHERE id = NEW.id;
+                END
+            """)
+            _set_db_version(conn, cursor, 20)
+            current_db_version = 20
+        if current_db_version < 21:
+            print("Migrating to version 21: Creating 'trade_local_time' cache of display-timezone derived columns.")
+            # مقادیر محلی هر ترید به ازای هر منطقه زمانی یک بار محاسبه می‌شوند (_ensure_local_time_cache)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS trade_local_time (
+                    trade_id INTEGER NOT NULL,
+                    tz_name TEXT NOT NULL,
+                    local_date TEXT NOT NULL,
+                    weekday INTEGER NOT NULL,
+                    minute_of_day INTEGER NOT NULL,
+                    PRIMARY KEY (trade_id, tz_name)
+                ) WITHOUT ROWID
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_trade_local_time_weekday ON trade_local_time (tz_name, weekday, minute_of_day)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_trade_local_time_minute ON trade_local_time (tz_name, minute_of_day)")
+            # منطقه‌های زمانی که کش آن‌ها کامل است (همراه با نسخه قوانین pytz که با آن محاسبه شده‌اند)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS trade_local_time_state (
+                    tz_name TEXT PRIMARY KEY,
+                    tz_rules_version TEXT NOT NULL
+                )
+            """)
+            # ترید جدید: کش همه منطقه‌های زمانی ناقص می‌شود و در اولین استفاده تکمیل می‌شود
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_trades_local_time_insert AFTER INSERT ON trades
+                BEGIN
+                    DELETE FROM trade_local_time_state;
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_trades_local_time_update AFTER UPDATE OF date, time, opened_at_utc ON trades
+                BEGIN
+                    DELETE FROM trade_local_time WHERE trade_id = NEW.id;
+                    DELETE FROM trade_local_time_state;
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_trades_local_time_delete AFTER DELETE ON trades
+                BEGIN
+                    DELETE FROM trade_local_time WHERE trade_id = OLD.id;
+                END
+            """)
+            _set_db_version(conn, cursor, 21)
+            current_db_version = 21
+        if current_db_version < 22:
+            print("Migrating to version 22: Adding (date, time) index for keyset pagination of the trade lists.")
+            # date/time (UTC) همیشه پر هستند و ترتیب رشته‌ای آن‌ها همان ترتیب زمانی است
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_date_time ON trades (date, time)")
+            _set_db_version(conn, cursor, 22)
+            current_db_version = 22
+        if current_db_version < 23:
+            print("Migrating to version 23: Creating 'data_version' counter bumped by triggers on trades and errors.")
+            # هر تغییری در داده‌هایی که نتیجه گزارش‌ها به آن‌ها وابسته است، شماره نسخه را بالا می‌برد
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS data_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL
+                )
+            """)
+            cursor.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)")
+            for table_name in ('trades', 'trade_errors', 'error_list'):
+                for event in ('INSERT', 'UPDATE', 'DELETE'):
+                    cursor.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS trg_{table_name}_data_version_{event.lower()} AFTER {event} ON {table_name}
+                        BEGIN
+                            UPDATE data_version SET version = version + 1 WHERE id = 1;
+                        END
+                    """)
+            _set_db_version(conn, cursor, 23)
+            current_db_version = 23
+        if current_db_version < 24:
+            print("Migrating to version 24: Creating trigger-maintained 'trade_summary' and 'symbol_summary' tables.")
+            # شمارنده‌های پنجره اصلی به جای COUNT(*) روی کل جدول trades از این جداول خوانده می‌شوند
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS trade_summary (
+                    profit TEXT PRIMARY KEY,
+                    trade_count INTEGER NOT NULL,
+                    profit_cents_total INTEGER NOT NULL,
+                    unscaled_profit_count INTEGER NOT NULL
+                ) WITHOUT ROWID
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS symbol_summary (
+                    symbol TEXT PRIMARY KEY,
+                    trade_count INTEGER NOT NULL
+                ) WITHOUT ROWID
+            """)
+            for trigger_sql in _TRADE_SUMMARY_TRIGGERS:
+                cursor.execute(trigger_sql)
+            _rebuild_trade_summary(cursor)
+            _set_db_version(conn, cursor, 24)
+            current_db_version = 24
         conn.commit()
+        invalidate_settings_cache()
         print("Database migration complete. DB is up to date.")
     except sqlite3.Error as e:
         print(f"Error during database migration: {e}")
@@ -152,6 +517,76 @@ def migrate_database():
     finally:
         conn.close()
 
+# --- جداول خلاصه تریدها ---
+# trade_summary (به ازای هر نتیجه Profit/Loss/RF: تعداد، جمع profit_cents و تعداد سود/ضررهای بدون profit_cents)
+# و symbol_summary (تعداد تریدهای هر نماد) با تریگرهای درج/ویرایش/حذف تریدها به‌روز نگه داشته می‌شوند.
+
+# سود/ضرری که در profit_cents جا نشده و فقط مقدار TEXT آن موجود است
+_UNSCALED_PROFIT_SQL = "({row}.profit_cents IS NULL AND {row}.actual_profit_amount IS NOT NULL AND {row}.actual_profit_amount != '')"
+
+_ADD_TO_TRADE_SUMMARY_SQL = f"""
+    INSERT INTO trade_summary (profit, trade_count, profit_cents_total, unscaled_profit_count)
+    VALUES (NEW.profit, 1, IFNULL(NEW.profit_cents, 0), {_UNSCALED_PROFIT_SQL.format(row='NEW')})
+    ON CONFLICT (profit) DO UPDATE SET trade_count = trade_count + 1,
+                                       profit_cents_total = profit_cents_total + excluded.profit_cents_total,
+                                       unscaled_profit_count = unscaled_profit_count + excluded.unscaled_profit_count;
+    INSERT INTO symbol_summary (symbol, trade_count) VALUES (NEW.symbol, 1)
+    ON CONFLICT (symbol) DO UPDATE SET trade_count = trade_count + 1;
+"""
+
+_REMOVE_FROM_TRADE_SUMMARY_SQL = f"""
+    UPDATE trade_summary SET trade_count = trade_count - 1,
+                             profit_cents_total = profit_cents_total - IFNULL(OLD.profit_cents, 0),
+                             unscaled_profit_count = unscaled_profit_count - {_UNSCALED_PROFIT_SQL.format(row='OLD')}
+    WHERE profit = OLD.profit;
+    DELETE FROM trade_summary WHERE profit = OLD.profit AND trade_count <= 0;
+    UPDATE symbol_summary SET trade_count = trade_count - 1 WHERE symbol = OLD.symbol;
+    DELETE FROM symbol_summary WHERE symbol = OLD.symbol AND trade_count <= 0;
+"""
+
+_TRADE_SUMMARY_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_trades_summary_insert AFTER INSERT ON trades
+    BEGIN
+        {_ADD_TO_TRADE_SUMMARY_SQL}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_trades_summary_update AFTER UPDATE OF profit, profit_cents, actual_profit_amount, symbol ON trades
+    BEGIN
+        {_REMOVE_FROM_TRADE_SUMMARY_SQL}
+        {_ADD_TO_TRADE_SUMMARY_SQL}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_trades_summary_delete AFTER DELETE ON trades
+    BEGIN
+        {_REMOVE_FROM_TRADE_SUMMARY_SQL}
+    END
+    """,
+)
+
+def _rebuild_trade_summary(cursor):
+    """
+    جداول خلاصه را از روی کل جدول trades دوباره می‌سازد (در مهاجرت، یا اگر trades بدون تریگرها تغییر کرده باشد).
+    """
+    cursor.execute("DELETE FROM trade_summary")
+    cursor.execute(f"""
+        INSERT INTO trade_summary (profit, trade_count, profit_cents_total, unscaled_profit_count)
+        SELECT profit, COUNT(*), IFNULL(SUM(profit_cents), 0), SUM({_UNSCALED_PROFIT_SQL.format(row='trades')})
+        FROM trades GROUP BY profit
+    """)
+    cursor.execute("DELETE FROM symbol_summary")
+    cursor.execute("INSERT INTO symbol_summary (symbol, trade_count) SELECT symbol, COUNT(*) FROM trades GROUP BY symbol")
+
+# opened_at_utc (epoch ثانیه زمان باز شدن به UTC) در خود SQLite از روی پارامترهای date (?1) و time (?2) محاسبه می‌شود
+_TRADE_INSERT_SQL = """
+    INSERT INTO trades (date, time, symbol, entry, exit, profit, errors, size, position_id, type, original_timezone, actual_profit_amount,
+                        entry_scaled, exit_scaled, size_centilots, profit_cents, opened_at_utc)
+    VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11, ?12, ?13, ?14, ?15, ?16,
+            CAST(strftime('%s', ?1 || ' ' || ?2) AS INTEGER))
+"""
+
 def add_trade(date, time, symbol, entry, exit, profit, errors, size, position_id=None, trade_type=None, original_timezone_name=None, actual_profit_amount=None):
     conn, cursor = connect_db()
     try:
@@ -160,10 +595,11 @@ def add_trade(date, time, symbol, entry, exit, profit, errors, size, position_id
         size_str = str(size) if size is not None else '0.0'
         actual_profit_amount_str = str(actual_profit_amount) if actual_profit_amount is not None else None
 
-        cursor.execute("""
-            INSERT INTO trades (date, time, symbol, entry, exit, profit, errors, size, position_id, type, original_timezone, actual_profit_amount)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (date, time, symbol, entry_str, exit_str, profit, errors, size_str, position_id, trade_type, original_timezone_name, actual_profit_amount_str))
+        cursor.execute(_TRADE_INSERT_SQL,
+                       (date, time, symbol, entry_str, exit_str, profit, errors, size_str, position_id, trade_type, original_timezone_name, actual_profit_amount_str)
+                       + _scaled_trade_values(entry, exit, size_str, actual_profit_amount))
+        if errors:
+            _sync_trade_errors(cursor, [cursor.lastrowid])
         conn.commit()
         return True
     except sqlite3.Error as e:
@@ -172,64 +608,271 @@ def add_trade(date, time, symbol, entry, exit, profit, errors, size, position_id
     finally:
         conn.close()
 
+def _prepared_trade_to_row(trade_data):
+    """یک ترید آماده (ساختار خروجی mt5_importer) را به تاپل مقادیر INSERT تبدیل می‌کند."""
+    entry = trade_data.get('entry')
+    exit_price = trade_data.get('exit')
+    size = trade_data.get('size')
+    actual_profit_amount = trade_data.get('actual_profit_amount')
+    return (
+        trade_data['date'],
+        trade_data['time'],
+        trade_data['symbol'],
+        str(entry) if entry is not None else None,
+        str(exit_price) if exit_price is not None else None,
+        trade_data['profit'],
+        trade_data.get('errors'),
+        str(size) if size is not None else '0.0',
+        trade_data.get('position_id'),
+        trade_data.get('trade_type'),
+        trade_data.get('original_timezone'),
+        str(actual_profit_amount) if actual_profit_amount is not None else None,
+    ) + _scaled_trade_values(entry, exit_price, size if size is not None else '0.0', actual_profit_amount)
+
+def _fetch_existing_position_ids(cursor, position_ids):
+    existing_position_ids = set()
+    for chunk in _chunked(list(position_ids)):
+        cursor.execute(f"SELECT position_id FROM trades WHERE position_id IN ({','.join('?' * len(chunk))})", chunk)
+        existing_position_ids.update(row[0] for row in cursor.fetchall())
+    return existing_position_ids
+
+def get_existing_position_ids(position_ids):
+    """
+    از بین position_idهای داده شده، آنهایی که قبلاً در دیتابیس ثبت شده‌اند را برمی‌گرداند.
+    (با یک اتصال و کوئری‌های IN دسته‌ای، به جای یک check_duplicate_trade برای هر ردیف)
+    Returns:
+        set: position_idهای موجود در دیتابیس.
+    """
+    conn, cursor = connect_db()
+    try:
+        return _fetch_existing_position_ids(cursor, position_ids)
+    except sqlite3.Error as e:
+        print(f"خطا در بررسی تریدهای تکراری: {e}")
+        return set()
+    finally:
+        conn.close()
+
+def add_trades_bulk(trades_list):
+    """
+    لیستی از تریدها را با یک اتصال، یک تراکنش و executemany به دیتابیس اضافه می‌کند.
+    تریدهایی که position_id آنها قبلاً ثبت شده (یا در همین لیست تکراری است) رد می‌شوند
+    بدون اینکه کل عملیات لغو شود.
+    Args:
+        trades_list (list): لیستی از دیکشنری‌ها با ساختار خروجی mt5_importer.process_mt5_report_for_preview.
+    Returns:
+        tuple: (تعداد تریدهای وارد شده, لیست position_idهای تکراری)
+    """
+    if not trades_list:
+        return 0, []
+
+    conn, cursor = connect_db()
+    try:
+        position_ids = [t['position_id'] for t in trades_list if t.get('position_id') is not None]
+        existing_position_ids = _fetch_existing_position_ids(cursor, position_ids)
+
+        rows_to_insert = []
+        rows_without_position_id = []
+        duplicate_position_ids = []
+        seen_position_ids = set()
+        for trade_data in trades_list:
+            position_id = trade_data.get('position_id')
+            if position_id is None:
+                rows_without_position_id.append(_prepared_trade_to_row(trade_data))
+                continue
+            if position_id in existing_position_ids or position_id in seen_position_ids:
+                duplicate_position_ids.append(position_id)
+                continue
+            seen_position_ids.add(position_id)
+            rows_to_insert.append(_prepared_trade_to_row(trade_data))
+
+        # ON CONFLICT فقط محافظ است؛ تکراری‌ها بالاتر جدا شده‌اند
+        cursor.executemany(_TRADE_INSERT_SQL.rstrip() + " ON CONFLICT (position_id) WHERE position_id IS NOT NULL DO NOTHING", rows_to_insert)
+        imported_count = max(cursor.rowcount, 0)
+
+        trade_ids_with_errors = []
+        for row in rows_without_position_id:
+            cursor.execute(_TRADE_INSERT_SQL, row)
+            imported_count += 1
+            if row[6]:
+                trade_ids_with_errors.append(cursor.lastrowid)
+
+        position_ids_with_errors = [row[8] for row in rows_to_insert if row[6]]
+        for chunk in _chunked(position_ids_with_errors):
+            cursor.execute(f"SELECT id FROM trades WHERE position_id IN ({','.join('?' * len(chunk))})", chunk)
+            trade_ids_with_errors.extend(row[0] for row in cursor.fetchall())
+        _sync_trade_errors(cursor, trade_ids_with_errors)
+
+        conn.commit()
+        return imported_count, duplicate_position_ids
+    except sqlite3.Error as e:
+        print(f"خطا در افزودن گروهی تریدها: {e}")
+        conn.rollback()
+        return 0, []
+    finally:
+        conn.close()
+
+_TRADE_SELECT_COLUMNS ="id, date, time, symbol, entry, exit, profit, errors, size, position_id, type, original_timezone, actual_profit_amount, entry_scaled, exit_scaled, size_centilots, profit_cents"
+
+# مقادیر عددی دقیقاً با همان رقم‌های اعشار مقدار TEXT برگردانده می‌شوند (0.1 و نه 0.10، -50 و نه -50.00)؛
+# ستون‌های INTEGER مقیاس‌دار فقط در محاسبات SQL استفاده می‌شوند. (ستون TEXT، ستون INTEGER مقیاس‌دار)
+_SCALED_TRADE_COLUMNS = (
+    ('entry', 'entry_scaled'),
+    ('exit', 'exit_scaled'),
+    ('size', 'size_centilots'),
+    ('actual_profit_amount', 'profit_cents'),
+)
+
+def _text_to_decimal(text_value):
+    """مقدار TEXT را با همان توان (تعداد رقم اعشار) به Decimal تبدیل می‌کند؛ مقادیر خالی یا نامعتبر None می‌شوند."""
+    if text_value is None or text_value == '':
+        return None
+    try:
+        return Decimal(text_value)
+    except InvalidOperation:
+        return None
+
+# قیمت‌ها، حجم‌ها و سودها در لیست تریدها بسیار تکرار می‌شوند و Decimal تغییرناپذیر است
+_cached_text_to_decimal = lru_cache(maxsize=65536)(_text_to_decimal)
+
+# برچسب 'HH:MM' هر دقیقه از شبانه‌روز (برای ستون minute_of_day کش trade_local_time)
+_MINUTE_OF_DAY_LABELS = tuple(f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(1440))
+
+def _hydrate_numeric_fields(processed_row):
+    """
+    ستون‌های عددی ترید را از مقدار TEXT (با کش) به Decimal تبدیل می‌کند و ستون‌های مقیاس‌دار را
+    از دیکشنری حذف می‌کند. مقادیر خالی دست نخورده می‌مانند و مقادیر نامعتبر None می‌شوند.
+    """
+    for text_column, scaled_column in _SCALED_TRADE_COLUMNS:
+        processed_row.pop(scaled_column, None)
+        if processed_row[text_column]:
+            processed_row[text_column] = _cached_text_to_decimal(processed_row[text_column])
+
+def _utc_to_display_date_time(trade_id, date_str, time_str, display_tz):
+    """
+    تاریخ و ساعت UTC ذخیره شده را به منطقه زمانی نمایش تبدیل می‌کند (برای تریدهایی که در کش trade_local_time نیستند).
+    در صورت خطا همان مقادیر اصلی برگردانده می‌شوند.
+    """
+    try:
+        utc_naive_dt = datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
+        utc_aware_dt = pytz.utc.localize(utc_naive_dt)
+        display_aware_dt = utc_aware_dt.astimezone(display_tz)
+        return display_aware_dt.strftime('%Y-%m-%d'), display_aware_dt.strftime('%H:%M')
+    except ValueError as ve:
+        print(f"خطا در تبدیل زمان برای ترید {trade_id}: {ve}. تاریخ و زمان اصلی نمایش داده می‌شوند.")
+    except Exception as e:
+        print(f"خطای غیرمنتظره در تبدیل زمان برای ترید {trade_id}: {e}.")
+    return date_str, time_str
+
+class Trade:
+    """
+    رکورد سبک یک ترید (با __slots__) که APIهای خواندن (get_all_trades و get_trades_for_report) برمی‌گردانند.
+    مثل دیکشنری‌های قبلی با trade['key'] و trade.get('key') خوانده می‌شود. فیلدهای عددی فقط هنگام
+    خواندن و از مقدار TEXT ذخیره شده به Decimal تبدیل می‌شوند (تا تعداد رقم اعشار آن‌ها حفظ شود).
+    """
+    FIELDS = ('id', 'date', 'time', 'symbol', 'entry', 'exit', 'profit', 'errors', 'size', 'position_id',
+              'type', 'original_timezone', 'actual_profit_amount', 'weekday', 'minute_of_day')
+
+    __slots__ = ('id', 'date', 'time', 'symbol', '_entry', '_exit', 'profit', 'errors', '_size', 'position_id',
+                 'type', 'original_timezone', '_actual_profit_amount', 'weekday', 'minute_of_day')
+
+    def __init__(self, id, date, time, symbol, entry, exit, profit, errors, size, position_id,
+                 type, original_timezone, actual_profit_amount, weekday=None, minute_of_day=None):
+        self.id = id
+        self.date = date
+        self.time = time
+        self.symbol = symbol
+        self._entry = entry
+        self._exit = exit
+        self.profit = profit
+        self.errors = errors
+        self._size = size
+        self.position_id = position_id
+        self.type = type
+        self.original_timezone = original_timezone
+        self._actual_profit_amount = actual_profit_amount
+        self.weekday = weekday
+        self.minute_of_day = minute_of_day
+
+    @property
+    def entry(self):
+        return _cached_text_to_decimal(self._entry)
+
+    @property
+    def exit(self):
+        return _cached_text_to_decimal(self._exit)
+
+    @property
+    def size(self):
+        size = _cached_text_to_decimal(self._size)
+        return size if size is not None else Decimal('0.0')
+
+    @property
+    def actual_profit_amount(self):
+        return _cached_text_to_decimal(self._actual_profit_amount)
+
+    def __getitem__(self, key):
+        if key not in Trade.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in Trade.FIELDS
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in Trade.FIELDS else default
+
+    def keys(self):
+        return Trade.FIELDS
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in Trade.FIELDS}
+
+    def __repr__(self):
+        return f"Trade(id={self.id!r}, date={self.date!r}, time={self.time!r}, symbol={self.symbol!r}, profit={self.profit!r})"
+
+def _fetch_trades(cursor, display_tz):
+    """
+    همه ردیف‌های کوئری اجرا شده روی cursor را در یک گذر به اشیای Trade تبدیل می‌کند.
+    کوئری باید ستون‌های _TRADE_SELECT_COLUMNS و سپس local_date, weekday, minute_of_day
+    (از trade_local_time) را به همین ترتیب برگرداند؛ تبدیل منطقه زمانی فقط برای ردیف‌های بدون کش با pytz انجام می‌شود.
+    """
+    # رشته‌های تکراری (تاریخ‌ها، نمادها، خطاها، ...) بین تریدها به اشتراک گذاشته می‌شوند
+    shared_strings = {}
+    return [_trade_from_row(row, display_tz, shared_strings) for row in cursor.fetchall()]
+
+def _trade_from_row(row, display_tz, shared_strings):
+    """یک ردیف (ستون‌های _TRADE_SELECT_COLUMNS و سپس local_date, weekday, minute_of_day) را به Trade تبدیل می‌کند."""
+    share = lambda value: shared_strings.setdefault(value, value) if value is not None else None
+    (trade_id, date_str, time_str, symbol, entry, exit_price, profit, errors, size, position_id, trade_type,
+     original_timezone, actual_profit_amount, entry_scaled, exit_scaled, size_centilots, profit_cents,
+     local_date, weekday, minute_of_day) = row
+    if local_date is not None:
+        date_str, time_str = local_date, _MINUTE_OF_DAY_LABELS[minute_of_day]
+    else:
+        date_str, time_str = _utc_to_display_date_time(trade_id, date_str, time_str, display_tz)
+    return Trade(
+        trade_id, share(date_str), time_str, share(symbol),
+        share(entry), share(exit_price),
+        share(profit), share(errors),
+        share(size), position_id, share(trade_type), share(original_timezone), actual_profit_amount,
+        weekday, minute_of_day,
+    )
+
 def get_all_trades(display_timezone_name):
     conn, cursor = connect_db()
     trades_list = []
     try:
         display_tz = pytz.timezone(display_timezone_name)
 
-        cursor.execute("SELECT id, date, time, symbol, entry, exit, profit, errors, size, position_id, type, original_timezone, actual_profit_amount FROM trades ORDER BY date ASC, time ASC")
-        rows = cursor.fetchall()
-        for row in rows:
-            processed_row = dict(row)
-            
-            try:
-                utc_naive_dt = datetime.strptime(f"{processed_row['date']} {processed_row['time']}", "%Y-%m-%d %H:%M")
-                utc_aware_dt = pytz.utc.localize(utc_naive_dt)
-                display_aware_dt = utc_aware_dt.astimezone(display_tz)
-                processed_row['date'] = display_aware_dt.strftime('%Y-%m-%d')
-                processed_row['time'] = display_aware_dt.strftime('%H:%M')
-            except ValueError as ve:
-                print(f"خطا در تبدیل زمان برای ترید {processed_row['id']}: {ve}. تاریخ و زمان اصلی نمایش داده می‌شوند.")
-                pass
-            except Exception as e:
-                 print(f"خطای غیرمنتظره در تبدیل زمان برای ترید {processed_row['id']}: {e}.")
-                 pass
-
-            entry_decimal = None
-            if processed_row['entry'] is not None and processed_row['entry'] != '':
-                try:
-                    entry_decimal = Decimal(processed_row['entry'])
-                except InvalidOperation:
-                    pass
-            processed_row['entry'] = entry_decimal
-
-            exit_decimal = None
-            if processed_row['exit'] is not None and processed_row['exit'] != '':
-                try:
-                    exit_decimal = Decimal(processed_row['exit'])
-                except InvalidOperation:
-                    pass
-            processed_row['exit'] = exit_decimal
-
-            size_decimal = Decimal('0.0')
-            if processed_row['size'] is not None and processed_row['size'] != '':
-                try:
-                    size_decimal = Decimal(processed_row['size'])
-                except InvalidOperation:
-                    size_decimal = Decimal('0.0')
-            processed_row['size'] = size_decimal
-
-            actual_profit_decimal = None
-            if processed_row['actual_profit_amount'] is not None and processed_row['actual_profit_amount'] != '':
-                try:
-                    actual_profit_decimal = Decimal(processed_row['actual_profit_amount'])
-                except InvalidOperation:
-                    pass
-            processed_row['actual_profit_amount'] = actual_profit_decimal
+        # تاریخ/ساعت محلی همه تریدها یک بار برای هر منطقه زمانی در SQLite محاسبه و در trade_local_time نگه داشته می‌شود
+        _ensure_local_time_cache(conn, cursor, display_timezone_name)
+        cursor.execute(f"""
+            SELECT {_TRADE_SELECT_COLUMNS}, l.local_date AS local_date, l.weekday AS weekday, l.minute_of_day AS minute_of_day
+            FROM trades LEFT JOIN trade_local_time AS l ON l.trade_id = trades.id AND l.tz_name = ?
+            ORDER BY trades.opened_at_utc ASC, trades.id ASC
+        """, (display_timezone_name,))
+        trades_list = _fetch_trades(cursor, display_tz)
 
-            trades_list.append(processed_row)
-            
         return trades_list
     except InvalidOperation as e:
         print(f"DEBUG_DB_ERROR: خطای کلی InvalidOperation هنگام بازیابی تریدها: {e}")
@@ -294,7 +937,7 @@ def get_all_trades_errors():
 def get_total_trades_count():
     conn, cursor = connect_db()
     try:
-        cursor.execute("SELECT COUNT(*) FROM trades")
+        cursor.execute("SELECT SUM(trade_count) FROM trade_summary")
         count = cursor.fetchone()[0] or 0
         return count
     finally:
@@ -338,26 +981,107 @@ def get_all_errors_with_id():
 
 def get_error_usage_counts():
     conn, cursor = connect_db()
-    error_counts = {}
     try:
-        cursor.execute("SELECT errors FROM trades")
-        for row in cursor.fetchall():
-            if row['errors']:
-                for err in row['errors'].split(", "):
-                    error_counts[err] = error_counts.get(err, 0) + 1
-        return error_counts
+        cursor.execute("""
+            SELECT e.error, COUNT(*) AS usage_count
+            FROM trade_errors te
+            JOIN error_list e ON e.id = te.error_id
+            GROUP BY te.error_id
+        """)
+        return {row['error']: row['usage_count'] for row in cursor.fetchall()}
     finally:
         conn.close()
 
+def _retag_trade_error_strings(cursor, error_ids, new_error_name=None):
+    """
+    ستون trades.errors را فقط برای تریدهای لینک شده به error_ids از روی لینک‌های trade_errors بازنویسی می‌کند:
+    این خطاها با new_error_name جایگزین می‌شوند (یا اگر None باشد حذف می‌شوند). ترتیب بقیه خطاها (ترتیب درج
+    لینک‌ها) حفظ می‌شود و خطای ادغام شده جای اولین خطای جایگزین شده را می‌گیرد. لینک‌ها تغییر نمی‌کنند
+    و commit بر عهده فراخواننده است.
+    Returns:
+        int: تعداد تریدهای بازنویسی شده.
+    """
+    retagged_error_ids = {int(error_id) for error_id in error_ids}
+    placeholders = ','.join('?' * len(retagged_error_ids))
+    # ORDER BY کوئری بیرونی (برخلاف ترتیب ورودی group_concat) تضمین شده است
+    cursor.execute(f"""
+        SELECT te.trade_id, te.error_id, e.error
+        FROM trade_errors te
+        JOIN error_list e ON e.id = te.error_id
+        WHERE te.trade_id IN (SELECT trade_id FROM trade_errors WHERE error_id IN ({placeholders}))
+        ORDER BY te.trade_id, te.rowid
+    """, tuple(retagged_error_ids))
+    error_names_by_trade = {}
+    for trade_id, error_id, error_name in cursor.fetchall():
+        error_names = error_names_by_trade.setdefault(trade_id, [])
+        if error_id in retagged_error_ids:
+            error_name = new_error_name
+        if error_name is not None and error_name not in error_names:
+            error_names.append(error_name)
+
+    cursor.executemany("UPDATE trades SET errors = ? WHERE id = ?",
+                       [(", ".join(error_names), trade_id) for trade_id, error_names in error_names_by_trade.items()])
+    return len(error_names_by_trade)
+
 def delete_error_from_list(error_id):
+    return delete_errors([error_id]) is not None
+
+def delete_errors(error_ids):
+    """
+    خطاهای داده شده را از لیست خطاها و از همه تریدهایی که آن‌ها را دارند، در یک تراکنش حذف می‌کند.
+    Returns:
+        int: تعداد تریدهایی که خطاهایشان تغییر کرده، یا None در صورت بروز خطا.
+    """
+    error_ids = list(error_ids)
+    if not error_ids:
+        return 0
+
     conn, cursor = connect_db()
     try:
-        cursor.execute("DELETE FROM error_list WHERE id=?", (error_id,))
+        updated_count = _retag_trade_error_strings(cursor, error_ids)
+        # لینک‌های trade_errors با تریگر trg_error_list_delete_links حذف می‌شوند
+        cursor.execute(f"DELETE FROM error_list WHERE id IN ({','.join('?' * len(error_ids))})", error_ids)
         conn.commit()
-        return True
+        return updated_count
     except sqlite3.Error as e:
         print(f"خطا در حذف خطا از لیست: {e}")
-        return False
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+def merge_errors(source_error_ids, target_error_id):
+    """
+    خطاهای source_error_ids را در خطای target_error_id ادغام می‌کند: تریدهای آن‌ها خطای مقصد را می‌گیرند
+    (بدون تکرار) و خطاهای مبدأ از لیست حذف می‌شوند؛ همه در یک تراکنش.
+    Returns:
+        int: تعداد تریدهایی که خطاهایشان تغییر کرده، یا None در صورت بروز خطا.
+    """
+    source_error_ids = [error_id for error_id in source_error_ids if error_id != target_error_id]
+    if not source_error_ids:
+        return 0
+
+    conn, cursor = connect_db()
+    try:
+        cursor.execute("SELECT error FROM error_list WHERE id = ?", (target_error_id,))
+        target_row = cursor.fetchone()
+        if target_row is None:
+            print(f"خطا در ادغام خطاها: خطای مقصد با ID {target_error_id} پیدا نشد.")
+            return None
+
+        placeholders = ','.join('?' * len(source_error_ids))
+        updated_count = _retag_trade_error_strings(cursor, source_error_ids, target_row['error'])
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO trade_errors (trade_id, error_id)
+            SELECT trade_id, ? FROM trade_errors WHERE error_id IN ({placeholders})
+        """, (target_error_id, *source_error_ids))
+        cursor.execute(f"DELETE FROM error_list WHERE id IN ({placeholders})", source_error_ids)
+        conn.commit()
+        return updated_count
+    except sqlite3.Error as e:
+        print(f"خطا در ادغام خطاها: {e}")
+        conn.rollback()
+        return None
     finally:
         conn.close()
 
@@ -368,26 +1092,19 @@ def rename_error(error_id, old_name, new_name):
         if cursor.fetchone()[0] > 0:
             return "duplicate"
 
+        # فقط تریدهایی که به این خطا لینک شده‌اند، با یک UPDATE بازنویسی می‌شوند
+        _retag_trade_error_strings(cursor, [error_id], new_name)
         cursor.execute("UPDATE error_list SET error=? WHERE id=?", (new_name, error_id))
 
-        cursor.execute("SELECT id, errors FROM trades")
-        trades_to_update = []
-        for trade_id, error_string in cursor.fetchall():
-            if error_string and old_name in [e.strip() for e in error_string.split(',')]:
-                errors_list = [e.strip() for e in error_string.split(',')]
-                updated_errors_list = [new_name if e == old_name else e for e in errors_list]
-                trades_to_update.append((", ".join(updated_errors_list), trade_id))
-        
-        for updated_error_string, trade_id in trades_to_update:
-             cursor.execute("UPDATE trades SET errors=? WHERE id=?", (updated_error_string, trade_id))
-
         conn.commit()
         return "success"
     except sqlite3.IntegrityError:
         print(f"خطا (IntegrityError) در ویرایش عنوان: نام جدید تکراری است.")
+        conn.rollback()
         return "duplicate"
     except sqlite3.Error as e:
         print(f"خطا در ویرایش عنوان: {e}")
+        conn.rollback()
         return str(e)
     finally:
         conn.close()
@@ -395,7 +1112,7 @@ def rename_error(error_id, old_name, new_name):
 def get_profit_trades_count():
     conn, cursor = connect_db()
     try:
-        cursor.execute("SELECT COUNT(*) FROM trades WHERE profit = 'Profit'")
+        cursor.execute("SELECT SUM(trade_count) FROM trade_summary WHERE profit = 'Profit'")
         count = cursor.fetchone()[0] or 0
         return count
     finally:
@@ -404,12 +1121,57 @@ def get_profit_trades_count():
 def get_loss_trades_count():
     conn, cursor = connect_db()
     try:
-        cursor.execute("SELECT COUNT(*) FROM trades WHERE profit = 'Loss'")
+        cursor.execute("SELECT SUM(trade_count) FROM trade_summary WHERE profit = 'Loss'")
         count = cursor.fetchone()[0] or 0
         return count
     finally:
         conn.close()
 
+def get_trade_summary():
+    """
+    خلاصه کل تریدها را از جدول trade_summary (بدون اسکن جدول trades) برمی‌گرداند.
+    Returns:
+        dict: کلیدهای trade_count, profit_count, loss_count, rf_count, total_profit (Decimal)
+    """
+    conn, cursor = connect_db()
+    summary = {'trade_count': 0, 'profit_count': 0, 'loss_count': 0, 'rf_count': 0, 'total_profit': Decimal('0')}
+    try:
+        cursor.execute("SELECT profit, trade_count, profit_cents_total, unscaled_profit_count FROM trade_summary")
+        profit_cents_total = 0
+        unscaled_profit_count = 0
+        for row in cursor.fetchall():
+            summary['trade_count'] += row['trade_count']
+            outcome_key = {'Profit': 'profit_count', 'Loss': 'loss_count', 'RF': 'rf_count'}.get(row['profit'])
+            if outcome_key:
+                summary[outcome_key] = row['trade_count']
+            profit_cents_total += row['profit_cents_total']
+            unscaled_profit_count += row['unscaled_profit_count']
+        summary['total_profit'] = _from_scaled_int(profit_cents_total, PROFIT_SCALE_DIGITS)
+        if unscaled_profit_count:
+            summary['total_profit'] += _unscaled_profit_total(cursor, "trades AS t", "1=1", [])
+        return summary
+    except sqlite3.Error as e:
+        print(f"خطا در دریافت خلاصه تریدها: {e}")
+        return summary
+    finally:
+        conn.close()
+
+def get_symbol_trade_counts():
+    """
+    تعداد تریدهای هر نماد را از جدول symbol_summary برمی‌گرداند.
+    Returns:
+        dict: {symbol: تعداد تریدها}
+    """
+    conn, cursor = connect_db()
+    try:
+        cursor.execute("SELECT symbol, trade_count FROM symbol_summary ORDER BY symbol ASC")
+        return {row['symbol']: row['trade_count'] for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        print(f"خطا در دریافت تعداد تریدهای نمادها: {e}")
+        return {}
+    finally:
+        conn.close()
+
 def check_duplicate_trade(date=None, time=None, position_id=None):
     conn, cursor = connect_db()
     try:
@@ -446,6 +1208,7 @@ def update_trades_errors(trade_ids, errors_string):
         query = f"UPDATE trades SET errors = ? WHERE id IN ({placeholders})"
         
         cursor.execute(query, (errors_string, *trade_ids))
+        _sync_trade_errors(cursor, trade_ids)
         conn.commit()
         return True
     except sqlite3.Error as e:
@@ -502,7 +1265,7 @@ def get_trades_for_hourly_analysis(start_date_str, end_date_str, trade_type_filt
             query += " AND profit = ?"
             params.append(trade_type_filter)
         
-        cursor.execute(query + " ORDER BY date ASC, time ASC", params)
+        cursor.execute(query + " ORDER BY opened_at_utc ASC, id ASC", params)
         rows = cursor.fetchall()
         for row in rows:
             processed_row = dict(row)
@@ -534,6 +1297,7 @@ def import_errors_by_position_id(error_data_list):
     """
     conn, cursor = connect_db()
     updated_count = 0
+    updated_trade_ids = []
     try:
         for item in error_data_list:
             position_id = item.get('position_id')
@@ -545,13 +1309,13 @@ def import_errors_by_position_id(error_data_list):
             cursor.execute("UPDATE trades SET errors = ? WHERE position_id = ?", (errors, position_id))
             if cursor.rowcount > 0:
                 updated_count += 1
+                cursor.execute("SELECT id FROM trades WHERE position_id = ?", (position_id,))
+                updated_trade_ids.extend(row[0] for row in cursor.fetchall())
             
-            if errors:
-                for error_item in errors.split(','):
-                    error_text = error_item.strip()
-                    if error_text:
-                        cursor.execute("INSERT OR IGNORE INTO error_list (error) VALUES (?)", (error_text,))
+            for error_text in _split_errors(errors):
+                cursor.execute("INSERT OR IGNORE INTO error_list (error) VALUES (?)", (error_text,))
 
+        _sync_trade_errors(cursor, updated_trade_ids)
         conn.commit()
         return updated_count
     except sqlite3.Error as e:
@@ -561,26 +1325,106 @@ def import_errors_by_position_id(error_data_list):
     finally:
         conn.close()
 
+# --- کش تنظیمات ---
+# جدول settings یک بار خوانده و در حافظه نگه داشته می‌شود. set_setting/set_settings
+# ابتدا در دیتابیس می‌نویسند (write-through) و سپس کش را به‌روز کرده و به مشترکین خبر می‌دهند.
+
+_settings_lock = threading.RLock()
+_settings_cache = None
+_settings_cache_database = None
+_settings_subscribers = {} # callback -> مجموعه کلیدهای مورد علاقه (None یعنی همه کلیدها)
+
+def _get_settings_cache():
+    global _settings_cache, _settings_cache_database
+    with _settings_lock:
+        if _settings_cache is None or _settings_cache_database != DATABASE_NAME:
+            conn, cursor = connect_db()
+            try:
+                cursor.execute("SELECT key, value FROM settings")
+                _settings_cache = {row['key']: row['value'] for row in cursor.fetchall()}
+                _settings_cache_database = DATABASE_NAME
+            finally:
+                conn.close()
+        return _settings_cache
+
+def invalidate_settings_cache():
+    """
+    کش تنظیمات را خالی می‌کند تا در دسترسی بعدی دوباره از دیتابیس خوانده شود
+    (مثلاً بعد از مهاجرت دیتابیس یا تغییر مستقیم جدول settings).
+    """
+    global _settings_cache
+    with _settings_lock:
+        _settings_cache = None
+
+def subscribe_settings(callback, keys=None):
+    """
+    یک تابع را برای اطلاع از تغییر تنظیمات ثبت می‌کند.
+    Args:
+        callback (callable): با یک دیکشنری {key: new_value} از تنظیماتی که واقعاً تغییر کرده‌اند صدا زده می‌شود.
+        keys (iterable, optional): فقط تغییر این کلیدها اطلاع داده می‌شود؛ None یعنی همه کلیدها.
+    """
+    with _settings_lock:
+        _settings_subscribers[callback] = frozenset(keys) if keys is not None else None
+
+def unsubscribe_settings(callback):
+    """
+    تابع ثبت شده با subscribe_settings را حذف می‌کند.
+    """
+    with _settings_lock:
+        _settings_subscribers.pop(callback, None)
+
+def _notify_settings_changed(changed_settings):
+    with _settings_lock:
+        subscribers = list(_settings_subscribers.items())
+    for callback, keys in subscribers:
+        relevant_changes = changed_settings if keys is None else \
+            {key: value for key, value in changed_settings.items() if key in keys}
+        if not relevant_changes:
+            continue
+        try:
+            callback(relevant_changes)
+        except Exception as e:
+            print(f"Error notifying settings subscriber {callback}: {e}")
+
 def get_setting(key, default_value=None):
-    conn, cursor = connect_db()
-    try:
-        cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
-        result = cursor.fetchone()
-        return result['value'] if result else default_value
-    finally:
-        conn.close()
+    settings = _get_settings_cache()
+    return settings[key] if key in settings else default_value
+
+def set_settings(settings_values):
+    """
+    چند تنظیم را در یک تراکنش ذخیره می‌کند و فقط برای مقادیری که واقعاً تغییر کرده‌اند یک بار به مشترکین خبر می‌دهد.
+    Args:
+        settings_values (dict): {key: value}
+    Returns:
+        bool: True اگر عملیات موفقیت‌آمیز باشد، False در غیر این صورت.
+    """
+    # ستون value از نوع TEXT است؛ مقداری که در کش نگه می‌داریم همان چیزی است که SQLite برمی‌گرداند
+    normalized_values = {key: (str(value) if value is not None else None) for key, value in settings_values.items()}
+    with _settings_lock:
+        settings = _get_settings_cache()
+        changed_settings = {key: value for key, value in normalized_values.items()
+                            if key not in settings or settings[key] != value}
+        conn, cursor = connect_db()
+        try:
+            cursor.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                               list(normalized_values.items()))
+            if changed_settings.get('default_timezone'):
+                _discard_local_time_cache(cursor, keep_tz_name=changed_settings['default_timezone'])
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"خطا در ذخیره تنظیمات {', '.join(map(str, settings_values))}: {e}")
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+        settings.update(normalized_values)
+
+    if changed_settings:
+        _notify_settings_changed(changed_settings)
+    return True
 
 def set_setting(key, value):
-    conn, cursor = connect_db()
-    try:
-        cursor.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
-        conn.commit()
-        return True
-    except sqlite3.Error as e:
-        print(f"خطا در ذخیره تنظیمات '{key}': {e}")
-        return False
-    finally:
-        conn.close()
+    return set_settings({key: value})
 
 def get_default_timezone():
     return get_setting('default_timezone', 'Asia/Tehran')
@@ -625,35 +1469,61 @@ def calculate_profit_type(profit_amount_decimal, rf_threshold_decimal):
             return "Profit"
     return "RF"
 
+def _profit_type_case_sql(profit_cents_sql, rf_threshold_decimal):
+    """
+    معادل SQL تابع calculate_profit_type روی سود/ضرر به سنت (عدد صحیح).
+    حدود آستانه RF یک بار به سنت تبدیل می‌شوند: amount >= -T معادل cents >= ceil(-T*100) است
+    و amount <= T معادل cents <= floor(T*100).
+    Returns:
+        tuple: (عبارت CASE, پارامترها)
+    """
+    scale = Decimal(10) ** PROFIT_SCALE_DIGITS
+    rf_sql = ""
+    params = []
+    if rf_threshold_decimal is not None:
+        rf_sql = f"WHEN {profit_cents_sql} BETWEEN ? AND ? THEN 'RF' "
+        params = [int((-rf_threshold_decimal * scale).to_integral_value(rounding=ROUND_CEILING)),
+                  int((rf_threshold_decimal * scale).to_integral_value(rounding=ROUND_FLOOR))]
+    case_sql = (f"CASE {rf_sql}WHEN {profit_cents_sql} < 0 THEN 'Loss' "
+                f"WHEN {profit_cents_sql} > 0 THEN 'Profit' ELSE 'RF' END")
+    return case_sql, params
+
 def recalculate_trade_profits():
-    conn, cursor = connect_db()
-    updated_count = 0
+    """
+    نتیجه (Profit/Loss/RF) همه تریدها را بر اساس آستانه فعلی RF دوباره محاسبه می‌کند.
+    تریدهایی که profit_cents دارند با یک UPDATE مجموعه‌ای در خود SQLite به‌روز می‌شوند؛ فقط سود/ضررهایی که
+    در profit_cents جا نشده‌اند (تعداد کمی) در پایتون و با Decimal محاسبه می‌شوند.
+    Returns:
+        int: تعداد تریدهایی که نتیجه آن‌ها واقعاً تغییر کرده است.
+    """
     rf_threshold = get_rf_threshold()
+    if not rf_threshold.is_finite():
+        print(f"Warning: rf_threshold '{rf_threshold}' is not a finite number. Skipping recalculation of trade profits.")
+        return 0
 
+    conn, cursor = connect_db()
+    updated_count = 0
     try:
-        cursor.execute("SELECT id, actual_profit_amount FROM trades WHERE actual_profit_amount IS NOT NULL")
-        rows = cursor.fetchall()
-
-        for row in rows:
-            trade_id = row['id']
-            actual_profit_str = row['actual_profit_amount']
-            
+        new_profit_sql, params = _profit_type_case_sql("profit_cents", rf_threshold)
+        cursor.execute(f"""
+            UPDATE trades SET profit = {new_profit_sql}
+            WHERE profit_cents IS NOT NULL AND profit IS NOT {new_profit_sql}
+        """, params + params)
+        updated_count = cursor.rowcount
+
+        cursor.execute("SELECT id, actual_profit_amount, profit FROM trades WHERE profit_cents IS NULL AND actual_profit_amount IS NOT NULL")
+        unscaled_updates = []
+        for row in cursor.fetchall():
             try:
-                actual_profit_decimal = Decimal(actual_profit_str)
-                new_profit_type = calculate_profit_type(actual_profit_decimal, rf_threshold)
-                
-                cursor.execute("SELECT profit FROM trades WHERE id = ?", (trade_id,))
-                current_profit_type = cursor.fetchone()['profit']
-                
-                if current_profit_type != new_profit_type:
-                    cursor.execute("UPDATE trades SET profit = ? WHERE id = ?", (new_profit_type, trade_id))
-                    updated_count += 1
+                new_profit_type = calculate_profit_type(Decimal(row['actual_profit_amount']), rf_threshold)
             except InvalidOperation:
-                print(f"Warning: Could not convert actual_profit_amount '{actual_profit_str}' for trade ID {trade_id} to Decimal. Skipping recalculation for this trade.")
-                continue
-            except Exception as e:
-                print(f"Error recalculating profit for trade ID {trade_id}: {e}. Skipping this trade.")
+                print(f"Warning: Could not convert actual_profit_amount '{row['actual_profit_amount']}' for trade ID {row['id']} to Decimal. Skipping recalculation for this trade.")
                 continue
+            if row['profit'] != new_profit_type:
+                unscaled_updates.append((new_profit_type, row['id']))
+        if unscaled_updates:
+            cursor.executemany("UPDATE trades SET profit = ? WHERE id = ?", unscaled_updates)
+            updated_count += len(unscaled_updates)
 
         conn.commit()
         return updated_count
@@ -687,6 +1557,11 @@ def set_working_days(days_list):
     working_days_str = ','.join(map(str, sorted(list(set(days_list)))))
     return set_setting('working_days', working_days_str)
 
+# کلیدهای تنظیمات ساعت‌های سشن‌ها (برای subscribe_settings)
+SESSION_SETTING_KEYS = tuple(f'{session_key}_session_{bound}_utc'
+                             for session_key in ('ny', 'sydney', 'tokyo', 'london')
+                             for bound in ('start', 'end'))
+
 def get_session_times_utc():
     """
     ساعت‌های شروع و پایان سشن‌های معاملاتی را به فرمت HH:MM (UTC) از تنظیمات برمی‌گرداند.
@@ -709,11 +1584,11 @@ def set_session_times_utc(session_data):
         bool: True اگر عملیات موفقیت‌آمیز باشد، False در غیر این صورت.
     """
     try:
+        session_settings = {}
         for session_key, times in session_data.items():
-            if not set_setting(f'{session_key}_session_start_utc', times['start']) or \
-               not set_setting(f'{session_key}_session_end_utc', times['end']):
-                return False
-        return True
+            session_settings[f'{session_key}_session_start_utc'] = times['start']
+            session_settings[f'{session_key}_session_end_utc'] = times['end']
+        return set_settings(session_settings)
     except Exception as e:
         print(f"Error setting session times: {e}")
         return False
@@ -724,7 +1599,7 @@ def get_unique_symbols(): # start_date and end_date parameters removed
     """
     conn, cursor = connect_db()
     try:
-        query = "SELECT DISTINCT symbol FROM trades WHERE symbol IS NOT NULL AND symbol != ''"
+        query = "SELECT symbol FROM symbol_summary WHERE symbol IS NOT NULL AND symbol != ''"
         params = [] # params list is now empty as date filters are removed
         query += " ORDER BY symbol ASC"
         
@@ -804,26 +1679,16 @@ def get_unique_errors_by_filters(trade_type_filter=None): # start_date and end_d
     خطاهای یکتا را بر اساس بازه تاریخی و نوع ترید برمی‌گرداند.
     """
     conn, cursor = connect_db()
-    errors = set()
     try:
-        query = "SELECT errors FROM trades WHERE errors IS NOT NULL AND errors != ''"
+        query = "SELECT DISTINCT e.error FROM trade_errors te JOIN error_list e ON e.id = te.error_id"
         params = []
 
-        # if start_date and end_date: # This block is removed
-        #     query += " AND date BETWEEN ? AND ?"
-        #     params.extend([start_date, end_date])
-        
         if trade_type_filter and trade_type_filter != "همه" and trade_type_filter != "همه انواع":
-            query += " AND profit = ?"
+            query += " JOIN trades t ON t.id = te.trade_id WHERE t.profit = ?"
             params.append(trade_type_filter)
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        for row in rows:
-            if row['errors']:
-                for err in row['errors'].split(', '):
-                    errors.add(err.strip())
-        return sorted(list(errors))
+        cursor.execute(query + " ORDER BY e.error ASC", params)
+        return [row['error'] for row in cursor.fetchall()]
     except sqlite3.Error as e:
         print(f"خطا در دریافت خطاهای یکتا بر اساس فیلتر: {e}")
         return []
@@ -951,6 +1816,57 @@ def delete_report_template(template_id):
     finally:
         conn.close()
 
+def get_import_manifest(file_path):
+    """
+    مشخصات آخرین وارد کردن یک فایل گزارش (اندازه، زمان تغییر، هش محتوا و واترمارک‌ها) را برمی‌گرداند.
+    Args:
+        file_path (str): مسیر مطلق فایل گزارش.
+    Returns:
+        dict or None: دیکشنری با کلیدهای file_path, file_size, file_mtime, content_hash,
+                      max_close_time_utc, max_position_id یا None اگر این فایل قبلاً وارد نشده باشد.
+    """
+    conn, cursor = connect_db()
+    try:
+        cursor.execute("""
+            SELECT file_path, file_size, file_mtime, content_hash, max_close_time_utc, max_position_id
+            FROM import_manifest WHERE file_path = ?
+        """, (file_path,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    except sqlite3.Error as e:
+        print(f"Error fetching import manifest: {e}")
+        return None
+    finally:
+        conn.close()
+
+def save_import_manifest(file_path, file_size, file_mtime, content_hash, max_close_time_utc, max_position_id):
+    """
+    مشخصات وارد کردن یک فایل گزارش را ثبت یا به‌روزرسانی می‌کند.
+    max_close_time_utc به فرمت 'YYYY-MM-DD HH:MM:SS' (UTC) است.
+    Returns:
+        bool: True در صورت موفقیت، False در غیر این صورت.
+    """
+    conn, cursor = connect_db()
+    try:
+        cursor.execute("""
+            INSERT INTO import_manifest (file_path, file_size, file_mtime, content_hash, max_close_time_utc, max_position_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (file_path) DO UPDATE SET
+                file_size = excluded.file_size,
+                file_mtime = excluded.file_mtime,
+                content_hash = excluded.content_hash,
+                max_close_time_utc = excluded.max_close_time_utc,
+                max_position_id = excluded.max_position_id,
+                imported_at = CURRENT_TIMESTAMP
+        """, (file_path, file_size, file_mtime, content_hash, max_close_time_utc, max_position_id))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print(f"Error saving import manifest: {e}")
+        return False
+    finally:
+        conn.close()
+
 # Helper function for time comparison (moved from hourly_filter or report)
 def _time_to_minutes(time_str):
     """Converts 'HH:MM' string to total minutes from midnight."""
@@ -969,7 +1885,12 @@ def _is_trade_in_time_interval(trade_datetime_obj, start_time_str, end_time_str)
     Returns:
         bool: True if trade is within interval, False otherwise.
     """
-    trade_time_minutes = trade_datetime_obj.hour * 60 + trade_datetime_obj.minute
+    return _is_minute_in_time_interval(trade_datetime_obj.hour * 60 + trade_datetime_obj.minute, start_time_str, end_time_str)
+
+def _is_minute_in_time_interval(trade_time_minutes, start_time_str, end_time_str):
+    """
+    Same as _is_trade_in_time_interval, for a precomputed minute of day (e.g. trade['minute_of_day']).
+    """
     interval_start_minutes = _time_to_minutes(start_time_str)
     interval_end_minutes = _time_to_minutes(end_time_str)
 
@@ -981,6 +1902,52 @@ def _is_trade_in_time_interval(trade_datetime_obj, start_time_str, end_time_str)
         # Trade is in interval if it's after start (on day 1) OR before end (on day 2)
         return trade_time_minutes >= interval_start_minutes or trade_time_minutes < interval_end_minutes
 
+def _trade_has_any_error_sql(trade_id_sql, error_names, params):
+    """شرط SQL: ترید حداقل یکی از خطاهای داده شده را دارد (با استفاده از ایندکس trade_errors)."""
+    params.extend(err.strip() for err in error_names)
+    return (f"EXISTS (SELECT 1 FROM trade_errors te JOIN error_list e ON e.id = te.error_id "
+            f"WHERE te.trade_id = {trade_id_sql} AND e.error IN ({','.join('?' * len(error_names))}))")
+
+def get_error_frequencies(trade_type_filter=None, weekday=None):
+    """
+    فراوانی هر خطا (تعداد تریدهای دارای آن خطا) و تعداد کل تریدهای مرتبط را برمی‌گرداند.
+    Args:
+        trade_type_filter (str): 'Profit', 'Loss', 'RF' یا None/'همه انواع' برای همه تریدها.
+        weekday (int): در صورت تعیین، فقط تریدهای این روز هفته (0=دوشنبه، بر اساس تاریخ UTC).
+    Returns:
+        tuple: (dict خطا -> تعداد, تعداد کل تریدهای مرتبط)
+    """
+    conn, cursor = connect_db()
+    try:
+        where_clauses = []
+        params = []
+        if trade_type_filter and trade_type_filter != "همه انواع":
+            where_clauses.append("t.profit = ?")
+            params.append(trade_type_filter)
+        if weekday is not None:
+            # 1970-01-01 (epoch صفر) پنجشنبه بوده است؛ 0=دوشنبه
+            where_clauses.append("((t.opened_at_utc / 86400) + 3) % 7 = ?")
+            params.append(weekday)
+        where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
+
+        cursor.execute(f"SELECT COUNT(*) FROM trades t WHERE {where_sql}", params)
+        total_trades = cursor.fetchone()[0] or 0
+
+        cursor.execute(f"""
+            SELECT e.error, COUNT(*) AS trade_count
+            FROM trade_errors te
+            JOIN error_list e ON e.id = te.error_id
+            JOIN trades t ON t.id = te.trade_id
+            WHERE {where_sql}
+            GROUP BY te.error_id
+        """, params)
+        return {row['error']: row['trade_count'] for row in cursor.fetchall()}, total_trades
+    except sqlite3.Error as e:
+        print(f"خطا در محاسبه فراوانی خطاها: {e}")
+        return {}, 0
+    finally:
+        conn.close()
+
 def get_trades_by_filters(filters=None):
     """
     تریدهای فیلتر شده را برمی‌گرداند.
@@ -1003,7 +1970,7 @@ def get_trades_by_filters(filters=None):
         filters = {}
 
     try:
-        query = "SELECT id, date, time, symbol, entry, exit, profit, errors, size, position_id, type, original_timezone, actual_profit_amount FROM trades WHERE 1=1"
+        query = f"SELECT {_TRADE_SELECT_COLUMNS} FROM trades WHERE 1=1"
         params = []
 
         # فیلتر بر اساس نوع ترید (Profit, Loss, RF, همه انواع)
@@ -1027,22 +1994,17 @@ def get_trades_by_filters(filters=None):
         error_filter = filters.get('errors')
         if error_filter:
             if error_filter == "فقط با خطا": # برای انتخاب تریدهایی که هر خطایی دارند
-                query += " AND errors IS NOT NULL AND errors != ''"
-            elif error_filter != "همه خطاها": # برای فیلتر بر اساس خطاهای خاص
+                query += " AND EXISTS (SELECT 1 FROM trade_errors te WHERE te.trade_id = trades.id)"
+            elif error_filter != "همه خطاها": # برای فیلتر بر اساس خطاهای خاص (تطابق کامل عنوان)
+                if isinstance(error_filter, str): # اگر یک خطای خاص ارسال شده باشد
+                    error_filter = [error_filter]
                 if isinstance(error_filter, list) and error_filter:
-                    error_clauses = []
-                    for err in error_filter:
-                        error_clauses.append("errors LIKE ?")
-                        params.append(f"%{err}%") # استفاده از LIKE برای جستجوی زیررشته‌ها
-                    query += " AND (" + " OR ".join(error_clauses) + ")"
-                elif isinstance(error_filter, str): # اگر یک خطای خاص ارسال شده باشد
-                    query += " AND errors LIKE ?"
-                    params.append(f"%{error_filter}%")
+                    query += " AND " + _trade_has_any_error_sql("trades.id", error_filter, params)
 
         # اگر فیلترهای دیگر (مثل hourly, weekday) را هم بخواهیم اضافه کنیم، اینجا قرار می‌گیرند.
         # فعلاً فقط همین‌ها که در error_widget استفاده شده‌اند را پوشش می‌دهیم.
 
-        query += " ORDER BY date ASC, time ASC"
+        query += " ORDER BY opened_at_utc ASC, id ASC"
         
         cursor.execute(query, params)
         rows = cursor.fetchall()
@@ -1050,12 +2012,7 @@ def get_trades_by_filters(filters=None):
             processed_row = dict(row)
             
             # تبدیل مقادیر عددی به Decimal (مشابه get_all_trades)
-            for col in ['entry', 'exit', 'size', 'actual_profit_amount']:
-                if processed_row[col] is not None and processed_row[col] != '':
-                    try:
-                        processed_row[col] = Decimal(processed_row[col])
-                    except InvalidOperation:
-                        processed_row[col] = None 
+            _hydrate_numeric_fields(processed_row)
             trades_list.append(processed_row)
             
         return trades_list
@@ -1065,6 +2022,592 @@ def get_trades_by_filters(filters=None):
     finally:
         conn.close()
 
+# --- کامپایل فیلترهای گزارش جامع به یک کوئری SQL ---
+
+# زمان باز شدن ترید (UTC) به صورت epoch ثانیه، از روی ستون‌های date و time
+# (برای پر کردن ستون opened_at_utc؛ کوئری‌ها از خود ستون ایندکس‌دار استفاده می‌کنند)
+_TRADE_UTC_EPOCH_SQL = "CAST(strftime('%s', date || ' ' || time) AS INTEGER)"
+
+_OFFSET_PROBE_STEP_SECONDS = 6 * 3600
+
+def _tz_offset_seconds(display_tz, epoch_seconds):
+    return int(datetime.fromtimestamp(epoch_seconds, display_tz).utcoffset().total_seconds())
+
+@lru_cache(maxsize=256)
+def _utc_offset_transitions_for_year(tz_name, year):
+    """
+    جدول تغییرات آفست یک منطقه زمانی در یک سال (UTC) را برمی‌گرداند.
+    Returns:
+        tuple: زوج‌های (epoch شروع, آفست به ثانیه)؛ اولین زوج از ابتدای سال شروع می‌شود.
+    """
+    display_tz = pytz.timezone(tz_name)
+    year_start = int((datetime(year, 1, 1) - datetime(1970, 1, 1)).total_seconds())
+    year_end = int((datetime(year + 1, 1, 1) - datetime(1970, 1, 1)).total_seconds())
+
+    transitions = [(year_start, _tz_offset_seconds(display_tz, year_start))]
+    probe = year_start
+    while probe < year_end:
+        next_probe = min(probe + _OFFSET_PROBE_STEP_SECONDS, year_end)
+        next_offset = _tz_offset_seconds(display_tz, next_probe)
+        if next_offset != transitions[-1][1]:
+            # جستجوی دودویی برای یافتن لحظه دقیق تغییر آفست
+            lo, hi = probe, next_probe
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if _tz_offset_seconds(display_tz, mid) == next_offset:
+                    hi = mid
+                else:
+                    lo = mid
+            transitions.append((hi, next_offset))
+        probe = next_probe
+    return tuple(transitions)
+
+def _utc_offset_segments(tz_name, start_epoch, end_epoch):
+    """
+    بازه [start_epoch, end_epoch] را به تکه‌هایی با آفست ثابت منطقه زمانی تقسیم می‌کند.
+    Returns:
+        list: زوج‌های (epoch شروع, آفست به ثانیه)؛ اولین زوج همیشه از start_epoch شروع می‌شود.
+    """
+    start_year = datetime.fromtimestamp(start_epoch, timezone.utc).year
+    end_year = datetime.fromtimestamp(end_epoch, timezone.utc).year
+
+    segments = []
+    for year in range(start_year, end_year + 1):
+        for transition_epoch, offset in _utc_offset_transitions_for_year(tz_name, year):
+            if segments and segments[-1][1] == offset:
+                continue
+            if transition_epoch <= start_epoch:
+                segments = [(start_epoch, offset)]
+            elif transition_epoch <= end_epoch:
+                segments.append((transition_epoch, offset))
+    return segments
+
+def _local_epoch_sql(utc_epoch_sql, segments):
+    """عبارت SQL که epoch محلی (UTC + آفست منطقه زمانی نمایش) را محاسبه می‌کند."""
+    if len(segments) == 1:
+        return f"({utc_epoch_sql} + {int(segments[0][1])})"
+    cases = " ".join(
+        f"WHEN {utc_epoch_sql} < {int(segments[i + 1][0])} THEN {int(segments[i][1])}"
+        for i in range(len(segments) - 1)
+    )
+    return f"({utc_epoch_sql} + CASE {cases} ELSE {int(segments[-1][1])} END)"
+
+def _discard_local_time_cache(cursor, keep_tz_name=None):
+    """کش trade_local_time را (به جز منطقه زمانی keep_tz_name) پاک می‌کند."""
+    cursor.execute("DELETE FROM trade_local_time WHERE tz_name IS NOT ?", (keep_tz_name,))
+    cursor.execute("DELETE FROM trade_local_time_state WHERE tz_name IS NOT ?", (keep_tz_name,))
+
+_local_time_cache_lock = threading.Lock()
+
+def _ensure_local_time_cache(conn, cursor, tz_name):
+    """
+    مطمئن می‌شود که تاریخ محلی، روز هفته و دقیقه روز همه تریدها برای منطقه زمانی tz_name
+    در جدول trade_local_time موجود است. فقط تریدهایی که هنوز محاسبه نشده‌اند (مثلاً تازه وارد شده‌اند)
+    با یک INSERT ... SELECT در خود SQLite محاسبه می‌شوند. پر کردن کش بین تردها (مثلاً ترد محاسبه گزارش
+    و ترد اصلی) سریالی است تا دو ترد همزمان همان ردیف‌ها را درج نکنند.
+    """
+    with _local_time_cache_lock:
+        cursor.execute("SELECT tz_rules_version FROM trade_local_time_state WHERE tz_name = ?", (tz_name,))
+        state_row = cursor.fetchone()
+        if state_row and state_row[0] == pytz.__version__:
+            return
+        if state_row:
+            # قوانین منطقه زمانی (نسخه pytz) عوض شده است؛ مقادیر قبلی معتبر نیستند
+            cursor.execute("DELETE FROM trade_local_time WHERE tz_name = ?", (tz_name,))
+
+        missing_trades_sql = """
+            FROM trades t
+            WHERE t.opened_at_utc IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM trade_local_time l WHERE l.trade_id = t.id AND l.tz_name = ?)
+        """
+        cursor.execute(f"SELECT MIN(t.opened_at_utc), MAX(t.opened_at_utc) {missing_trades_sql}", (tz_name,))
+        min_epoch, max_epoch = cursor.fetchone()
+        if min_epoch is not None:
+            local_epoch_sql = _local_epoch_sql("t.opened_at_utc", _utc_offset_segments(tz_name, int(min_epoch), int(max_epoch)))
+            # 1970-01-01 پنجشنبه بوده است (weekday() == 3)
+            cursor.execute(f"""
+                INSERT INTO trade_local_time (trade_id, tz_name, local_date, weekday, minute_of_day)
+                SELECT trade_id, ?, date(local_epoch, 'unixepoch'), ((local_epoch / 86400) + 3) % 7, (local_epoch / 60) % 1440
+                FROM (SELECT t.id AS trade_id, {local_epoch_sql} AS local_epoch {missing_trades_sql})
+            """, (tz_name, tz_name))
+        cursor.execute("INSERT OR REPLACE INTO trade_local_time_state (tz_name, tz_rules_version) VALUES (?, ?)",
+                       (tz_name, pytz.__version__))
+        conn.commit()
+
+def _time_interval_sql(minute_of_day_sql, start_time_str, end_time_str, params):
+    """
+    معادل SQL تابع _is_trade_in_time_interval (شامل بازه‌های شبانه).
+    """
+    interval_start_minutes = _time_to_minutes(start_time_str)
+    interval_end_minutes = _time_to_minutes(end_time_str)
+    params.extend([interval_start_minutes, interval_end_minutes])
+    if interval_start_minutes <= interval_end_minutes:
+        return f"({minute_of_day_sql} >= ? AND {minute_of_day_sql} < ?)"
+    return f"({minute_of_day_sql} >= ? OR {minute_of_day_sql} < ?)"
+
+def _local_day_start_epoch(display_tz, date_str):
+    local_midnight = display_tz.localize(datetime.strptime(date_str, '%Y-%m-%d'), is_dst=False)
+    return int(local_midnight.astimezone(pytz.utc).timestamp())
+
+def compile_report_filters(filters, display_timezone_name, time_bounds=None, local_time_cache=False):
+    """
+    دیکشنری فیلترهای قالب گزارش را به بخش‌های یک کوئری پارامتری SQL تبدیل می‌کند.
+    فیلترهای بازه تاریخی، روز هفته و سشن/ساعات روز بر اساس منطقه زمانی نمایش اعمال می‌شوند.
+    Args:
+        filters (dict): فیلترهای گزارش (ساختار ReportWindow.current_filters).
+        display_timezone_name (str): منطقه زمانی نمایش.
+        time_bounds (tuple): (کمترین, بیشترین) epoch تریدها؛ برای ساخت جدول آفست منطقه زمانی
+                             وقتی بازه تاریخی مشخص نشده است.
+        local_time_cache (bool): اگر True باشد، روز هفته و دقیقه روز از جدول trade_local_time (با نام مستعار l)
+                                 خوانده می‌شوند؛ فراخواننده باید قبلاً _ensure_local_time_cache را صدا زده باشد.
+    Returns:
+        tuple: (source_sql, where_sql, params) که source_sql جدول trades با نام مستعار t است.
+               پارامترهای source_sql در ابتدای params قرار دارند.
+    """
+    if filters is None:
+        filters = {}
+
+    display_tz = pytz.timezone(display_timezone_name)
+    where_clauses = []
+    params = []
+
+    # 1. بازه تاریخی (تاریخ‌ها در منطقه زمانی نمایش هستند)
+    date_range_filter = filters.get("date_range") or {}
+    start_date_str = date_range_filter.get("start_date")
+    end_date_str = date_range_filter.get("end_date")
+    if start_date_str and end_date_str:
+        try:
+            range_start_epoch = _local_day_start_epoch(display_tz, start_date_str)
+            next_day_str = (datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            range_end_epoch = _local_day_start_epoch(display_tz, next_day_str)
+            where_clauses.append("t.opened_at_utc >= ? AND t.opened_at_utc < ?")
+            params.extend([range_start_epoch, range_end_epoch])
+            time_bounds = (range_start_epoch, range_end_epoch)
+        except ValueError as e:
+            print(f"Error parsing date strings in compile_report_filters for date_range: {e}. Skipping date filter.")
+
+    # 2. نمادها
+    selected_instruments = filters.get("instruments", "همه")
+    if selected_instruments != "همه" and isinstance(selected_instruments, list) and selected_instruments:
+        where_clauses.append(f"t.symbol IN ({','.join('?' * len(selected_instruments))})")
+        params.extend(selected_instruments)
+
+    # 3. نوع ترید
+    selected_trade_type = filters.get("trade_type", "همه")
+    if selected_trade_type != "همه":
+        where_clauses.append("t.profit = ?")
+        params.append(selected_trade_type)
+
+    # 4. خطاها (از طریق جدول trade_errors)
+    selected_errors = filters.get("errors", "همه خطاها")
+    if selected_errors != "همه خطاها" and isinstance(selected_errors, list):
+        if selected_errors:
+            where_clauses.append(_trade_has_any_error_sql("t.id", selected_errors, params))
+        else:
+            where_clauses.append("NOT EXISTS (SELECT 1 FROM trade_errors te WHERE te.trade_id = t.id)")
+
+    # 5 و 6. روز هفته و سشن/ساعات روز، بر اساس زمان محلی
+    selected_weekdays = filters.get("weekday", "همه")
+    filter_weekdays = selected_weekdays != "همه" and isinstance(selected_weekdays, list) and selected_weekdays
+
+    selected_sessions = filters.get("sessions", "همه")
+    hourly_filter_data = filters.get("hourly") or {}
+    hourly_mode = hourly_filter_data.get("mode")
+    filter_hours = not (selected_sessions == "همه" and hourly_mode == "full_session")
+
+    if local_time_cache:
+        weekday_sql = "l.weekday"
+        minute_of_day_sql = "l.minute_of_day"
+    else:
+        local_epoch_sql = "t.opened_at_utc"
+        if filter_weekdays or filter_hours:
+            if time_bounds and time_bounds[0] is not None and time_bounds[1] is not None:
+                segments = _utc_offset_segments(display_timezone_name, int(time_bounds[0]), int(time_bounds[1]))
+            else:
+                now_epoch = int(datetime.now(pytz.utc).timestamp())
+                segments = _utc_offset_segments(display_timezone_name, now_epoch, now_epoch)
+            local_epoch_sql = _local_epoch_sql("t.opened_at_utc", segments)
+        # 1970-01-01 پنجشنبه بوده است (weekday() == 3)
+        weekday_sql = f"((({local_epoch_sql} / 86400) + 3) % 7)"
+        minute_of_day_sql = f"(({local_epoch_sql} / 60) % 1440)"
+
+    if filter_weekdays:
+        where_clauses.append(f"{weekday_sql} IN ({','.join('?' * len(selected_weekdays))})")
+        params.extend(int(day) for day in selected_weekdays)
+
+    if filter_hours:
+        if selected_sessions == "همه":
+            pass
+        elif isinstance(selected_sessions, list) and selected_sessions:
+            all_session_times_display = get_session_times_with_display_utc(display_timezone_name)
+            session_clauses = []
+            for sess_key in selected_sessions:
+                session_detail = all_session_times_display.get(sess_key)
+                if session_detail:
+                    session_clauses.append(_time_interval_sql(minute_of_day_sql, session_detail['start_display'], session_detail['end_display'], params))
+            where_clauses.append("(" + " OR ".join(session_clauses) + ")" if session_clauses else "0")
+        else:
+            where_clauses.append("0")
+
+        if hourly_mode == "full_session":
+            pass
+        elif hourly_mode in ["session_segmentation", "hourly_segmentation", "half_hourly_segmentation", "quarter_hourly_segmentation"]:
+            intervals_key = "segments" if hourly_mode == "session_segmentation" else "intervals"
+            interval_clauses = [
+                _time_interval_sql(minute_of_day_sql, interval['start'], interval['end'], params)
+                for interval in hourly_filter_data.get(intervals_key, [])
+            ]
+            where_clauses.append("(" + " OR ".join(interval_clauses) + ")" if interval_clauses else "0")
+        else:
+            where_clauses.append("0")
+
+    source_sql = "trades AS t"
+    if local_time_cache:
+        source_sql += " LEFT JOIN trade_local_time AS l ON l.trade_id = t.id AND l.tz_name = ?"
+        params.insert(0, display_timezone_name)
+    where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
+    return source_sql, where_sql, params
+
+def _compile_cached_report_filters(conn, cursor, filters, display_timezone_name):
+    """کش زمان محلی را آماده می‌کند و فیلترهای گزارش را روی آن کامپایل می‌کند."""
+    _ensure_local_time_cache(conn, cursor, display_timezone_name)
+    return compile_report_filters(filters, display_timezone_name, local_time_cache=True)
+
+def get_trades_for_report(filters, display_timezone_name):
+    """
+    تریدهای منطبق با فیلترهای گزارش جامع را مستقیماً از دیتابیس (با یک کوئری) برمی‌گرداند.
+    تاریخ و ساعت تریدها به منطقه زمانی نمایش تبدیل می‌شوند (مشابه get_all_trades) و هر ترید یک شیء Trade
+    است که کلیدهای weekday و minute_of_day (زمان محلی، از کش trade_local_time) را هم دارد.
+    """
+    conn, cursor = connect_db()
+    trades_list = []
+    try:
+        display_tz = pytz.timezone(display_timezone_name)
+        source_sql, where_sql, params = _compile_cached_report_filters(conn, cursor, filters, display_timezone_name)
+
+        cursor.execute(f"""
+            SELECT {_TRADE_SELECT_COLUMNS}, l.local_date AS local_date, l.weekday AS weekday, l.minute_of_day AS minute_of_day
+            FROM {source_sql} WHERE {where_sql} ORDER BY t.opened_at_utc ASC, t.id ASC
+        """, params)
+        trades_list = _fetch_trades(cursor, display_tz)
+        return trades_list
+    except sqlite3.Error as e:
+        print(f"خطا در دریافت تریدهای گزارش: {e}")
+        return []
+    finally:
+        conn.close()
+
+# --- صفحه‌بندی keyset لیست تریدها (برای Treeview مجازی) ---
+
+# کلید مرتب‌سازی -> عبارت‌های SQL کلید صفحه‌بندی؛ t.id همیشه به انتهای کلید اضافه می‌شود.
+# عبارت‌ها هیچ‌وقت NULL نیستند تا مقایسه سطری (row value) درست کار کند.
+TRADE_SORT_KEYS = {
+    'time': ('t.date', 't.time'), # زمان UTC باز شدن (ایندکس idx_trades_date_time)
+    'id': (),
+    'symbol': ('t.symbol',),
+    'profit': ('t.profit',),
+    'type': ("IFNULL(t.type, '')",),
+    'errors': ("IFNULL(t.errors, '')",),
+    'position_id': ('IFNULL(CAST(t.position_id AS INTEGER), 0)',),
+    'entry': (f'COALESCE(t.entry_scaled, CAST(t.entry AS REAL) * {10 ** PRICE_SCALE_DIGITS}, 0)',),
+    'exit': (f'COALESCE(t.exit_scaled, CAST(t.exit AS REAL) * {10 ** PRICE_SCALE_DIGITS}, 0)',),
+    'size': (f'COALESCE(t.size_centilots, CAST(t.size AS REAL) * {10 ** SIZE_SCALE_DIGITS}, 0)',),
+    'actual_profit_amount': (f'COALESCE(t.profit_cents, CAST(t.actual_profit_amount AS REAL) * {10 ** PROFIT_SCALE_DIGITS}, 0)',),
+}
+
+def _compile_trade_list_source(conn, cursor, filters, display_timezone_name):
+    # filters=None یعنی همه تریدها (پنجره لیست تریدها)؛ در غیر این صورت فیلترهای گزارش جامع
+    if filters is None:
+        _ensure_local_time_cache(conn, cursor, display_timezone_name)
+        return "trades AS t LEFT JOIN trade_local_time AS l ON l.trade_id = t.id AND l.tz_name = ?", "1=1", [display_timezone_name]
+    return _compile_cached_report_filters(conn, cursor, filters, display_timezone_name)
+
+def count_trades(display_timezone_name, filters=None):
+    """
+    تعداد تریدهای لیست (همه تریدها یا تریدهای منطبق با فیلترهای گزارش جامع) را برمی‌گرداند.
+    """
+    conn, cursor = connect_db()
+    try:
+        if filters is None:
+            cursor.execute("SELECT COUNT(*) FROM trades")
+            return cursor.fetchone()[0]
+        source_sql, where_sql, params = _compile_trade_list_source(conn, cursor, filters, display_timezone_name)
+        cursor.execute(f"SELECT COUNT(*) FROM {source_sql} WHERE {where_sql}", params)
+        return cursor.fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"خطا در شمارش تریدها: {e}")
+        return 0
+    finally:
+        conn.close()
+
+def get_trades_page(display_timezone_name, filters=None, sort_key='time', descending=False,
+                    after=None, before=None, offset=0, limit=100):
+    """
+    یک صفحه از لیست تریدها را با صفحه‌بندی keyset (بدون OFFSET) برمی‌گرداند.
+    Args:
+        display_timezone_name (str): منطقه زمانی نمایش.
+        filters (dict): فیلترهای گزارش جامع؛ None برای همه تریدها.
+        sort_key (str): یکی از کلیدهای TRADE_SORT_KEYS.
+        descending (bool): مرتب‌سازی نزولی.
+        after (tuple): کلید آخرین ردیف نمایش داده شده؛ ردیف‌های بعد از آن برگردانده می‌شوند.
+        before (tuple): کلید اولین ردیف نمایش داده شده؛ ردیف‌های قبل از آن برگردانده می‌شوند.
+        offset (int): فقط برای پرش مستقیم (مثلاً کشیدن اسکرول‌بار) وقتی کلیدی در دست نیست.
+        limit (int): حداکثر تعداد ردیف‌ها.
+    Returns:
+        list: زوج‌های (کلید صفحه‌بندی, Trade) به ترتیب نمایش.
+    """
+    conn, cursor = connect_db()
+    try:
+        display_tz = pytz.timezone(display_timezone_name)
+        source_sql, where_sql, params = _compile_trade_list_source(conn, cursor, filters, display_timezone_name)
+
+        key_columns = TRADE_SORT_KEYS[sort_key] + ('t.id',)
+        key_row_sql = f"({', '.join(key_columns)})"
+        key_placeholders = f"({', '.join('?' * len(key_columns))})"
+        select_key_sql = ", ".join(key_columns)
+        if offset:
+            # پرش مستقیم: ابتدا فقط کلید ردیف offset پیدا می‌شود (بدون خواندن ستون‌های ترید) و صفحه از همان کلید خوانده می‌شود
+            order_sql = ", ".join(f"{column} {'DESC' if descending else 'ASC'}" for column in key_columns)
+            cursor.execute(f"SELECT {select_key_sql} FROM {source_sql} WHERE {where_sql} ORDER BY {order_sql} LIMIT 1 OFFSET ?",
+                           params + [offset])
+            offset_key_row = cursor.fetchone()
+            if offset_key_row is None:
+                return []
+            where_sql = f"({where_sql}) AND {key_row_sql} {'<=' if descending else '>='} {key_placeholders}"
+            params = params + list(offset_key_row)
+        if after is not None:
+            where_sql = f"({where_sql}) AND {key_row_sql} {'<' if descending else '>'} {key_placeholders}"
+            params = params + list(after)
+        if before is not None:
+            where_sql = f"({where_sql}) AND {key_row_sql} {'>' if descending else '<'} {key_placeholders}"
+            params = params + list(before)
+
+        # صفحه قبلی به ترتیب معکوس خوانده و سپس برگردانده می‌شود
+        scan_descending = descending != (before is not None)
+        order_sql = ", ".join(f"{column} {'DESC' if scan_descending else 'ASC'}" for column in key_columns)
+        cursor.execute(f"""
+            SELECT {select_key_sql}, {_TRADE_SELECT_COLUMNS}, l.local_date, l.weekday, l.minute_of_day
+            FROM {source_sql} WHERE {where_sql}
+            ORDER BY {order_sql} LIMIT ?
+        """, params + [limit])
+
+        key_width = len(key_columns)
+        shared_strings = {}
+        page = [(tuple(row[:key_width]), _trade_from_row(row[key_width:], display_tz, shared_strings))
+                for row in cursor.fetchall()]
+        if before is not None:
+            page.reverse()
+        return page
+    except sqlite3.Error as e:
+        print(f"خطا در دریافت صفحه تریدها: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_trades_frame(filters, display_timezone_name):
+    """
+    تریدهای منطبق با فیلترهای گزارش جامع را به صورت ستونی (trade_frame.TradeFrame، آرایه‌های NumPy)
+    برمی‌گرداند تا آمارها (سود کل، وین ریت، فراوانی خطاها، شمارش در بازه‌های زمانی) برداری محاسبه شوند.
+    Returns:
+        TradeFrame: یا None در صورت بروز خطا.
+    """
+    # NumPy فقط برای گزارش‌ها لازم است؛ ویجت خطاها (که db_manager را وارد می‌کند) به آن وابسته نمی‌شود
+    from trade_frame import TradeFrame
+
+    conn, cursor = connect_db()
+    try:
+        cache_key = _report_cache_key(cursor, 'trades_frame', filters, display_timezone_name)
+        cached_frame = _report_cache_get(cache_key)
+        if cached_frame is not None:
+            return cached_frame
+        source_sql, where_sql, params = _compile_cached_report_filters(conn, cursor, filters, display_timezone_name)
+        cursor.execute(f"""
+            SELECT t.id, t.opened_at_utc, l.weekday, l.minute_of_day, t.symbol, t.profit, t.profit_cents, t.actual_profit_amount
+            FROM {source_sql} WHERE {where_sql} ORDER BY t.opened_at_utc ASC, t.id ASC
+        """, params)
+        trade_rows = cursor.fetchall()
+        cursor.execute(f"""
+            SELECT te.trade_id, te.error_id FROM trade_errors te
+            WHERE te.trade_id IN (SELECT t.id FROM {source_sql} WHERE {where_sql})
+        """, params)
+        error_links = cursor.fetchall()
+        cursor.execute("SELECT id, error FROM error_list")
+        error_names_by_id = {row['id']: row['error'] for row in cursor.fetchall()}
+        trade_frame = TradeFrame.from_query_rows(trade_rows, error_links, error_names_by_id, PROFIT_SCALE_DIGITS)
+        _report_cache_put(cache_key, trade_frame)
+        return trade_frame
+    except sqlite3.Error as e:
+        print(f"خطا در دریافت تریدهای گزارش (ستونی): {e}")
+        return None
+    finally:
+        conn.close()
+
+# --- کش نتایج تجمیعی گزارش‌ها ---
+# نتایج get_report_stats، get_symbol_pnl و get_trades_frame با کلید (نسخه داده‌ها، منطقه زمانی، ساعات سشن‌ها،
+# اثر انگشت فیلترها) نگه داشته می‌شوند؛ بازگشت به گزارشی که قبلاً دیده شده دوباره محاسبه نمی‌شود.
+# افزودن/حذف/ویرایش تریدها، وارد کردن از فایل، ویرایش خطاها و محاسبه مجدد RF همگی با تریگرها
+# شماره data_version را بالا می‌برند، پس نتیجه‌ای که با داده‌های قدیمی محاسبه شده دیگر استفاده نمی‌شود.
+
+REPORT_CACHE_SIZE = 32
+_report_cache = OrderedDict()
+_report_cache_lock = threading.Lock()
+
+def report_filters_fingerprint(filters):
+    """
+    هش پایدار دیکشنری فیلترهای گزارش (مستقل از ترتیب کلیدها).
+    """
+    canonical_filters = json.dumps(filters, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical_filters.encode('utf-8')).hexdigest()
+
+def get_data_version(cursor=None):
+    """
+    شماره نسخه داده‌های تریدها و خطاها را برمی‌گرداند که با هر تغییر در آن‌ها افزایش می‌یابد.
+    Returns:
+        int: یا None در صورت بروز خطا.
+    """
+    if cursor is not None:
+        cursor.execute("SELECT version FROM data_version WHERE id = 1")
+        row = cursor.fetchone()
+        return row[0] if row else None
+    conn, cursor = connect_db()
+    try:
+        return get_data_version(cursor)
+    except sqlite3.Error as e:
+        print(f"خطا در خواندن نسخه داده‌ها: {e}")
+        return None
+    finally:
+        conn.close()
+
+def _report_cache_key(cursor, result_kind, filters, display_timezone_name):
+    return (DATABASE_NAME, get_data_version(cursor), result_kind, display_timezone_name,
+            tuple(get_setting(key) for key in SESSION_SETTING_KEYS), report_filters_fingerprint(filters))
+
+def _report_cache_get(cache_key):
+    with _report_cache_lock:
+        if cache_key not in _report_cache:
+            return None
+        _report_cache.move_to_end(cache_key)
+        return _report_cache[cache_key]
+
+def _report_cache_put(cache_key, value):
+    with _report_cache_lock:
+        _report_cache[cache_key] = value
+        _report_cache.move_to_end(cache_key)
+        while len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+
+def clear_report_cache():
+    """
+    کش نتایج گزارش‌ها را خالی می‌کند (مثلاً بعد از تغییر مستقیم دیتابیس خارج از تریگرها).
+    """
+    with _report_cache_lock:
+        _report_cache.clear()
+
+def _unscaled_profit_total(cursor, source_sql, where_sql, params):
+    # سود/ضررهایی که با دو رقم اعشار دقیقاً قابل نمایش نبوده‌اند (profit_cents خالی) از مقدار TEXT جمع زده می‌شوند
+    cursor.execute(f"""
+        SELECT t.actual_profit_amount FROM {source_sql}
+        WHERE ({where_sql}) AND t.profit_cents IS NULL AND t.actual_profit_amount IS NOT NULL AND t.actual_profit_amount != ''
+    """, params)
+    total = Decimal('0')
+    for row in cursor.fetchall():
+        try:
+            total += Decimal(row[0])
+        except InvalidOperation:
+            pass
+    return total
+
+def get_report_stats(filters, display_timezone_name):
+    """
+    آمار خلاصه تریدهای منطبق با فیلترهای گزارش جامع را مستقیماً در SQLite (روی ستون profit_cents) محاسبه می‌کند.
+    Returns:
+        dict: کلیدهای trade_count, total_profit (Decimal), profit_count, loss_count, rf_count, win_rate (درصد)
+    """
+    conn, cursor = connect_db()
+    stats = {'trade_count': 0, 'total_profit': Decimal('0'), 'profit_count': 0, 'loss_count': 0, 'rf_count': 0, 'win_rate': 0}
+    try:
+        cache_key = _report_cache_key(cursor, 'report_stats', filters, display_timezone_name)
+        cached_stats = _report_cache_get(cache_key)
+        if cached_stats is not None:
+            return dict(cached_stats)
+        source_sql, where_sql, params = _compile_cached_report_filters(conn, cursor, filters, display_timezone_name)
+        cursor.execute(f"""
+            SELECT COUNT(*) AS trade_count,
+                   COALESCE(SUM(t.profit_cents), 0) AS profit_cents_total,
+                   COALESCE(SUM(t.profit_cents IS NULL AND t.actual_profit_amount IS NOT NULL AND t.actual_profit_amount != ''), 0) AS unscaled_count,
+                   COALESCE(SUM(t.profit = 'Profit'), 0) AS profit_count,
+                   COALESCE(SUM(t.profit = 'Loss'), 0) AS loss_count,
+                   COALESCE(SUM(t.profit = 'RF'), 0) AS rf_count
+            FROM {source_sql} WHERE {where_sql}
+        """, params)
+        row = cursor.fetchone()
+        total_profit = _from_scaled_int(row['profit_cents_total'], PROFIT_SCALE_DIGITS)
+        if row['unscaled_count']:
+            total_profit += _unscaled_profit_total(cursor, source_sql, where_sql, params)
+
+        total_decisive_trades = row['profit_count'] + row['loss_count']
+        stats.update({
+            'trade_count': row['trade_count'],
+            'total_profit': total_profit,
+            'profit_count': row['profit_count'],
+            'loss_count': row['loss_count'],
+            'rf_count': row['rf_count'],
+            'win_rate': (row['profit_count'] / total_decisive_trades * 100) if total_decisive_trades > 0 else 0,
+        })
+        _report_cache_put(cache_key, dict(stats))
+        return stats
+    except sqlite3.Error as e:
+        print(f"خطا در محاسبه آمار گزارش: {e}")
+        return stats
+    finally:
+        conn.close()
+
+def get_symbol_pnl(filters, display_timezone_name):
+    """
+    سود/ضرر و تعداد تریدهای هر نماد را برای تریدهای منطبق با فیلترهای گزارش جامع در SQLite محاسبه می‌کند.
+    Returns:
+        list: لیستی از دیکشنری‌ها با کلیدهای symbol, trade_count, total_profit (Decimal), profit_count, loss_count
+              (مرتب شده بر اساس سود کل، از بیشترین)
+    """
+    conn, cursor = connect_db()
+    try:
+        cache_key = _report_cache_key(cursor, 'symbol_pnl', filters, display_timezone_name)
+        cached_result = _report_cache_get(cache_key)
+        if cached_result is not None:
+            return [dict(item) for item in cached_result]
+        source_sql, where_sql, params = _compile_cached_report_filters(conn, cursor, filters, display_timezone_name)
+        cursor.execute(f"""
+            SELECT t.symbol AS symbol,
+                   COUNT(*) AS trade_count,
+                   COALESCE(SUM(t.profit_cents), 0) AS profit_cents_total,
+                   COALESCE(SUM(t.profit_cents IS NULL AND t.actual_profit_amount IS NOT NULL AND t.actual_profit_amount != ''), 0) AS unscaled_count,
+                   COALESCE(SUM(t.profit = 'Profit'), 0) AS profit_count,
+                   COALESCE(SUM(t.profit = 'Loss'), 0) AS loss_count
+            FROM {source_sql} WHERE {where_sql}
+            GROUP BY t.symbol
+        """, params)
+        symbol_rows = cursor.fetchall()
+        result = []
+        for row in symbol_rows:
+            total_profit = _from_scaled_int(row['profit_cents_total'], PROFIT_SCALE_DIGITS)
+            if row['unscaled_count']:
+                total_profit += _unscaled_profit_total(cursor, source_sql, f"({where_sql}) AND t.symbol IS ?", params + [row['symbol']])
+            result.append({
+                'symbol': row['symbol'],
+                'trade_count': row['trade_count'],
+                'total_profit': total_profit,
+                'profit_count': row['profit_count'],
+                'loss_count': row['loss_count'],
+            })
+        result.sort(key=lambda item: item['total_profit'], reverse=True)
+        _report_cache_put(cache_key, [dict(item) for item in result])
+        return result
+    except sqlite3.Error as e:
+        print(f"خطا در محاسبه سود/ضرر نمادها: {e}")
+        return []
+    finally:
+        conn.close()
+
 if __name__ == '__main__':
     migrate_database()
     print("Database schema checked and migrated if necessary.")
\ No newline at end of file
@@ -47,49 +47,20 @@ def show_error_frequency_widget(parent_window=None, open_toplevel_windows_list=N
         # دریافت آستانه درصد فراوانی از دیتابیس (فقط برای حالاتی که نیاز است)
         frequency_threshold = db_manager.get_error_frequency_threshold()
         
-        raw_errors_all_trades = []
-        trade_ids_for_error_check = [] # برای نگهداری ID تریدهایی که باید خطاهاشون شمارش بشه
-
-        # گام اول: اعمال فیلتر کمبوباکس (فراوانی اشتباهات در زیان‌ها/سودها/کلی)
+        # گام اول: تعیین نوع ترید بر اساس کمبوباکس (فراوانی اشتباهات در زیان‌ها/سودها/کلی)
+        trade_type_filter = 'همه انواع' # 'همه انواع' یعنی همه Profit, Loss, RF
         if selected_mode == "فراوانی اشتباهات در زیان‌ها":
-            # get_trades_by_filters را با فیلتر profit='Loss' و بدون فیلتر تاریخ استفاده می‌کنیم
-            filtered_trades = db_manager.get_trades_by_filters(filters={'trade_type': 'Loss'}) 
+            trade_type_filter = 'Loss'
         elif selected_mode == "فراوانی اشتباهات در سودها":
-            # get_trades_by_filters را با فیلتر profit='Profit' و بدون فیلتر تاریخ استفاده می‌کنیم
-            filtered_trades = db_manager.get_trades_by_filters(filters={'trade_type': 'Profit'}) 
-        elif selected_mode == "فراوانی کلی":
-            # get_trades_by_filters را بدون فیلتر profit یا تاریخ استفاده می‌کنیم (همه تریدها)
-            filtered_trades = db_manager.get_trades_by_filters(filters={'trade_type': 'همه انواع'}) # 'همه انواع' یعنی همه Profit, Loss, RF
-
-        # گام دوم: اعمال فیلتر روز جاری هفته (اگر چک‌باکس تیک خورده باشد)
-        final_filtered_trades = []
+            trade_type_filter = 'Profit'
+
+        # گام دوم: فیلتر روز جاری هفته (اگر چک‌باکس تیک خورده باشد)
+        weekday_filter = None
         if filter_by_current_weekday_var.get():
-            current_weekday_python_index = datetime.now().weekday() # 0=Monday, ..., 6=Sunday
-            for trade in filtered_trades:
-                trade_date_str = trade['date'] # تاریخ ترید به فرم YYYY-MM-DD (UTC)
-                # برای بررسی روز هفته، نیاز به یک datetime object از تاریخ ترید داریم
-                try:
-                    trade_datetime_obj = datetime.strptime(trade_date_str, '%Y-%m-%d')
-                    if trade_datetime_obj.weekday() == current_weekday_python_index:
-                        final_filtered_trades.append(trade)
-                except ValueError:
-                    # اگر فرمت تاریخ اشتباه بود، این ترید را نادیده می‌گیریم یا خطا چاپ می‌کنیم
-                    print(f"Warning: Could not parse date {trade_date_str} for weekday filter.")
-                    continue
-        else:
-            final_filtered_trades = filtered_trades
-
-        raw_errors = [trade['errors'] for trade in final_filtered_trades]
-        total_relevant_trades = len(final_filtered_trades)
-
-        # شمارش خطاها
-        error_counts = {}
-        for error_string in raw_errors:
-            if error_string:
-                # استفاده از set برای شمارش هر خطا یک بار در هر ترید
-                error_list_for_trade = [e.strip() for e in error_string.split(",")]
-                for error in set(error_list_for_trade):
-                    error_counts[error] = error_counts.get(error, 0) + 1
+            weekday_filter = datetime.now().weekday() # 0=Monday, ..., 6=Sunday
+
+        # شمارش خطاها (هر خطا یک بار در هر ترید) با یک کوئری GROUP BY روی جدول trade_errors
+        error_counts, total_relevant_trades = db_manager.get_error_frequencies(trade_type_filter, weekday_filter)
 
         # نمایش یا عدم نمایش Treeview بر اساس وجود خطا
         # و یا وجود ترید مرتبط برای محاسبه درصد
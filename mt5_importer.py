@@ -1,255 +1,696 @@
 # mt5_importer.py
 
 import pandas as pd
+import openpyxl
+import csv
+import codecs
+from html.parser import HTMLParser
 import db_manager
 import os
-from datetime import datetime
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import re 
-from decimal import Decimal, InvalidOperation 
+import hashlib
+import sqlite3
+from datetime import datetime
+from decimal import Decimal 
 import pytz # برای کار با تایم زون ها
 
-def _clean_numeric_value(value):
+MT5_SOURCE_TIMEZONE = 'Etc/GMT-3' # UTC+3:00
+
+MT5_DATE_FORMATS = ['%Y.%m.%d %H:%M:%S', '%Y.%m.%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M']
+
+MT5_COLUMN_MAP = {
+    'Time': 'open_time_raw',
+    'Position': 'position_id',
+    'Symbol': 'symbol',
+    'Type': 'trade_type',
+    'Volume': 'size_raw',
+    'Price': 'entry_price_raw',
+    'S / L': 'stop_loss_raw',
+    'T / P': 'take_profit_raw',
+    'Time.1': 'close_time_raw', 
+    'Price.1': 'exit_price_raw', 
+    'Commission': 'commission_raw',
+    'Swap': 'swap_raw',
+    'Profit': 'profit_amount_raw' 
+}
+
+KEYWORDS_TO_IGNORE_IN_TRADE_TYPE = ['limit', 'filled', 'in', 'out', 'market', 'canceled', 'modify', 'delete', 'buy limit', 'sell limit', 'buy stop', 'sell stop', 'close by'] 
+
+# عدد اعشاری معتبر بعد از پاکسازی (بدون nan/inf که Decimal قبول می‌کند ولی برای ما بی‌معنی است)
+_DECIMAL_PATTERN = r'^[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$'
+
+REJECTION_COLUMNS = ['row_index', 'position_id', 'reason']
+
+def _text_column(df, column_name):
+    """ستون را به صورت رشته‌های strip شده برمی‌گرداند (مقادیر خالی/NaN به '' تبدیل می‌شوند)."""
+    if column_name not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    column = df[column_name]
+    return column.where(column.notna(), '').astype(str).str.strip()
+
+def _clean_numeric_column(series):
     """
-    مقادیر رشته‌ای را پاکسازی کرده و به Decimal تبدیل می‌کند.
-    اگر نتواند به Decimal تبدیل کند، None برمی‌گرداند.
+    معادل ستونی پاکسازی مقادیر عددی: حذف فاصله‌های nbsp و جداکننده هزارگان،
+    برداشتن بخش اول مقادیری مثل '0.10 / 0.10'، حذف فاصله هزارگان گزارش HTML (مثل '1 050.00') و تبدیل به Decimal.
+    مقادیری که قابل تبدیل نیستند None می‌شوند. (دقت Decimal حفظ می‌شود، بدون عبور از float)
     """
-    if pd.isna(value) or str(value).strip() == '':
-        return None
-    
-    s_value = str(value).strip().replace('\xa0', '').replace(',', '')
-
-    if '/' in s_value:
-        parts = s_value.split('/')
-        try:
-            result = Decimal(parts[0].strip())
-            return result
-        except InvalidOperation:
-            return None
-    
-    try:
-        result = Decimal(s_value)
-        return result
-    except InvalidOperation:
-        return None
+    cleaned = series.where(series.notna(), '').astype(str).str.strip()
+    cleaned = cleaned.str.replace('\xa0', '', regex=False).str.replace(',', '', regex=False)
+    cleaned = cleaned.str.split('/', n=1).str[0].str.replace(' ', '', regex=False)
+    is_valid = cleaned.str.fullmatch(_DECIMAL_PATTERN)
+    result = pd.Series(None, index=series.index, dtype=object)
+    result[is_valid] = cleaned[is_valid].map(Decimal)
+    return result
 
-def process_mt5_report_for_preview(file_path):
+def _parse_datetime_column(series):
+    """
+    رشته‌های زمان متاتریدر را با فرمت‌های صریح (به ترتیب MT5_DATE_FORMATS) به datetime تبدیل می‌کند.
+    ردیف‌هایی که با هیچ فرمتی خوانده نشوند NaT می‌مانند.
+    """
+    parsed = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+    for fmt in MT5_DATE_FORMATS:
+        remaining = parsed.isna() & (series != '')
+        if not remaining.any():
+            break
+        parsed[remaining] = pd.to_datetime(series[remaining], format=fmt, errors='coerce')
+    return parsed
+
+def _rejections_frame(df, mask, reason, position_ids=None):
+    """ردیف‌های mask را همراه با دلیل رد شدن، به فرمت جدول رد شده‌ها برمی‌گرداند."""
+    if position_ids is None:
+        position_ids = _text_column(df, 'position_id')
+    return pd.DataFrame({
+        'row_index': df.index[mask],
+        'position_id': position_ids[mask].values,
+        'reason': reason,
+    }, columns=REJECTION_COLUMNS)
+
+def parse_mt5_positions(df_raw, rf_threshold, existing_position_ids=None):
+    """
+    بخش Positions گزارش متاتریدر 5 (با نام ستون‌های اصلی گزارش) را به صورت برداری پردازش می‌کند.
+    Args:
+        df_raw (pd.DataFrame): ردیف‌های خام گزارش.
+        rf_threshold (Decimal or None): آستانه ریسک فری برای تعیین Profit/Loss/RF.
+        existing_position_ids (set, optional): position_idهایی که تکراری حساب می‌شوند.
+            اگر None باشد، یکجا از دیتابیس خوانده می‌شوند.
+    Returns:
+        tuple: (prepared_trades_list, duplicate_count, rejections)
+               rejections یک DataFrame با ستون‌های row_index, position_id, reason است.
     """
-    تریدهای اکسل (یا CSV صادر شده از اکسل) متاتریدر 5 را می‌خواند، داده‌های اولیه را پردازش کرده
+    df = df_raw.drop(columns=['Unnamed: 13'], errors='ignore').rename(columns=MT5_COLUMN_MAP)
+    rejections = []
+
+    # فیلترهای سطح ردیف گزارش (ردیف‌های Orders/Deals، ردیف‌های خلاصه و معاملات باز)
+    position_numeric = pd.to_numeric(df['position_id'], errors='coerce') if 'position_id' in df.columns \
+        else pd.Series(float('nan'), index=df.index)
+    row_filters = [
+        (position_numeric.isna(), "Position ID نامعتبر"),
+        (df['symbol'].isna() if 'symbol' in df.columns else pd.Series(False, index=df.index), "نماد خالی"),
+    ]
+    if 'close_time_raw' in df.columns and 'exit_price_raw' in df.columns:
+        row_filters.append((
+            (_text_column(df, 'close_time_raw') == '') | (_text_column(df, 'exit_price_raw') == ''),
+            "ترید بسته نشده (زمان/قیمت خروج خالی)"
+        ))
+    profit_amount = _clean_numeric_column(df['profit_amount_raw']) if 'profit_amount_raw' in df.columns \
+        else pd.Series(None, index=df.index, dtype=object)
+    row_filters.append((profit_amount.isna(), "مقدار سود/ضرر نامعتبر"))
+    if 'trade_type' in df.columns:
+        row_filters.append((
+            df['trade_type'].astype(str).str.contains('|'.join(KEYWORDS_TO_IGNORE_IN_TRADE_TYPE), case=False, na=False),
+            "نوع ردیف مربوط به سفارش/معامله است، نه پوزیشن"
+        ))
+
+    keep = pd.Series(True, index=df.index)
+    for mask, reason in row_filters:
+        mask = mask & keep
+        if mask.any():
+            rejections.append(_rejections_frame(df, mask, reason))
+        keep &= ~mask
+    df = df[keep]
+    profit_amount = profit_amount[keep]
+
+    # تبدیل position_id به رشته عدد صحیح (معادل str(int(float(x))))
+    position_ids = position_numeric[keep].astype('float64').astype('int64').astype(str)
+
+    # تکراری‌ها: موجود در دیتابیس یا تکرار شده در همین فایل
+    if existing_position_ids is None:
+        existing_position_ids = db_manager.get_existing_position_ids(set(position_ids))
+    is_duplicate = position_ids.isin(existing_position_ids) | position_ids.duplicated(keep='first')
+    duplicate_count = int(is_duplicate.sum())
+    df = df[~is_duplicate]
+    profit_amount = profit_amount[~is_duplicate]
+    position_ids = position_ids[~is_duplicate]
+
+    # زمان باز شدن: زمان سرور متاتریدر (UTC+3) -> UTC
+    open_time = _parse_datetime_column(_text_column(df, 'open_time_raw'))
+    open_time_utc = open_time.dt.tz_localize(MT5_SOURCE_TIMEZONE).dt.tz_convert('UTC')
+
+    symbols = _text_column(df, 'symbol')
+    sizes = _clean_numeric_column(df['size_raw']) if 'size_raw' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    entry_prices = _clean_numeric_column(df['entry_price_raw']) if 'entry_price_raw' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    exit_prices = _clean_numeric_column(df['exit_price_raw']) if 'exit_price_raw' in df.columns else pd.Series(None, index=df.index, dtype=object)
+
+    value_filters = [
+        (open_time.isna(), "زمان باز شدن نامعتبر"),
+        (symbols == '', "نماد خالی"),
+        (sizes.isna(), "حجم نامعتبر"),
+        (entry_prices.isna(), "قیمت ورود نامعتبر"),
+        (exit_prices.isna(), "قیمت خروج نامعتبر"),
+    ]
+    valid = pd.Series(True, index=df.index)
+    for mask, reason in value_filters:
+        mask = mask & valid
+        if mask.any():
+            rejections.append(_rejections_frame(df, mask, reason, position_ids))
+        valid &= ~mask
+
+    prepared = pd.DataFrame({
+        'date': open_time_utc[valid].dt.strftime('%Y-%m-%d'),
+        'time': open_time_utc[valid].dt.strftime('%H:%M'),
+        'symbol': symbols[valid],
+        'entry': entry_prices[valid],
+        'exit': exit_prices[valid],
+        # تعیین profit_type با استفاده از تابع مرکزی calculate_profit_type روی مقادیر Decimal
+        'profit': profit_amount[valid].map(lambda amount: db_manager.calculate_profit_type(amount, rf_threshold)),
+        'errors': "",
+        'size': sizes[valid],
+        'position_id': position_ids[valid],
+        'trade_type': _text_column(df, 'trade_type')[valid],
+        'original_timezone': MT5_SOURCE_TIMEZONE,
+        'actual_profit_amount': profit_amount[valid], # مقدار خام سود/ضرر
+    })
+    prepared_trades_list = prepared.to_dict('records')
+
+    rejections_df = pd.concat(rejections, ignore_index=True) if rejections \
+        else pd.DataFrame(columns=REJECTION_COLUMNS)
+    return prepared_trades_list, duplicate_count, rejections_df
+
+def _read_report_frame(file_path):
+    """ردیف‌های خام گزارش (با نام ستون‌های اصلی گزارش) را به صورت یک DataFrame می‌خواند."""
+    report_format, _ = detect_report_format(file_path)
+    if report_format == REPORT_FORMAT_XLSX:
+        return pd.read_excel(file_path, header=6, engine='openpyxl')
+    # HTML/CSV: فقط بخش Positions به صورت جریانی خوانده می‌شود (بدون پارس سنگین اکسل)
+    batches = list(iter_mt5_positions_batches(file_path))
+    if not batches:
+        raise pd.errors.EmptyDataError("Positions table not found")
+    return pd.concat(batches)
+
+def process_mt5_report_for_preview(file_path, return_rejections=False):
+    """
+    تریدهای گزارش متاتریدر 5 (اکسل، HTML یا CSV؛ فرمت از روی محتوای فایل تشخیص داده می‌شود) را می‌خواند، داده‌های اولیه را پردازش کرده
     و یک لیست از تریدهای آماده برای ورود و آمار مربوطه را برمی‌گرداند،
     بدون اینکه آنها را به دیتابیس اضافه کند.
     زمان‌ها به UTC تبدیل و در لیست آماده‌سازی می‌شوند.
+    اگر return_rejections=True باشد، جدول ردیف‌های رد شده (با دلیل) هم به عنوان عضو پنجم برگردانده می‌شود.
     """
-    prepared_trades_list = []
-    total_trades_in_file = 0
-    duplicate_count = 0
-    skipped_error_count = 0
+    empty_result = ([], 0, 0, 0, pd.DataFrame(columns=REJECTION_COLUMNS)) if return_rejections else ([], 0, 0, 0)
 
     try:
-        df_raw = pd.read_excel(file_path, header=6, engine='openpyxl')
-        
-        if 'Unnamed: 13' in df_raw.columns:
-            df_raw = df_raw.drop(columns=['Unnamed: 13'])
-
-        column_map = {
-            'Time': 'open_time_raw',
-            'Position': 'position_id',
-            'Symbol': 'symbol',
-            'Type': 'trade_type',
-            'Volume': 'size_raw',
-            'Price': 'entry_price_raw',
-            'S / L': 'stop_loss_raw',
-            'T / P': 'take_profit_raw',
-            'Time.1': 'close_time_raw', 
-            'Price.1': 'exit_price_raw', 
-            'Commission': 'commission_raw',
-            'Swap': 'swap_raw',
-            'Profit': 'profit_amount_raw' 
-        }
-
-        df_processed = df_raw.rename(columns=column_map)
-        
-        df_processed = df_processed.drop(columns=[
-            'stop_loss_raw', 'take_profit_raw', 
-            'commission_raw', 'swap_raw'
-        ], errors='ignore') 
-        
-        total_trades_in_file = len(df_processed) 
-        
-        initial_rows_before_all_filters = len(df_processed)
-
-        df_processed['position_id_numeric'] = pd.to_numeric(df_processed['position_id'], errors='coerce')
-        df_filtered = df_processed[df_processed['position_id_numeric'].notna()].copy()
-        df_filtered = df_filtered.drop(columns=['position_id_numeric'])
-        
-        initial_len_after_pos_filter = len(df_filtered)
-        if 'symbol' in df_filtered.columns:
-            df_filtered = df_filtered[df_filtered['symbol'].notna()].copy()
-        
-        initial_len_after_symbol_filter = len(df_filtered)
-        if 'close_time_raw' in df_filtered.columns and 'exit_price_raw' in df_filtered.columns:
-            df_filtered = df_filtered[
-                df_filtered['close_time_raw'].notna() & (df_filtered['close_time_raw'].astype(str).str.strip() != '') &
-                df_filtered['exit_price_raw'].notna() & (df_filtered['exit_price_raw'].astype(str).str.strip() != '')
-            ].copy()
-        
-        initial_len_after_close_filter = len(df_filtered)
-        df_filtered['profit_amount_numeric'] = df_filtered['profit_amount_raw'].apply(_clean_numeric_value)
-        df_filtered = df_filtered[df_filtered['profit_amount_numeric'].notna()].copy()
-        # اینجا ستون profit_amount_numeric رو حذف نمی‌کنیم چون نیاز داریم مقدار Decimal اون رو به تابع add_trade بفرستیم.
-        # df_filtered = df_filtered.drop(columns=['profit_amount_numeric']) 
-        
-        initial_len_after_profit_filter = len(df_filtered)
-        keywords_to_ignore_in_trade_type = ['limit', 'filled', 'in', 'out', 'market', 'canceled', 'modify', 'delete', 'buy limit', 'sell limit', 'buy stop', 'sell stop', 'close by'] 
-        
-        if 'trade_type' in df_filtered.columns:
-            mask_to_keep_trade_type = ~df_filtered['trade_type'].astype(str).str.contains('|'.join(keywords_to_ignore_in_trade_type), case=False, na=False)
-            df_final_positions = df_filtered[mask_to_keep_trade_type].copy()
-        else:
-            df_final_positions = df_filtered.copy()
-        
-        skipped_error_count += (initial_rows_before_all_filters - len(df_final_positions))
-
-        mt5_source_timezone = pytz.timezone('Etc/GMT-3') # UTC+3:00
+        df_raw = _read_report_frame(file_path)
+        total_trades_in_file = len(df_raw) 
 
         # آستانه ریسک فری رو از دیتابیس می‌خوانیم
         rf_threshold = db_manager.get_rf_threshold()
 
-        for index, row in df_final_positions.iterrows():
-            row_skipped = False
-            position_id_debug = "N/A" 
-            try:
-                position_id_debug = str(row.get('position_id', 'N/A')).strip() 
-                
-                position_id = str(int(float(position_id_debug))).strip() 
-                
-                if db_manager.check_duplicate_trade(position_id=position_id):
-                    row_skipped = True
-                    duplicate_count += 1
-                    continue
-                
-                open_time_str = str(row.get('open_time_raw', '')).strip()
-                if not open_time_str:
-                    row_skipped = True
-                    continue
-
-                open_dt_obj_naive = None
-                date_formats = ['%Y.%m.%d %H:%M:%S', '%Y.%m.%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M']
-                for fmt in date_formats:
-                    try:
-                        open_dt_obj_naive = datetime.strptime(open_time_str, fmt)
-                        break 
-                    except ValueError:
-                        continue 
-
-                if open_dt_obj_naive is None:
-                    row_skipped = True
-                    continue 
-                
-                aware_dt_obj = mt5_source_timezone.localize(open_dt_obj_naive, is_dst=None) 
-                
-                utc_dt_obj = aware_dt_obj.astimezone(pytz.utc)
-
-                trade_date = utc_dt_obj.strftime('%Y-%m-%d')
-                trade_time = utc_dt_obj.strftime('%H:%M')
-
-                symbol = str(row.get('symbol', '')).strip()
-                if not symbol:
-                    row_skipped = True
-                    continue
-
-                trade_type = str(row.get('trade_type', '')).strip()
-
-                size_raw_val = str(row.get('size_raw', '')).strip()
-                size = _clean_numeric_value(size_raw_val)
-                if size is None:
-                    row_skipped = True
-                    continue
-                
-                entry_price_raw_val = str(row.get('entry_price_raw', '')).strip()
-                entry_price = _clean_numeric_value(entry_price_raw_val)
-                if entry_price is None:
-                    row_skipped = True
-                    continue
-
-                exit_price_raw_val = str(row.get('exit_price_raw', '')).strip()
-                exit_price = _clean_numeric_value(exit_price_raw_val)
-                if exit_price is None:
-                    row_skipped = True
-                    continue
-
-                # این مقدار profit_amount_numeric از قبل توسط .apply(_clean_numeric_value) پردازش شده
-                profit_amount = row.get('profit_amount_numeric') 
-                if profit_amount is None:
-                    row_skipped = True
-                    continue
-                
-                # تعیین profit_type با استفاده از تابع مرکزی calculate_profit_type
-                # این تابع هم در db_manager هست
-                profit_type = db_manager.calculate_profit_type(profit_amount, rf_threshold)
-                
-                errors_field = "" 
-
-                prepared_trades_list.append({
-                    'date': trade_date, 
-                    'time': trade_time, 
-                    'symbol': symbol,
-                    'entry': entry_price,
-                    'exit': exit_price,
-                    'profit': profit_type, # Profit/Loss/RF
-                    'errors': errors_field,
-                    'size': size,
-                    'position_id': position_id,
-                    'trade_type': trade_type,
-                    'original_timezone': mt5_source_timezone.zone,
-                    'actual_profit_amount': profit_amount # مقدار خام سود/ضرر
-                })
-
-            except KeyError as ke:
-                row_skipped = True
-                continue
-            except Exception as e:
-                row_skipped = True
-                continue
-            finally:
-                if row_skipped:
-                    skipped_error_count += 1
+        prepared_trades_list, duplicate_count, rejections = parse_mt5_positions(df_raw, rf_threshold)
+        skipped_error_count = len(rejections)
 
+        if return_rejections:
+            return prepared_trades_list, total_trades_in_file, duplicate_count, skipped_error_count, rejections
         return prepared_trades_list, total_trades_in_file, duplicate_count, skipped_error_count
 
     except FileNotFoundError:
         print(f"خطا: فایل '{file_path}' پیدا نشد. لطفاً مطمئن شوید فایل در مسیر صحیح قرار دارد.") 
-        return [], 0, 0, 0
+        return empty_result
     except pd.errors.EmptyDataError:
         print(f"خطا: فایل '{file_path}' خالی است یا فرمت آن صحیح نیست.") 
-        return [], 0, 0, 0
+        return empty_result
     except Exception as e:
         print(f"خطای بحرانی در حین خواندن یا پردازش فایل Excel/CSV: {e}") 
-        return [], 0, 0, 0
+        return empty_result
+
+# --- حالت وارد کردن جریانی (Streaming) برای فایل‌های خیلی بزرگ ---
+
+# فایل‌های بزرگ‌تر از این اندازه به جای پیش‌نمایش کامل، به صورت جریانی وارد می‌شوند
+STREAMING_IMPORT_MIN_FILE_SIZE = 20 * 1024 * 1024
+STREAMING_BATCH_SIZE = 5000
+
+# عنوان بخش‌هایی که بعد از Positions در گزارش متاتریدر می‌آیند
+_MT5_SECTION_TITLES_AFTER_POSITIONS = ('Orders', 'Deals', 'Results')
+
+def _unique_column_names(header_cells):
+    """نام ستون‌های تکراری را مثل pandas نام‌گذاری می‌کند ('Time', 'Time.1', ...)."""
+    column_names = []
+    seen_counts = {}
+    for index, cell in enumerate(header_cells):
+        name = str(cell).strip() if cell is not None and str(cell).strip() != '' else f"Unnamed: {index}"
+        if name in seen_counts:
+            seen_counts[name] += 1
+            name = f"{name}.{seen_counts[name]}"
+        else:
+            seen_counts[name] = 0
+        column_names.append(name)
+    return column_names
+
+def _normalize_cell(value):
+    # مثل pandas.read_excel: اعداد اعشاری صحیح (مثل 5.0) به int تبدیل می‌شوند
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def _is_section_title_row(row_values):
+    non_empty = [v for v in row_values if v is not None and str(v).strip() != '']
+    return len(non_empty) == 1 and row_values[0] is not None and \
+        str(row_values[0]).strip() in _MT5_SECTION_TITLES_AFTER_POSITIONS
+
+# --- خواندن ردیف‌های گزارش در فرمت‌های مختلف (xlsx / html / csv) ---
+
+REPORT_FORMAT_XLSX = 'xlsx'
+REPORT_FORMAT_HTML = 'html'
+REPORT_FORMAT_CSV = 'csv'
+
+_SNIFF_SIZE = 4096
+_TEXT_READ_CHUNK_SIZE = 64 * 1024
+_CSV_DELIMITERS = (',', ';', '\t')
+
+def _sniff_text_encoding(head_bytes):
+    if head_bytes.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    if head_bytes.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if b'\x00' in head_bytes:
+        # UTF-16 بدون BOM (گزارش HTML متاتریدر معمولاً UTF-16 LE است)
+        return 'utf-16-le' if head_bytes[1:2] == b'\x00' else 'utf-16-be'
+    return 'utf-8'
+
+def detect_report_format(file_path):
+    """
+    فرمت فایل گزارش متاتریدر را از روی محتوای ابتدای فایل (نه پسوند) تشخیص می‌دهد.
+    Returns:
+        tuple: (report_format, encoding) که report_format یکی از 'xlsx', 'html', 'csv' است
+               و encoding برای xlsx مقدار None دارد.
+    """
+    with open(file_path, 'rb') as report_file:
+        head_bytes = report_file.read(_SNIFF_SIZE)
+
+    if head_bytes.startswith(b'PK\x03\x04'):
+        return REPORT_FORMAT_XLSX, None
+
+    encoding = _sniff_text_encoding(head_bytes)
+    # ممکن است آخرین کاراکتر در مرز بایت‌ها بریده شده باشد
+    head_text = head_bytes.decode(encoding, errors='ignore').lstrip().lower()
+    if head_text.startswith(('<!doctype html', '<html', '<?xml')) or '<table' in head_text:
+        return REPORT_FORMAT_HTML, encoding
+    return REPORT_FORMAT_CSV, encoding
+
+def _text_cell(value):
+    value = value.strip().replace('\xa0', ' ')
+    return value if value != '' else None
+
+def _iter_xlsx_rows(file_path):
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for row_values in workbook.active.iter_rows(values_only=True):
+            yield [_normalize_cell(v) for v in row_values]
+    finally:
+        workbook.close()
+
+def _iter_csv_rows(file_path, encoding):
+    with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as report_file:
+        sample = report_file.read(_SNIFF_SIZE)
+        report_file.seek(0)
+        # csv.Sniffer روی سطرهای تک‌ستونی عنوان گزارش اشتباه می‌کند؛ پرتکرارترین جداکننده را انتخاب می‌کنیم
+        delimiter = max(_CSV_DELIMITERS, key=sample.count)
+        for row_values in csv.reader(report_file, delimiter=delimiter):
+            yield [_text_cell(v) for v in row_values]
+
+class _ReportHtmlRowParser(HTMLParser):
+    """
+    ردیف‌های جدول گزارش HTML متاتریدر را استخراج می‌کند.
+    سلول‌های مخفی (class="hidden") نادیده گرفته می‌شوند تا ستون‌ها با نسخه اکسل گزارش یکسان باشند.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.completed_rows = []
+        self._current_row = None
+        self._current_cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self._current_row = []
+        elif tag in ('td', 'th') and self._current_row is not None:
+            css_classes = (dict(attrs).get('class') or '').split()
+            self._current_cell = None if 'hidden' in css_classes else []
+
+    def handle_endtag(self, tag):
+        if tag in ('td', 'th') and self._current_row is not None:
+            if self._current_cell is not None:
+                self._current_row.append(_text_cell(''.join(self._current_cell)))
+            self._current_cell = None
+        elif tag == 'tr' and self._current_row is not None:
+            self.completed_rows.append(self._current_row)
+            self._current_row = None
+
+    def handle_data(self, data):
+        if self._current_cell is not None:
+            self._current_cell.append(data)
+
+def _iter_html_rows(file_path, encoding):
+    parser = _ReportHtmlRowParser()
+    with open(file_path, 'r', encoding=encoding, errors='replace') as report_file:
+        while True:
+            chunk = report_file.read(_TEXT_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            yield from parser.completed_rows
+            parser.completed_rows = []
+    parser.close()
+    yield from parser.completed_rows
+
+def _iter_report_rows(file_path):
+    """ردیف‌های خام فایل گزارش را، صرف نظر از فرمت آن، به صورت لیست مقادیر برمی‌گرداند (yield)."""
+    report_format, encoding = detect_report_format(file_path)
+    if report_format == REPORT_FORMAT_XLSX:
+        return _iter_xlsx_rows(file_path)
+    if report_format == REPORT_FORMAT_HTML:
+        return _iter_html_rows(file_path, encoding)
+    return _iter_csv_rows(file_path, encoding)
+
+def _close_time_key(value):
+    """زمان بسته شدن خام (datetime یا رشته متاتریدر) را به رشته قابل مقایسه 'YYYY-MM-DD HH:MM:SS' تبدیل می‌کند."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    key = str(value).strip().replace('.', '-')
+    return key + ':00' if len(key) == 16 else key
+
+def _is_newer_than_watermark(row_values, close_time_index, position_index, watermark):
+    min_close_time_key, max_position_id = watermark
+    close_time_key = _close_time_key(row_values[close_time_index]) if close_time_index is not None else None
+    if not close_time_key or min_close_time_key is None or close_time_key >= min_close_time_key:
+        return True
+    try:
+        return max_position_id is not None and int(float(row_values[position_index])) > max_position_id
+    except (TypeError, ValueError):
+        return False
+
+def iter_mt5_positions_batches(file_path, batch_size=STREAMING_BATCH_SIZE, watermark=None):
+    """
+    بخش Positions گزارش متاتریدر 5 (xlsx با openpyxl در حالت read_only، یا HTML/CSV به صورت جریانی)
+    را ردیف به ردیف می‌خواند و ردیف‌ها را در دسته‌های حداکثر batch_size تایی به صورت DataFrame برمی‌گرداند (yield).
+    خواندن در ابتدای بخش بعدی گزارش (Orders/Deals) متوقف می‌شود، پس مصرف حافظه به اندازه فایل بستگی ندارد.
+    ایندکس هر DataFrame شماره ردیف در فایل است.
+    watermark (اختیاری): (min_close_time_key, max_position_id)؛ ردیف‌هایی که زمان بسته شدنشان (به وقت سرور)
+    قبل از min_close_time_key است و position_id بزرگ‌تری هم ندارند، بدون هیچ پردازشی کنار گذاشته می‌شوند.
+    """
+    report_rows = _iter_report_rows(file_path)
+    try:
+        column_names = None
+        batch_rows = []
+        batch_index = []
+        for row_number, row_values in enumerate(report_rows, start=1):
+            if column_names is None:
+                # سطر عنوان جدول Positions: اولین سطری که هم Time و هم Position دارد
+                header_cells = [str(v).strip() if v is not None else '' for v in row_values]
+                if 'Time' in header_cells and 'Position' in header_cells:
+                    column_names = _unique_column_names(row_values)
+                    close_time_index = column_names.index('Time.1') if 'Time.1' in column_names else None
+                    position_index = column_names.index('Position')
+                continue
+
+            if _is_section_title_row(row_values):
+                break
+            if all(v is None for v in row_values):
+                continue
+
+            row_values = list(row_values[:len(column_names)])
+            row_values += [None] * (len(column_names) - len(row_values))
+            if watermark is not None and \
+                    not _is_newer_than_watermark(row_values, close_time_index, position_index, watermark):
+                continue
+            batch_rows.append(row_values)
+            batch_index.append(row_number)
+            if len(batch_rows) >= batch_size:
+                yield pd.DataFrame(batch_rows, columns=column_names, index=batch_index)
+                batch_rows = []
+                batch_index = []
+
+        if batch_rows:
+            yield pd.DataFrame(batch_rows, columns=column_names, index=batch_index)
+    finally:
+        report_rows.close()
+
+def import_mt5_report_streaming(file_path, batch_size=STREAMING_BATCH_SIZE, progress_callback=None):
+    """
+    گزارش متاتریدر 5 را بدون پیش‌نمایش و به صورت جریانی وارد دیتابیس می‌کند:
+    هر دسته از ردیف‌ها پردازش و بلافاصله با add_trades_bulk در یک تراکنش درج می‌شود.
+    تکراری‌های بین دسته‌ها هم تشخیص داده می‌شوند، چون دسته‌های قبلی تا آن لحظه در دیتابیس ثبت شده‌اند.
+    Args:
+        file_path (str): مسیر فایل xlsx.
+        batch_size (int): حداکثر تعداد ردیف هر دسته.
+        progress_callback (callable, optional): بعد از هر دسته با (rows_read, imported_count) صدا زده می‌شود.
+    Returns:
+        tuple: (imported_count, total_rows, duplicate_count, skipped_error_count, error_message)
+               error_message در صورت موفقیت None است؛ در غیر این صورت دسته‌های قبل از خطا (imported_count ترید)
+               در دیتابیس ثبت شده‌اند و دسته‌ای که خطا در آن رخ داده به طور کامل لغو شده است.
+    """
+    imported_count = 0
+    total_rows = 0
+    duplicate_count = 0
+    skipped_error_count = 0
+    batch_count = 0
+    error_message = None
+
+    try:
+        rf_threshold = db_manager.get_rf_threshold()
+        for batch_df in iter_mt5_positions_batches(file_path, batch_size):
+            batch_count += 1
+            total_rows += len(batch_df)
+            prepared_trades_list, batch_duplicates, rejections = parse_mt5_positions(batch_df, rf_threshold)
+            duplicate_count += batch_duplicates
+            skipped_error_count += len(rejections)
+            if prepared_trades_list:
+                # داخل transaction() خطای دیتابیس در add_trades_bulk به جای (0, []) بالا می‌آید و کل دسته لغو می‌شود
+                with db_manager.transaction():
+                    batch_imported, batch_conflicts = db_manager.add_trades_bulk(prepared_trades_list)
+                imported_count += batch_imported
+                duplicate_count += len(batch_conflicts)
+            if progress_callback:
+                progress_callback(total_rows, imported_count)
+        if batch_count == 0:
+            error_message = "بخش Positions در فایل پیدا نشد."
+    except FileNotFoundError:
+        error_message = f"فایل '{file_path}' پیدا نشد."
+    except Exception as e:
+        # خطای اصلی دیتابیس (که add_trades_bulk چاپ کرده) پشت خطای rollback داخل transaction() است
+        error_message = str(e.__context__ if isinstance(e.__context__, sqlite3.Error) else e)
+
+    if error_message:
+        print(f"خطا در وارد کردن جریانی فایل '{file_path}': {error_message}")
+    return imported_count, total_rows, duplicate_count, skipped_error_count, error_message
+
+# --- وارد کردن همزمان چند فایل گزارش (چند حساب) ---
+
+REPORT_FILE_EXTENSIONS = ('.xlsx', '.html', '.htm', '.csv')
+
+def find_report_files(paths):
+    """
+    مسیرهای داده شده را به لیست فایل‌های گزارش تبدیل می‌کند؛ پوشه‌ها با فایل‌های گزارش داخلشان جایگزین می‌شوند.
+    """
+    report_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for file_name in sorted(os.listdir(path)):
+                full_path = os.path.join(path, file_name)
+                if os.path.isfile(full_path) and file_name.lower().endswith(REPORT_FILE_EXTENSIONS) \
+                        and not file_name.startswith('~$'): # فایل‌های قفل موقت اکسل
+                    report_files.append(full_path)
+        elif os.path.isfile(path):
+            report_files.append(path)
+    # حذف فایل‌هایی که دو بار انتخاب شده‌اند (مثلاً هم خود فایل و هم پوشه‌اش)
+    unique_report_files = {}
+    for file_path in report_files:
+        unique_report_files.setdefault(os.path.normcase(os.path.abspath(file_path)), file_path)
+    return list(unique_report_files.values())
+
+def _parse_report_file(file_path, rf_threshold):
+    """
+    یک فایل گزارش را (در پروسس/ترد جداگانه) پردازش می‌کند. به دیتابیس دسترسی ندارد؛
+    بررسی تکراری بودن نسبت به دیتابیس بعد از ادغام نتایج همه فایل‌ها انجام می‌شود.
+    Returns:
+        tuple: (file_path, prepared_trades_list, total_rows, duplicate_count_in_file, skipped_error_count, error_message)
+    """
+    try:
+        df_raw = _read_report_frame(file_path)
+        prepared_trades_list, duplicate_count, rejections = \
+            parse_mt5_positions(df_raw, rf_threshold, existing_position_ids=set())
+        return file_path, prepared_trades_list, len(df_raw), duplicate_count, len(rejections), None
+    except Exception as e:
+        return file_path, [], 0, 0, 0, str(e)
+
+def _create_parse_executor(max_workers):
+    # app.py گارد __main__ ندارد؛ با روش spawn (ویندوز، اجرای غیر frozen) هر پروسس فرزند پنجره برنامه را دوباره می‌سازد.
+    # پس پروسس‌ها فقط در fork یا نسخه frozen (که freeze_support دارد) استفاده می‌شوند و در غیر این صورت ترد.
+    if getattr(sys, 'frozen', False) or multiprocessing.get_start_method(allow_none=False) == 'fork':
+        return ProcessPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+def process_mt5_reports_for_preview(file_paths, max_workers=None):
+    """
+    چند فایل گزارش (مثلاً گزارش‌های هفتگی چند حساب) را به صورت همزمان پردازش می‌کند،
+    تریدها را بر اساس position_id ادغام و تکراری‌ها را حذف می‌کند و یک پیش‌نمایش ترکیبی برمی‌گرداند.
+    تکراری بودن نسبت به دیتابیس فقط با یک کوئری برای همه فایل‌ها بررسی می‌شود.
+    Args:
+        file_paths (list): مسیر فایل‌ها یا پوشه‌ها.
+        max_workers (int, optional): تعداد پروسس‌ها؛ پیش‌فرض تعداد هسته‌های CPU.
+    Returns:
+        tuple: (prepared_trades_list, total_trades_in_files, duplicate_count, skipped_error_count, file_summaries)
+               file_summaries لیستی از دیکشنری‌ها با کلیدهای file, total, prepared, error برای هر فایل است.
+    """
+    report_files = find_report_files(file_paths)
+    if not report_files:
+        return [], 0, 0, 0, []
+
+    rf_threshold = db_manager.get_rf_threshold()
+    max_workers = min(max_workers or os.cpu_count() or 1, len(report_files))
+
+    with _create_parse_executor(max_workers) as executor:
+        results = list(executor.map(_parse_report_file, report_files, [rf_threshold] * len(report_files)))
+
+    # یک کوئری برای همه position_idهای همه فایل‌ها
+    existing_position_ids = db_manager.get_existing_position_ids(
+        {trade['position_id'] for result in results for trade in result[1]}
+    )
+
+    prepared_trades_list = []
+    total_trades_in_files = 0
+    duplicate_count = 0
+    skipped_error_count = 0
+    file_summaries = []
+    seen_position_ids = set(existing_position_ids)
+    for file_path, file_trades, total_rows, file_duplicates, file_skipped, error_message in results:
+        if error_message:
+            print(f"خطا در پردازش فایل '{file_path}': {error_message}")
+        total_trades_in_files += total_rows
+        duplicate_count += file_duplicates
+        skipped_error_count += file_skipped
+        file_new_count = 0
+        for trade in file_trades:
+            # ادغام: یک پوزیشن ممکن است در دیتابیس یا در گزارش‌های هم‌پوشان چند بار آمده باشد
+            if trade['position_id'] in seen_position_ids:
+                duplicate_count += 1
+                continue
+            seen_position_ids.add(trade['position_id'])
+            prepared_trades_list.append(trade)
+            file_new_count += 1
+        file_summaries.append({'file': file_path, 'total': total_rows, 'prepared': file_new_count, 'error': error_message})
+
+    return prepared_trades_list, total_trades_in_files, duplicate_count, skipped_error_count, file_summaries
+
+# --- وارد کردن افزایشی (فقط ردیف‌های جدید گزارش تجمعی) ---
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+def _file_content_hash(file_path):
+    content_hash = hashlib.sha256()
+    with open(file_path, 'rb') as report_file:
+        for chunk in iter(lambda: report_file.read(_HASH_CHUNK_SIZE), b''):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+def _report_watermark(df_raw):
+    """
+    بیشترین زمان بسته شدن (UTC، به صورت 'YYYY-MM-DD HH:MM:SS') و بیشترین position_id ردیف‌های گزارش را برمی‌گرداند.
+    """
+    if df_raw.empty or 'Time.1' not in df_raw.columns or 'Position' not in df_raw.columns:
+        return None, None
+    position_numeric = pd.to_numeric(df_raw['Position'], errors='coerce')
+    close_time = _parse_datetime_column(_text_column(df_raw, 'Time.1'))
+    valid = position_numeric.notna() & close_time.notna()
+    if not valid.any():
+        return None, None
+    max_close_time_utc = close_time[valid].max().tz_localize(MT5_SOURCE_TIMEZONE).tz_convert('UTC')
+    return max_close_time_utc.strftime('%Y-%m-%d %H:%M:%S'), int(position_numeric[valid].max())
+
+def _watermark_from_manifest(manifest):
+    """واترمارک ذخیره شده (UTC) را به کلید قابل مقایسه با زمان‌های خام گزارش (وقت سرور متاتریدر) تبدیل می‌کند."""
+    min_close_time_key = None
+    if manifest['max_close_time_utc']:
+        max_close_time_utc = pytz.utc.localize(datetime.strptime(manifest['max_close_time_utc'], '%Y-%m-%d %H:%M:%S'))
+        min_close_time_key = max_close_time_utc.astimezone(pytz.timezone(MT5_SOURCE_TIMEZONE)).strftime('%Y-%m-%d %H:%M:%S')
+    return min_close_time_key, manifest['max_position_id']
+
+def process_mt5_report_incremental(file_path):
+    """
+    مثل process_mt5_report_for_preview، اما برای گزارش تجمعی که هر هفته دوباره وارد می‌شود:
+    با استفاده از مشخصات آخرین وارد کردن همین فایل (import_manifest)، فقط ردیف‌های بعد از واترمارک قبلی
+    (زمان بسته شدن/position_id) پردازش و بررسی می‌شوند. اگر فایل از آخرین بار تغییری نکرده باشد، هیچ ردیفی خوانده نمی‌شود.
+    Returns:
+        tuple: (prepared_trades_list, total_new_rows, duplicate_count, skipped_error_count, pending_manifest)
+               pending_manifest باید بعد از وارد کردن موفق به commit_import_manifest داده شود؛
+               اگر فایل تغییری نکرده باشد None است.
+    """
+    manifest_path = os.path.abspath(file_path)
+    file_stat = os.stat(file_path)
+    manifest = db_manager.get_import_manifest(manifest_path)
+
+    if manifest and manifest['file_size'] == file_stat.st_size and manifest['file_mtime'] == file_stat.st_mtime:
+        return [], 0, 0, 0, None
+
+    content_hash = _file_content_hash(file_path)
+    if manifest and manifest['content_hash'] == content_hash:
+        # فقط زمان تغییر فایل عوض شده (مثلاً کپی دوباره)؛ محتوای جدیدی وجود ندارد
+        db_manager.save_import_manifest(manifest_path, file_stat.st_size, file_stat.st_mtime, content_hash,
+                                        manifest['max_close_time_utc'], manifest['max_position_id'])
+        return [], 0, 0, 0, None
+
+    # فایل کوچک‌تر از قبل یعنی گزارش تجمعی همان حساب نیست؛ کل فایل پردازش می‌شود
+    watermark = None
+    if manifest and file_stat.st_size >= manifest['file_size']:
+        watermark = _watermark_from_manifest(manifest)
+
+    batches = list(iter_mt5_positions_batches(file_path, watermark=watermark))
+    df_raw = pd.concat(batches) if batches else pd.DataFrame(columns=list(MT5_COLUMN_MAP))
+
+    rf_threshold = db_manager.get_rf_threshold()
+    prepared_trades_list, duplicate_count, rejections = parse_mt5_positions(df_raw, rf_threshold)
+
+    max_close_time_utc, max_position_id = _report_watermark(df_raw)
+    if watermark is not None:
+        # ردیف‌های کنار گذاشته شده همگی قبل از واترمارک قبلی بوده‌اند
+        max_close_time_utc = max(filter(None, [max_close_time_utc, manifest['max_close_time_utc']]), default=None)
+        max_position_id = max(filter(lambda v: v is not None, [max_position_id, manifest['max_position_id']]), default=None)
+
+    pending_manifest = {
+        'file_path': manifest_path,
+        'file_size': file_stat.st_size,
+        'file_mtime': file_stat.st_mtime,
+        'content_hash': content_hash,
+        'max_close_time_utc': max_close_time_utc,
+        'max_position_id': max_position_id,
+    }
+    return prepared_trades_list, len(df_raw), duplicate_count, len(rejections), pending_manifest
+
+def commit_import_manifest(pending_manifest):
+    """مشخصات وارد کردن را بعد از درج موفق تریدها ثبت می‌کند تا وارد کردن بعدی از همین نقطه ادامه پیدا کند."""
+    if pending_manifest:
+        db_manager.save_import_manifest(**pending_manifest)
 
 def add_prepared_trades_to_db(trades_list):
     """
     لیستی از تریدهای آماده را به دیتابیس اضافه می‌کند.
+    همه تریدها در یک تراکنش و با executemany درج می‌شوند؛ تریدهای تکراری (position_id) رد می‌شوند.
     """
-    imported_count = 0
-    for trade_data in trades_list:
-        # ارسال actual_profit_amount به تابع add_trade
-        if db_manager.add_trade(
-            date=trade_data['date'],
-            time=trade_data['time'],
-            symbol=trade_data['symbol'],
-            entry=trade_data['entry'],
-            exit=trade_data['exit'],
-            profit=trade_data['profit'],
-            errors=trade_data['errors'],
-            size=trade_data['size'],
-            position_id=trade_data['position_id'],
-            trade_type=trade_data['trade_type'],
-            original_timezone_name=trade_data['original_timezone'],
-            actual_profit_amount=trade_data['actual_profit_amount']
-        ):
-            imported_count += 1
-        else:
-            pass
+    imported_count, duplicate_position_ids = db_manager.add_trades_bulk(trades_list)
+    if duplicate_position_ids:
+        print(f"{len(duplicate_position_ids)} ترید تکراری (position_id موجود) هنگام وارد کردن رد شد.")
     return imported_count
 
 
@@ -258,12 +699,15 @@ if __name__ == "__main__":
     
     test_file_path = "ReportHistory-303941.xlsx" 
     if os.path.exists(test_file_path):
-        prepared_trades, total, dup, err = process_mt5_report_for_preview(test_file_path)
+        prepared_trades, total, dup, err, rejections = process_mt5_report_for_preview(test_file_path, return_rejections=True)
         print(f"\n--- نتایج پیش‌نمایش از فایل ---") 
         print(f"کل تریدها در فایل (خام): {total}") 
         print(f"تعداد تریدهای جدید آماده برای ورود: {len(prepared_trades)}") 
         print(f"تعداد تریدهای تکراری (قبلاً در دیتابیس): {dup}") 
         print(f"تعداد ردیف‌های رد شده (کل): {err}") 
+        if not rejections.empty:
+            print("\n--- دلایل رد شدن ردیف‌ها: ---")
+            print(rejections['reason'].value_counts().to_string())
         
         if prepared_trades:
             print("\n--- 5 ترید اول آماده برای ورود: ---") 
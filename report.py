@@ -7,6 +7,7 @@ from tkinter import ttk # For Treeview in template selection dialog
 from persian_chart_utils import process_persian_text_for_matplotlib, set_titlebar_text
 import db_manager
 import json
+import copy
 from report_filters import DateRangeFilterFrame 
 from datetime import datetime, timedelta 
 import pytz 
@@ -15,6 +16,29 @@ import pytz
 from report_files.report_filter_summary_frame import ReportFilterSummaryFrame
 # Import the new report details frame
 from report_files.report_details import ReportDetailsFrame 
+from virtual_treeview import VirtualTreeview
+from report_worker import ReportComputeWorker
+
+def _compute_report_data(task, filters, user_display_timezone, sort, page_size):
+    """
+    کوئری‌ها و تجمیع‌های گزارش را اجرا می‌کند (در ترد پس‌زمینه ReportComputeWorker؛ بدون دسترسی به ویجت‌ها).
+    Args:
+        task (ReportTask): برای گزارش پیشرفت و لغو شدن محاسبه بین مراحل.
+        sort (tuple): (کلید مرتب‌سازی, نزولی) لیست تریدها برای خواندن صفحه اول.
+    Returns:
+        dict: report_stats، first_page (اولین صفحه لیست تریدها)، sort و trade_frame.
+    """
+    # آمار خلاصه در SQLite و روی ستون‌های عددی صحیح (profit_cents) محاسبه می‌شود
+    report_stats = db_manager.get_report_stats(filters, user_display_timezone)
+    task.progress(0.3)
+    # تمام فیلترها (بازه تاریخی، نماد، نوع ترید، خطاها، روز هفته و سشن/ساعات) در SQL اعمال می‌شوند
+    # و لیست تریدها فقط صفحه قابل مشاهده را می‌خواند
+    sort_key, descending = sort
+    first_page = db_manager.get_trades_page(user_display_timezone, filters, sort_key, descending, limit=page_size)
+    task.progress(0.5)
+    trade_frame = db_manager.get_trades_frame(filters, user_display_timezone)
+    task.progress(1.0)
+    return {'report_stats': report_stats, 'first_page': first_page, 'sort': sort, 'trade_frame': trade_frame}
 
 class ReportWindow(ctk.CTkToplevel):
     def __init__(self, parent_root, open_toplevel_windows_list, initial_filters=None):
@@ -35,10 +59,21 @@ class ReportWindow(ctk.CTkToplevel):
         def on_close():
             if self in self.open_toplevel_windows_list:
                 self.open_toplevel_windows_list.remove(self)
+            db_manager.unsubscribe_settings(self._on_settings_changed)
+            self.report_worker.close()
             self.destroy()
 
         self.protocol("WM_DELETE_WINDOW", on_close)
 
+        # تنظیماتی که روی نتیجه گزارش اثر دارند؛ گزارش فقط وقتی یکی از اینها واقعاً تغییر کند دوباره بارگذاری می‌شود
+        self._reload_pending = False
+        # کوئری‌ها و تجمیع‌های گزارش در ترد پس‌زمینه اجرا می‌شوند؛ تغییر جدید فیلترها محاسبه قبلی را لغو می‌کند
+        self.report_worker = ReportComputeWorker(self)
+        db_manager.subscribe_settings(
+            self._on_settings_changed,
+            keys=('default_timezone', 'rf_threshold', 'working_days', 'error_frequency_threshold') + db_manager.SESSION_SETTING_KEYS
+        )
+
         screen_width = self.winfo_screenwidth()
         screen_height = self.winfo_screenheight()
 
@@ -102,6 +137,7 @@ class ReportWindow(ctk.CTkToplevel):
         self.report_details_column.grid_columnconfigure(0, weight=1) 
         self.report_details_column.grid_rowconfigure(0, weight=0) # برای stat_panels_frame (کوچک)
         self.report_details_column.grid_rowconfigure(1, weight=1) # برای trades_list_frame (بیشتر فضا)
+        self.report_details_column.grid_rowconfigure(2, weight=0) # برای نوار پیشرفت محاسبه گزارش
 
         # Stat Panels Frame
         self.stat_panels_frame = ctk.CTkFrame(self.report_details_column, fg_color="transparent")
@@ -127,6 +163,10 @@ class ReportWindow(ctk.CTkToplevel):
         self.trades_list_frame.grid_rowconfigure(0, weight=1)
         self.trades_list_frame.grid_propagate(False) 
 
+        # نوار پیشرفت فقط در حین محاسبه گزارش نمایش داده می‌شود
+        self.report_progress_bar = ctk.CTkProgressBar(self.report_details_column, mode="determinate", height=6)
+        self.report_progress_bar.set(0)
+
 
         # Treeview for trades
         trades_style = ttk.Style()
@@ -186,14 +226,37 @@ class ReportWindow(ctk.CTkToplevel):
 
         self.trades_tree.grid(row=0, column=0, sticky="nsew")
 
-        trades_scrollbar_y = ctk.CTkScrollbar(self.trades_list_frame, command=self.trades_tree.yview)
+        trades_scrollbar_y = ctk.CTkScrollbar(self.trades_list_frame)
         trades_scrollbar_y.grid(row=0, column=1, sticky="ns")
-        self.trades_tree.configure(yscrollcommand=trades_scrollbar_y.set)
 
         trades_scrollbar_x = ctk.CTkScrollbar(self.trades_list_frame, orientation="horizontal", command=self.trades_tree.xview)
         trades_scrollbar_x.grid(row=1, column=0, sticky="ew")
         self.trades_tree.configure(xscrollcommand=trades_scrollbar_x.set)
 
+        # فقط ردیف‌های قابل مشاهده در Treeview درج می‌شوند؛ صفحه‌ها و مرتب‌سازی از SQLite خوانده می‌شوند
+        self.trades_view = VirtualTreeview(
+            self.trades_tree, trades_scrollbar_y,
+            fetch_page=lambda sort_key, descending, **kwargs: db_manager.get_trades_page(
+                db_manager.get_default_timezone(), self.current_filters, sort_key, descending, **kwargs),
+            count_rows=lambda: db_manager.count_trades(db_manager.get_default_timezone(), self.current_filters),
+            row_values=lambda trade: (
+                trade['id'],
+                trade['date'],
+                trade['time'],
+                trade['symbol'],
+                trade['entry'],
+                trade['exit'],
+                trade['profit'],
+                trade['errors'],
+                trade['size'],
+                trade['position_id'],
+                trade['type'],
+                trade['actual_profit_amount']
+            ),
+            sort_columns={"ID": "id", "Date": "time", "Time": "time", "Symbol": "symbol", "Entry": "entry",
+                          "Exit": "exit", "Profit": "profit", "Errors": "errors", "Size": "size",
+                          "PositionID": "position_id", "Type": "type", "ActualProfit": "actual_profit_amount"})
+
         # Initial load of report data
         if initial_filters:
             self._apply_selected_template(initial_filters)
@@ -250,160 +313,67 @@ class ReportWindow(ctk.CTkToplevel):
         Applies all specified filters.
         """
         self.report_filter_summary_frame.update_summary(self.current_template_name, self.current_filters)
-        
-        for item in self.trades_tree.get_children():
-            self.trades_tree.delete(item)
 
+        # تا رسیدن نتیجه جدید، لیست تریدهای فیلترهای قبلی نمایش داده نمی‌شود
+        self.trades_view.reload(keep_position=False, total_rows=0)
+        self.report_progress_bar.set(0)
+        self.report_progress_bar.grid(row=2, column=0, sticky="ew", padx=5, pady=(5, 0))
+
+        # ترد پس‌زمینه روی یک کپی از فیلترها کار می‌کند تا تغییرات بعدی self.current_filters روی آن اثر نگذارد
+        filters = copy.deepcopy(self.current_filters)
         user_display_timezone = db_manager.get_default_timezone()
-        all_trades = db_manager.get_all_trades(user_display_timezone) 
-
-        filtered_trades = all_trades 
-
-        # 1. Apply Date Range Filter
-        date_range_filter = self.current_filters.get("date_range", {})
-        start_date_str = date_range_filter.get("start_date")
-        end_date_str = date_range_filter.get("end_date")
-
-        if start_date_str and end_date_str:
-            try:
-                start_date_obj = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                end_date_obj = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-                filtered_trades = [
-                    trade for trade in filtered_trades 
-                    if start_date_obj <= datetime.strptime(trade['date'], '%Y-%m-%d').date() <= end_date_obj
-                ]
-            except ValueError as e:
-                print(f"Error parsing date strings in _load_report_data for date_range: {e}. Skipping date filter.")
-        
-        # 2. Apply Instrument Filter
-        selected_instruments = self.current_filters.get("instruments", "همه")
-        if selected_instruments != "همه" and isinstance(selected_instruments, list) and selected_instruments:
-            filtered_trades = [trade for trade in filtered_trades if trade['symbol'] in selected_instruments]
-
-        # 3. Apply Trade Type Filter
-        selected_trade_type = self.current_filters.get("trade_type", "همه")
-        if selected_trade_type != "همه":
-            filtered_trades = [trade for trade in filtered_trades if trade['profit'] == selected_trade_type]
-
-        # 4. Apply Errors Filter
-        selected_errors = self.current_filters.get("errors", "همه خطاها")
-        if selected_errors != "همه خطاها": 
-            if isinstance(selected_errors, list) and selected_errors: 
-                filtered_trades = [
-                    trade for trade in filtered_trades 
-                    if trade['errors'] and any(err.strip() in selected_errors for err in trade['errors'].split(','))
-                ]
-            elif isinstance(selected_errors, list) and not selected_errors: 
-                filtered_trades = [
-                    trade for trade in filtered_trades 
-                    if not trade['errors'] or trade['errors'].strip() == ""
-                ]
-
-
-        # 5. Apply Weekday Filter
-        selected_weekdays = self.current_filters.get("weekday", "همه")
-        if selected_weekdays != "همه" and isinstance(selected_weekdays, list) and selected_weekdays:
-            filtered_trades = [
-                trade for trade in filtered_trades 
-                if datetime.strptime(trade['date'], '%Y-%m-%d').weekday() in selected_weekdays
-            ]
-
-        # 6. Apply Session & Hourly Filter
-        selected_sessions = self.current_filters.get("sessions", "همه")
-        hourly_filter_data = self.current_filters.get("hourly", {})
-        hourly_mode = hourly_filter_data.get("mode")
-
-        trades_after_session_and_hourly_filter = []
-
-        if selected_sessions == "همه" and hourly_mode == "full_session":
-            trades_after_session_and_hourly_filter = filtered_trades
-        else:
-            all_session_times_display = db_manager.get_session_times_with_display_utc(user_display_timezone)
-
-            for trade in filtered_trades:
-                trade_dt_obj = datetime.strptime(f"{trade['date']} {trade['time']}", '%Y-%m-%d %H:%M')
-                
-                is_in_selected_session = False
-                if selected_sessions == "همه":
-                    is_in_selected_session = True 
-                elif isinstance(selected_sessions, list) and selected_sessions:
-                    for sess_key in selected_sessions:
-                        session_detail = all_session_times_display.get(sess_key)
-                        if session_detail and db_manager._is_trade_in_time_interval(trade_dt_obj, session_detail['start_display'], session_detail['end_display']):
-                            is_in_selected_session = True
-                            break
-                elif isinstance(selected_sessions, list) and not selected_sessions: 
-                    is_in_selected_session = False
-                
-                if not is_in_selected_session:
-                    continue 
-
-                is_in_hourly_interval = False
-                if hourly_mode == "full_session":
-                    is_in_hourly_interval = True 
-                elif hourly_mode == "session_segmentation":
-                    segments_to_check = hourly_filter_data.get("segments", [])
-                    if not segments_to_check: 
-                        is_in_hourly_interval = False
-                    else:
-                        for segment in segments_to_check:
-                            if db_manager._is_trade_in_time_interval(trade_dt_obj, segment['start'], segment['end']):
-                                is_in_hourly_interval = True
-                                break
-                elif hourly_mode in ["hourly_segmentation", "half_hourly_segmentation", "quarter_hourly_segmentation"]:
-                    intervals_to_check = hourly_filter_data.get("intervals", [])
-                    if not intervals_to_check: 
-                        is_in_hourly_interval = False
-                    else:
-                        for interval in intervals_to_check:
-                            if db_manager._is_trade_in_time_interval(trade_dt_obj, interval['start'], interval['end']):
-                                is_in_hourly_interval = True
-                                break
-                else: 
-                    is_in_hourly_interval = False 
-                
-                if is_in_hourly_interval:
-                    trades_after_session_and_hourly_filter.append(trade)
-            
-            filtered_trades = trades_after_session_and_hourly_filter
-
-
-        for trade in filtered_trades:
-            self.trades_tree.insert("", "end", values=(
-                trade['id'],
-                trade['date'],
-                trade['time'],
-                trade['symbol'],
-                trade['entry'],
-                trade['exit'],
-                trade['profit'],
-                trade['errors'],
-                trade['size'],
-                trade['position_id'],
-                trade['type'],
-                trade['actual_profit_amount']
-            ))
-        
-        num_trades = len(filtered_trades)
+        sort = (self.trades_view.sort_key, self.trades_view.descending)
+        page_size = self.trades_view.chunk_size
+        self.report_worker.submit(
+            lambda task: _compute_report_data(task, filters, user_display_timezone, sort, page_size),
+            on_done=self._show_report_data,
+            on_progress=self.report_progress_bar.set,
+            on_error=self._on_report_data_error
+        )
+
+    def _show_report_data(self, report_data):
+        """نتیجه _compute_report_data را (در ترد اصلی) در پنل‌های آمار، لیست تریدها و جزئیات گزارش نمایش می‌دهد."""
+        self.report_progress_bar.grid_remove()
+        report_stats = report_data['report_stats']
+
+        # اولین صفحه فقط اگر مرتب‌سازی لیست در این فاصله عوض نشده باشد قابل استفاده است
+        first_rows = report_data['first_page'] if report_data['sort'] == (self.trades_view.sort_key, self.trades_view.descending) else None
+        self.trades_view.reload(keep_position=False, total_rows=report_stats['trade_count'], first_rows=first_rows)
+
+        num_trades = report_stats['trade_count']
         self.stat_labels[0].configure(text=process_persian_text_for_matplotlib(f"تعداد تریدها:\n{num_trades}"))
         
-        total_profit_amount = sum(t['actual_profit_amount'] for t in filtered_trades if t['actual_profit_amount'] is not None)
+        total_profit_amount = report_stats['total_profit']
         self.stat_labels[1].configure(text=process_persian_text_for_matplotlib(f"سود کل:\n{total_profit_amount:.2f}"))
 
-        profit_trades_count = sum(1 for t in filtered_trades if t['profit'] == 'Profit')
-        loss_trades_count = sum(1 for t in filtered_trades if t['profit'] == 'Loss')
-        rf_trades_count = sum(1 for t in filtered_trades if t['profit'] == 'RF')
-        
-        total_decisive_trades = profit_trades_count + loss_trades_count
-        win_rate = (profit_trades_count / total_decisive_trades * 100) if total_decisive_trades > 0 else 0
+        profit_trades_count = report_stats['profit_count']
+        loss_trades_count = report_stats['loss_count']
+        win_rate = report_stats['win_rate']
         
         self.stat_labels[2].configure(text=process_persian_text_for_matplotlib(f"وین ریت:\n{win_rate:.2f}%"))
         self.stat_labels[3].configure(text=process_persian_text_for_matplotlib(f"ترید سودده:\n{profit_trades_count}"))
         self.stat_labels[4].configure(text=process_persian_text_for_matplotlib(f"ترید ضررده:\n{loss_trades_count}"))
 
         # Update the content of ReportDetailsFrame
-        self.report_details_frame_instance.update_report_content(filtered_trades, self.current_filters, self.current_template_name)
+        # آنالیزهای جزئیات (فراوانی خطاها، سشن‌ها و بازه‌های زمانی) روی نمایش ستونی همین تریدها برداری محاسبه می‌شوند
+        self.report_details_frame_instance.update_report_content(report_data['trade_frame'], self.current_filters, self.current_template_name)
+
+    def _on_report_data_error(self, error):
+        self.report_progress_bar.grid_remove()
+        messagebox.showerror("خطا", f"خطا در محاسبه گزارش:\n{error}", parent=self)
+
+
+    def _on_settings_changed(self, changed_settings):
+        # چند تغییر پشت سر هم (مثلاً ذخیره همه سشن‌ها، یا RF و بعد محاسبه مجدد تریدها) فقط یک بارگذاری مجدد دارند
+        if self._reload_pending or not self.winfo_exists():
+            return
+        self._reload_pending = True
+        self.after_idle(self._reload_after_settings_change)
 
+    def _reload_after_settings_change(self):
+        self._reload_pending = False
+        if self.winfo_exists():
+            self._load_report_data()
 
     def _show_template_selection_dialog(self):
         """
@@ -30,7 +30,7 @@ class ReportDetailsFrame(ctk.CTkFrame):
         self.report_content_area.grid_rowconfigure(0, weight=1)
 
         self.current_report_type_frame = None # To keep track of the currently displayed report content frame
-        self.current_filtered_trades = [] # Store filtered trades to use across reports
+        self.current_trade_frame = None # Columnar (TradeFrame) view of the filtered trades, shared across reports
         self.current_filters = {} # Store current filters
         self.current_template_name = "" # Store current template name
 
@@ -164,16 +164,17 @@ class ReportDetailsFrame(ctk.CTkFrame):
         }
         return color_map.get(key, "#6C757D")
 
-    def update_report_content(self, filtered_trades, filters, template_name):
+    def update_report_content(self, trade_frame, filters, template_name):
         """
         این تابع برای به‌روزرسانی محتوای گزارش بر اساس تریدهای فیلتر شده و فیلترهای اعمال شده استفاده می‌شود.
-        داده‌های فیلتر شده را ذخیره می‌کند تا برای گزارش‌های مختلف قابل استفاده باشد.
+        trade_frame (TradeFrame) نمایش ستونی تریدهای فیلتر شده است که ذخیره می‌شود تا گزارش‌های مختلف
+        آنالیزهای خود را روی آن به صورت برداری محاسبه کنند (لیست کامل تریدها دیگر لازم نیست).
         """
-        self.current_filtered_trades = filtered_trades
+        self.current_trade_frame = trade_frame
         self.current_filters = filters
         self.current_template_name = template_name
 
-        num_trades = len(filtered_trades)
+        num_trades = len(trade_frame) if trade_frame is not None else 0
         
         # Update Summary Report
         summary_text = process_persian_text_for_matplotlib(f"محتوای خلاصه گزارش در اینجا نمایش داده خواهد شد.\n\nتعداد تریدهای فیلتر شده: {num_trades}\nفیلتر اعمال شده: {template_name}")
@@ -223,16 +224,9 @@ class ReportDetailsFrame(ctk.CTkFrame):
         ctk.CTkLabel(scrollable_content_frame, text=process_persian_text_for_matplotlib("درصد"), font=("Vazirmatn", 11, "bold"), anchor="center").grid(row=header_row_idx, column=2, padx=2, pady=5, sticky="ew") # Anchor to center
         ctk.CTkLabel(scrollable_content_frame, text=process_persian_text_for_matplotlib("خطا"), font=("Vazirmatn", 11, "bold"), anchor="e").grid(row=header_row_idx, column=3, padx=2, pady=5, sticky="ew") # Anchor to east (right)
 
-        # Calculate error frequencies
-        error_counts = Counter()
-        total_errors_in_filter = 0 
-
-        for trade in self.current_filtered_trades:
-            if trade['errors']:
-                errors_in_trade = [err.strip() for err in trade['errors'].split(',') if err.strip()]
-                for error in set(errors_in_trade): # Count each unique error once per trade
-                    error_counts[error] += 1
-                    total_errors_in_filter += 1 # Summing up all individual error mentions for percentage base
+        # Calculate error frequencies (each unique error counted once per trade, from the error bitmap)
+        error_counts = self.current_trade_frame.error_frequencies() if self.current_trade_frame is not None else Counter()
+        total_errors_in_filter = sum(error_counts.values()) # Summing up all individual error mentions for percentage base
 
         if not error_counts:
             no_errors_label = ctk.CTkLabel(scrollable_content_frame, text=process_persian_text_for_matplotlib("هیچ خطایی در تریدهای فیلتر شده یافت نشد."),
@@ -294,7 +288,8 @@ class ReportDetailsFrame(ctk.CTkFrame):
         scrollable_content_frame.pack(fill="both", expand=True, padx=10, pady=10)
         scrollable_content_frame.grid_columnconfigure(0, weight=1) # Only one column for content sections
 
-        if not self.current_filtered_trades:
+        trade_frame = self.current_trade_frame
+        if trade_frame is None or len(trade_frame) == 0:
             no_trades_label = ctk.CTkLabel(scrollable_content_frame, text=process_persian_text_for_matplotlib("هیچ تریدی برای آنالیز یافت نشد."),
                                             font=("Vazirmatn", 12), text_color="gray50", anchor="center")
             no_trades_label.grid(row=0, column=0, pady=50, sticky="nsew")
@@ -331,22 +326,13 @@ class ReportDetailsFrame(ctk.CTkFrame):
                 row_idx += 1
                 return
 
-            analysis_results = {} # {session_key: Counter(), ...}
-            for sess_key in sessions_to_analyze_keys:
-                analysis_results[sess_key] = Counter()
-
-            for trade in self.current_filtered_trades:
-                trade_dt_obj = datetime.strptime(f"{trade['date']} {trade['time']}", '%Y-%m-%d %H:%M')
-                
-                # Check which session(s) the trade falls into
-                for sess_key in sessions_to_analyze_keys:
-                    session_detail = all_session_times_display.get(sess_key)
-                    if session_detail and db_manager._is_trade_in_time_interval(trade_dt_obj, session_detail['start_display'], session_detail['end_display']):
-                        if trade['errors']:
-                            errors_in_trade = [err.strip() for err in trade['errors'].split(',') if err.strip()]
-                            for error in set(errors_in_trade): # Count unique errors per trade for each session
-                                analysis_results[sess_key][error] += 1
-                        break # Assume a trade only belongs to one primary session for this analysis view
+            analysis_results = {sess_key: Counter() for sess_key in sessions_to_analyze_keys} # {session_key: Counter(), ...}
+            analyzed_session_keys = [sess_key for sess_key in sessions_to_analyze_keys if all_session_times_display.get(sess_key)]
+            # Assume a trade only belongs to one primary session (the first matching one) for this analysis view
+            session_error_counts = trade_frame.error_frequencies_by_interval(
+                [(all_session_times_display[sess_key]['start_display'], all_session_times_display[sess_key]['end_display']) for sess_key in analyzed_session_keys],
+                exclusive=True)
+            analysis_results.update(zip(analyzed_session_keys, session_error_counts))
 
 
             ctk.CTkLabel(scrollable_content_frame, text=process_persian_text_for_matplotlib("آنالیز خطاها بر اساس سشن‌های کامل"),
@@ -445,23 +431,11 @@ class ReportDetailsFrame(ctk.CTkFrame):
                 return
 
 
-            # Initialize counters for all segments
-            for seg in segments_to_analyze:
-                segment_key = (seg['session_key'], seg['start'], seg['end'])
-                segment_results[segment_key] = Counter()
-
-            for trade in self.current_filtered_trades:
-                trade_dt_obj = datetime.strptime(f"{trade['date']} {trade['time']}", '%Y-%m-%d %H:%M')
-                
-                for seg in segments_to_analyze:
-                    if db_manager._is_trade_in_time_interval(trade_dt_obj, seg['start'], seg['end']):
-                        if trade['errors']:
-                            errors_in_trade = [err.strip() for err in trade['errors'].split(',') if err.strip()]
-                            segment_key = (seg['session_key'], seg['start'], seg['end'])
-                            for error in set(errors_in_trade):
-                                segment_results[segment_key][error] += 1
-                        # No break here, as a trade *could* fall into multiple segments if they overlap
-                        # (though ideal segments typically don't overlap).
+            # A trade *could* fall into multiple segments if they overlap
+            # (though ideal segments typically don't overlap).
+            segment_error_counts = trade_frame.error_frequencies_by_interval([(seg['start'], seg['end']) for seg in segments_to_analyze])
+            for seg, error_counts in zip(segments_to_analyze, segment_error_counts):
+                segment_results[(seg['session_key'], seg['start'], seg['end'])] = error_counts
 
             ctk.CTkLabel(scrollable_content_frame, text=process_persian_text_for_matplotlib("آنالیز خطاها بر اساس تفکیک سشن"),
                          font=("Vazirmatn", 13, "bold"), text_color="#202124", anchor="e").grid(row=row_idx, column=0, pady=(10, 5), sticky="ew")
@@ -556,22 +530,9 @@ class ReportDetailsFrame(ctk.CTkFrame):
                 row_idx += 1
                 return
 
-            # Initialize counters for all intervals
-            for interval in intervals_to_analyze:
-                interval_key = (interval['start'], interval['end'])
-                interval_results[interval_key] = Counter()
-
-            for trade in self.current_filtered_trades:
-                trade_dt_obj = datetime.strptime(f"{trade['date']} {trade['time']}", '%Y-%m-%d %H:%M')
-                
-                for interval in intervals_to_analyze:
-                    if db_manager._is_trade_in_time_interval(trade_dt_obj, interval['start'], interval['end']):
-                        if trade['errors']:
-                            errors_in_trade = [err.strip() for err in trade['errors'].split(',') if err.strip()]
-                            interval_key = (interval['start'], interval['end'])
-                            for error in set(errors_in_trade):
-                                interval_results[interval_key][error] += 1
-                        # No break here, as a trade *could* fall into multiple intervals if they overlap (rare for proper granularity)
+            # A trade *could* fall into multiple intervals if they overlap (rare for proper granularity)
+            interval_keys = [(interval['start'], interval['end']) for interval in intervals_to_analyze]
+            interval_results = dict(zip(interval_keys, trade_frame.error_frequencies_by_interval(interval_keys)))
 
             granularity_display_name_map = {
                 60: process_persian_text_for_matplotlib("تفکیک ساعتی"),
@@ -9,7 +9,7 @@ class ErrorFilterFrame(ctk.CTkFrame):
     def __init__(self, master, on_change_callback=None, fg_color="transparent", **kwargs):
         super().__init__(master, fg_color=fg_color, **kwargs)
         self.on_change_callback = on_change_callback
-        self.errors = [] # List of unique errors from DB based on filters
+        self.errors = None # List of unique errors from DB based on filters (None: not loaded yet)
         self.selected_errors_vars = {} # Dictionary to hold BooleanVars for each error
         self.all_errors_var = ctk.BooleanVar(value=False) # "هیچکدام" ابتدا انتخاب شده - تغییر کرد
 
@@ -49,13 +49,18 @@ class ErrorFilterFrame(ctk.CTkFrame):
         """
         Reloads error options based on the provided trade type.
         This function is called by the main report window when date/trade_type filters change.
+        چک‌باکس‌ها فقط وقتی دوباره ساخته می‌شوند که لیست خطاها واقعاً تغییر کرده باشد.
         """
+        errors = db_manager.get_unique_errors_by_filters(trade_type_filter=trade_type_filter) # date_range_selection removed
+        if not initial_load and self.errors is not None and sorted(errors) == sorted(self.errors):
+            return
+
         # Clear previous checkboxes, keeping "همه"
         for widget in self.checkbox_container_frame.winfo_children():
             if widget != self.all_checkbox:
                 widget.destroy()
 
-        self.errors = db_manager.get_unique_errors_by_filters(trade_type_filter=trade_type_filter) # date_range_selection removed
+        self.errors = errors
         
         # Reset selected errors. We will re-check based on previous selection or default to all.
         previously_selected = self.get_selection() # Get current selection before clearing checkboxes
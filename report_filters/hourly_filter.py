@@ -143,6 +143,19 @@ class HourlyFilterFrame(ctk.CTkFrame):
         
         self.reload_hourly_data(selected_sessions_from_main=None, initial_load=True)
 
+        # Reload available hours only when the timezone or session times actually change in settings
+        db_manager.subscribe_settings(self._on_settings_changed,
+                                      keys=('default_timezone',) + db_manager.SESSION_SETTING_KEYS)
+        self.bind("<Destroy>", self._on_destroy, add="+")
+
+    def _on_settings_changed(self, changed_settings):
+        if self.winfo_exists():
+            self.after_idle(lambda: self.reload_hourly_data(selected_sessions_from_main=self.selected_session_keys or None))
+
+    def _on_destroy(self, event):
+        if event.widget is self:
+            db_manager.unsubscribe_settings(self._on_settings_changed)
+
     def _on_mode_change(self):
         self._show_current_mode_frame()
         self._update_calculated_segments_display()
@@ -10,7 +10,7 @@ class InstrumentFilterFrame(ctk.CTkFrame):
     def __init__(self, master, on_change_callback=None, fg_color="transparent", **kwargs):
         super().__init__(master, fg_color=fg_color, **kwargs)
         self.on_change_callback = on_change_callback
-        self.symbols = []
+        self.symbols = None # None یعنی هنوز بارگذاری نشده
         self.selected_symbols_vars = {}
         self.all_symbols_var = ctk.BooleanVar(value=False) # پیش فرض: هیچکدام انتخاب نشده - تغییر کرد
 
@@ -39,7 +39,12 @@ class InstrumentFilterFrame(ctk.CTkFrame):
         """
         Reloads symbols based on all available symbols.
         This function is called by the main report window.
+        چک‌باکس‌ها فقط وقتی دوباره ساخته می‌شوند که لیست نمادها واقعاً تغییر کرده باشد.
         """
+        symbols = db_manager.get_unique_symbols() # No date range parameters
+        if self.symbols is not None and sorted(symbols) == sorted(self.symbols):
+            return
+
         # Clear previous checkboxes, keeping the "همه" checkbox intact
         for widget in self.checkbox_container_frame.winfo_children():
             if widget != self.all_checkbox:
@@ -48,7 +53,7 @@ class InstrumentFilterFrame(ctk.CTkFrame):
         # مهم: قبل از لود کردن نمادهای جدید، وضعیت انتخاب‌های قبلی رو ذخیره کن
         previously_selected = self.get_selection() 
         
-        self.symbols = db_manager.get_unique_symbols() # No date range parameters
+        self.symbols = symbols
         self.selected_symbols_vars = {}
 
         if not self.symbols:
@@ -16,6 +16,7 @@ class SessionFilterFrame(ctk.CTkFrame):
             'london': 'London'
         }
         self.session_vars = {} # To hold BooleanVar for each session
+        self.loaded_session_times = None # ساعات سشن‌هایی که چک‌باکس‌هایشان ساخته شده است
         # Initial value for all_sessions_var should be False by default.
         # It will be set correctly by _load_weekdays based on the actual selection.
         self.all_sessions_var = ctk.BooleanVar(value=False) 
@@ -60,6 +61,12 @@ class SessionFilterFrame(ctk.CTkFrame):
         user_tz_name = db_manager.get_default_timezone()
         self.current_user_timezone_label.configure(text=process_persian_text_for_matplotlib(f"ساعت‌ها بر اساس منطقه زمانی: {user_tz_name}"))
 
+        # چک‌باکس‌ها فقط وقتی دوباره ساخته می‌شوند که سشن‌ها یا ساعات نمایشی آن‌ها تغییر کرده باشد
+        current_session_times = db_manager.get_session_times_with_display_utc(user_tz_name)
+        if not initial_load and current_session_times == self.loaded_session_times:
+            return
+        self.loaded_session_times = current_session_times
+
         # Clear previous checkboxes, keeping "همه"
         for widget in self.checkbox_container_frame.winfo_children():
             if widget != self.all_checkbox:
@@ -71,8 +78,6 @@ class SessionFilterFrame(ctk.CTkFrame):
         
         self.session_vars = {}
 
-        current_session_times = db_manager.get_session_times_with_display_utc(user_tz_name)
-
         if not current_session_times:
             no_sessions_label = ctk.CTkLabel(self.checkbox_container_frame, text=process_persian_text_for_matplotlib("سشنی در تنظیمات یافت نشد."), font=("Vazirmatn", 10), text_color="gray50")
             no_sessions_label.grid(row=1, column=0, sticky="e", padx=10, pady=5)
@@ -25,6 +25,15 @@ import json
 import report
 
 class ReportSelectionWindow(ctk.CTkToplevel):
+    # گراف وابستگی فیلترها: {فیلتر: فیلترهایی که لیست گزینه‌هایشان به انتخاب آن فیلتر بستگی دارد}
+    # (ترتیب مهم است: سشن‌ها باید قبل از ساعات ترید به‌روز شوند)
+    FILTER_DEPENDENTS = {
+        "trade_type": ("errors",),
+        "sessions": ("hourly",),
+    }
+    # تغییرات پشت سر هم فیلترها (مثلاً چند کلیک سریع) در این فاصله با هم پردازش می‌شوند
+    FILTER_CHANGE_DEBOUNCE_MS = 150
+
     # آرگومان parent_root را می‌پرفتیم اما دیگر از آن برای transient استفاده نمی‌کنیم.
     def __init__(self, parent_root_unused, open_toplevel_windows_list, minimize_on_open=False): 
         # super().__init__(parent_root_unused) # دیگر نیازی به ارسال parent_root به super نیست
@@ -57,6 +66,9 @@ class ReportSelectionWindow(ctk.CTkToplevel):
             for filter_key in self.filter_frames:
                 if hasattr(self.filter_frames[filter_key], 'on_change_callback'):
                     self.filter_frames[filter_key].on_change_callback = None
+            if self._filter_change_job is not None:
+                self.after_cancel(self._filter_change_job)
+                self._filter_change_job = None
 
             self.destroy()
 
@@ -123,13 +135,23 @@ class ReportSelectionWindow(ctk.CTkToplevel):
         self.filter_buttons = {}
         self.active_filter_frame = None
 
+        self._pending_filter_changes = set() # فیلترهای تغییر یافته از آخرین به‌روزرسانی (None یعنی همه)
+        self._filter_change_job = None
+        self._dependent_filter_inputs = {} # {فیلتر وابسته: انتخاب فیلتر بالادستی در آخرین بارگذاری}
+
         # --- Filter Modules Instances ---
-        self.filter_frames["instruments"] = InstrumentFilterFrame(self.filter_content_area, on_change_callback=self._on_filter_changed)
-        self.filter_frames["weekday"] = WeekdayFilterFrame(self.filter_content_area, on_change_callback=self._on_filter_changed)
-        self.filter_frames["sessions"] = SessionFilterFrame(self.filter_content_area, on_change_callback=self._on_filter_changed)
-        self.filter_frames["hourly"] = HourlyFilterFrame(self.filter_content_area, on_change_callback=self._on_filter_changed)
-        self.filter_frames["trade_type"] = TradeTypeFilterFrame(self.filter_content_area, on_change_callback=self._on_filter_changed)
-        self.filter_frames["errors"] = ErrorFilterFrame(self.filter_content_area, on_change_callback=self._on_filter_changed)
+        self.filter_frames["instruments"] = InstrumentFilterFrame(self.filter_content_area, on_change_callback=lambda: self._on_filter_changed("instruments"))
+        self.filter_frames["weekday"] = WeekdayFilterFrame(self.filter_content_area, on_change_callback=lambda: self._on_filter_changed("weekday"))
+        self.filter_frames["sessions"] = SessionFilterFrame(self.filter_content_area, on_change_callback=lambda: self._on_filter_changed("sessions"))
+        self.filter_frames["hourly"] = HourlyFilterFrame(self.filter_content_area, on_change_callback=lambda: self._on_filter_changed("hourly"))
+        self.filter_frames["trade_type"] = TradeTypeFilterFrame(self.filter_content_area, on_change_callback=lambda: self._on_filter_changed("trade_type"))
+        self.filter_frames["errors"] = ErrorFilterFrame(self.filter_content_area, on_change_callback=lambda: self._on_filter_changed("errors"))
+
+        # بارگذاری فیلترهای وابسته بر اساس انتخاب فیلتر بالادستی
+        self._dependent_filter_loaders = {
+            "errors": lambda trade_type: self.filter_frames["errors"].reload_errors(trade_type_filter=trade_type),
+            "hourly": lambda sessions: self.filter_frames["hourly"].reload_hourly_data(selected_sessions_from_main=sessions),
+        }
 
         self._create_filter_buttons()
 
@@ -270,25 +292,54 @@ class ReportSelectionWindow(ctk.CTkToplevel):
 
         self._populate_templates_list()
         self._reset_edit_mode_ui()
+        # اولین بارگذاری گزینه‌های همه فیلترها (نمادها، سشن‌ها، خطاها و ساعات)
+        self._on_filter_changed()
 
         self.focus_set()
         # self.wait_window(self) # این خط در اینجا نیازی نیست چون در app.py مدیریت می‌شود
 
-    def _on_filter_changed(self):
+    def _on_filter_changed(self, changed_filter=None):
         """
         Handles changes in any filter. This is the central point to
         trigger dependent filter reloads and summary updates.
+        changed_filter کلید فیلتر تغییر یافته است؛ None (مثلاً بعد از ریست یا بارگذاری قالب) یعنی همه فیلترها.
+        بارگذاری مجدد با تأخیر کوتاهی (debounce) انجام می‌شود تا چند تغییر پشت سر هم فقط یک بار پردازش شوند.
         """
-        current_trade_type_filter = self.filter_frames["trade_type"].get_selection()
-        current_session_filter_selection = self.filter_frames["sessions"].get_selection()
+        self._pending_filter_changes.add(changed_filter)
+        self._clear_template_selection()
+        if self._filter_change_job is not None:
+            self.after_cancel(self._filter_change_job)
+        self._filter_change_job = self.after(self.FILTER_CHANGE_DEBOUNCE_MS, self._flush_filter_changes)
 
-        self.filter_frames["instruments"].reload_symbols() # date_range_selection parameter removed
-        self.filter_frames["sessions"].reload_sessions()
-        self.filter_frames["errors"].reload_errors(trade_type_filter=current_trade_type_filter) # date_range_selection parameter removed
-        self.filter_frames["hourly"].reload_hourly_data(selected_sessions_from_main=current_session_filter_selection)
+    def _flush_filter_changes(self):
+        """
+        تغییرات در انتظار فیلترها را اعمال می‌کند: فقط فیلترهایی که طبق FILTER_DEPENDENTS به فیلتر تغییر یافته
+        وابسته‌اند (و فقط اگر انتخاب فیلتر بالادستی واقعاً عوض شده باشد) دوباره بارگذاری می‌شوند.
+        """
+        if self._filter_change_job is not None:
+            self.after_cancel(self._filter_change_job)
+            self._filter_change_job = None
+        changed_filters, self._pending_filter_changes = self._pending_filter_changes, set()
+        if not changed_filters:
+            return
+        full_refresh = None in changed_filters
+
+        if full_refresh:
+            # گزینه‌های نمادها و سشن‌ها به فیلترهای دیگر وابسته نیستند و فقط در بازخوانی کامل به‌روز می‌شوند
+            self.filter_frames["instruments"].reload_symbols() # date_range_selection parameter removed
+            self.filter_frames["sessions"].reload_sessions()
+
+        for upstream_filter, dependent_filters in self.FILTER_DEPENDENTS.items():
+            if not full_refresh and upstream_filter not in changed_filters:
+                continue
+            upstream_selection = self.filter_frames[upstream_filter].get_selection()
+            for dependent_filter in dependent_filters:
+                if not full_refresh and self._dependent_filter_inputs.get(dependent_filter) == upstream_selection:
+                    continue
+                self._dependent_filter_inputs[dependent_filter] = upstream_selection
+                self._dependent_filter_loaders[dependent_filter](upstream_selection)
 
         self._update_filter_summary()
-        self._clear_template_selection()
 
     def _create_filter_buttons(self):
         button_texts = [
@@ -802,6 +853,8 @@ class ReportSelectionWindow(ctk.CTkToplevel):
         """
         تمام فیلترهای انتخاب شده از هر فریم فیلتر را جمع‌آوری و به صورت دیکشنری برمی‌گرداند.
         """
+        # تغییراتی که هنوز (به خاطر debounce) اعمال نشده‌اند، قبل از خواندن انتخاب‌ها اعمال می‌شوند
+        self._flush_filter_changes()
         filters = {}
         # Changed: Removed "date_range" from filters collection.
         filters["instruments"] = self.filter_frames["instruments"].get_selection()
@@ -0,0 +1,139 @@
+# report_worker.py
+
+import queue
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ReportComputationCancelled(Exception):
+    """محاسبه‌ای که با یک درخواست جدیدتر منسوخ شده است؛ از داخل task.check_cancelled() بالا می‌رود."""
+
+
+class ReportTask:
+    """
+    رابط تابع محاسبه با ReportComputeWorker: گزارش پیشرفت و بررسی لغو شدن بین مراحل محاسبه.
+    """
+
+    def __init__(self, worker, generation):
+        self._worker = worker
+        self.generation = generation
+
+    def is_cancelled(self):
+        return self.generation != self._worker._generation
+
+    def check_cancelled(self):
+        if self.is_cancelled():
+            raise ReportComputationCancelled()
+
+    def progress(self, fraction):
+        """پیشرفت محاسبه (عددی بین 0 و 1) را برای نمایش در ترد اصلی ارسال می‌کند."""
+        self.check_cancelled()
+        self._worker._messages.put((self.generation, 'progress', fraction))
+
+
+class ReportComputeWorker:
+    """
+    محاسبات گزارش (کوئری‌های دیتابیس و تجمیع‌ها) را در یک ترد پس‌زمینه اجرا می‌کند تا پنجره Tk قفل نشود.
+    هر submit یک نسل (generation) جدید می‌سازد و محاسبه نسل قبلی را لغو می‌کند؛ نتیجه‌ها، پیشرفت و خطاها
+    در یک صف قرار می‌گیرند و با after() در ترد اصلی Tk به callbackها تحویل داده می‌شوند
+    (ویجت‌های Tk نباید از ترد دیگری صدا زده شوند).
+
+    Args:
+        widget: ویجتی که after() آن برای دریافت نتیجه‌ها استفاده می‌شود.
+        poll_interval_ms (int): فاصله بررسی صف نتیجه‌ها در حین محاسبه.
+    """
+
+    def __init__(self, widget, poll_interval_ms=40):
+        self.widget = widget
+        self.poll_interval_ms = poll_interval_ms
+        # یک ترد کافی است: محاسبه‌های قدیمی‌تر در صف، قبل از شروع لغو شده‌اند و بلافاصله کنار می‌روند
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-compute")
+        self._messages = queue.Queue()
+        self._generation = 0
+        self._callbacks = None
+        self._poll_job = None
+
+    def submit(self, compute, on_done, on_progress=None, on_error=None):
+        """
+        یک محاسبه جدید را شروع و محاسبه در حال اجرای قبلی را لغو می‌کند.
+        Args:
+            compute (callable): compute(task) در ترد پس‌زمینه اجرا می‌شود و نباید به ویجت‌های Tk دست بزند؛
+                                بین مراحل task.progress(fraction) یا task.check_cancelled() را صدا می‌زند.
+            on_done (callable): on_done(result) در ترد اصلی، فقط برای آخرین محاسبه.
+            on_progress (callable, optional): on_progress(fraction) در ترد اصلی.
+            on_error (callable, optional): on_error(exception) در ترد اصلی.
+        Returns:
+            int: شماره نسل این محاسبه.
+        """
+        self._generation += 1
+        task = ReportTask(self, self._generation)
+        self._callbacks = (on_done, on_progress, on_error)
+        self._executor.submit(self._run, compute, task)
+        self._schedule_poll()
+        return task.generation
+
+    def cancel(self):
+        """محاسبه در حال اجرا را لغو می‌کند؛ نتیجه آن دیگر تحویل داده نمی‌شود."""
+        self._generation += 1
+        self._callbacks = None
+
+    def is_busy(self):
+        return self._callbacks is not None
+
+    def close(self):
+        """لغو محاسبه فعلی و آزاد کردن ترد (هنگام بستن پنجره)."""
+        self.cancel()
+        if self._poll_job is not None:
+            try:
+                self.widget.after_cancel(self._poll_job)
+            except tk.TclError:
+                pass
+            self._poll_job = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, compute, task):
+        try:
+            task.check_cancelled()
+            result = compute(task)
+            task.check_cancelled()
+            self._messages.put((task.generation, 'done', result))
+        except ReportComputationCancelled:
+            pass
+        except Exception as e:
+            self._messages.put((task.generation, 'error', e))
+
+    def _schedule_poll(self):
+        if self._poll_job is None:
+            self._poll_job = self.widget.after(self.poll_interval_ms, self._poll)
+
+    def _poll(self):
+        self._poll_job = None
+        try:
+            if not self.widget.winfo_exists():
+                return
+        except tk.TclError:
+            return
+
+        while True:
+            try:
+                generation, kind, payload = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            # پیام‌های محاسبه‌های منسوخ شده دور ریخته می‌شوند
+            if generation != self._generation or self._callbacks is None:
+                continue
+            on_done, on_progress, on_error = self._callbacks
+            if kind == 'progress':
+                if on_progress:
+                    on_progress(payload)
+            else:
+                self._callbacks = None
+                if kind == 'done':
+                    on_done(payload)
+                elif on_error:
+                    on_error(payload)
+                else:
+                    print(f"خطا در محاسبه گزارش: {payload}")
+
+        if self._callbacks is not None:
+            self._schedule_poll()
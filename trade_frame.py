@@ -0,0 +1,211 @@
+# trade_frame.py
+
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+import numpy as np
+
+# کدهای ستون نتیجه ترید (trades.profit)؛ مقادیر دیگر کد -1 می‌گیرند
+TRADE_OUTCOMES = ('Profit', 'Loss', 'RF')
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def _time_to_minutes(time_str):
+    h, m = map(int, time_str.split(':'))
+    return h * 60 + m
+
+
+def interval_minute_lookup(intervals, exclusive=False):
+    """
+    جدول جستجوی دقیقه روز → بازه‌ها که یک بار برای هر مجموعه بازه ساخته می‌شود.
+    Args:
+        intervals (list): زوج‌های (start, end) به صورت 'HH:MM'؛ بازه‌ها [start, end) هستند و بازه‌های شبانه
+                          (مثل 22:00-04:00) هم پشتیبانی می‌شوند.
+        exclusive (bool): اگر True باشد هر دقیقه فقط به اولین بازه‌ای که شامل آن است تعلق می‌گیرد.
+    Returns:
+        numpy.ndarray: ماتریس بولی (تعداد بازه‌ها × 1440)؛ سطر i دقیقه‌های بازه i را مشخص می‌کند
+                       (بازه‌ها می‌توانند هم‌پوشانی داشته باشند، مثل بخش‌های سشن‌های لندن و نیویورک).
+    """
+    minutes = np.arange(MINUTES_PER_DAY)
+    lookup = np.zeros((len(intervals), MINUTES_PER_DAY), dtype=bool)
+    unassigned = np.ones(MINUTES_PER_DAY, dtype=bool)
+    for row, (start_time_str, end_time_str) in enumerate(intervals):
+        start_minutes = _time_to_minutes(start_time_str)
+        end_minutes = _time_to_minutes(end_time_str)
+        if start_minutes <= end_minutes:
+            in_interval = (minutes >= start_minutes) & (minutes < end_minutes)
+        else:
+            in_interval = (minutes >= start_minutes) | (minutes < end_minutes)
+        if exclusive:
+            in_interval &= unassigned
+            unassigned &= ~in_interval
+        lookup[row] = in_interval
+    return lookup
+
+
+class TradeFrame:
+    """
+    نمایش ستونی تریدها (آرایه‌های NumPy) برای محاسبات تحلیلی گزارش‌ها.
+    هر ترید یک اندیس در همه ستون‌ها دارد و عضویت خطاها در ماتریس بولی error_bitmap
+    (سطر = ترید، ستون = خطای error_names) نگه داشته می‌شود.
+    همه متدهای آماری یک mask بولی اختیاری برای انتخاب زیرمجموعه‌ای از تریدها می‌گیرند.
+    """
+
+    def __init__(self, trade_ids, opened_at_utc, weekday, minute_of_day, symbol_codes, symbols,
+                 outcome_codes, profit_cents, error_bitmap, error_names,
+                 unscaled_profit_rows=None, unscaled_profit_amounts=None, profit_scale_digits=2):
+        self.trade_ids = trade_ids
+        self.opened_at_utc = opened_at_utc
+        self.weekday = weekday
+        self.minute_of_day = minute_of_day
+        self.symbol_codes = symbol_codes
+        self.symbols = symbols
+        self.outcome_codes = outcome_codes
+        self.profit_cents = profit_cents
+        self.error_bitmap = error_bitmap
+        self.error_names = error_names
+        # سود/ضررهایی که در profit_cents جا نشده‌اند (اندیس ترید و مقدار Decimal)
+        self.unscaled_profit_rows = unscaled_profit_rows if unscaled_profit_rows is not None else np.empty(0, dtype=np.int64)
+        self.unscaled_profit_amounts = unscaled_profit_amounts or []
+        self.profit_scale_digits = profit_scale_digits
+        # نتایج آنالیز خطاها روی همین frame نگه داشته می‌شوند (db_manager خود frame را بر اساس فیلترها کش می‌کند)
+        self._minute_error_counts = None
+        self._error_frequency_results = {}
+
+    @classmethod
+    def from_query_rows(cls, trade_rows, error_links, error_names_by_id, profit_scale_digits=2):
+        """
+        TradeFrame را از نتیجه کوئری‌های db_manager.get_trades_frame می‌سازد.
+        Args:
+            trade_rows (list): تاپل‌های (id, opened_at_utc, weekday, minute_of_day, symbol, profit, profit_cents, actual_profit_amount)
+            error_links (list): زوج‌های (trade_id, error_id) از جدول trade_errors
+            error_names_by_id (dict): {error_id: عنوان خطا}
+        """
+        trade_ids = np.array([row[0] for row in trade_rows], dtype=np.int64)
+        opened_at_utc = np.array([row[1] if row[1] is not None else -1 for row in trade_rows], dtype=np.int64)
+        weekday = np.array([row[2] if row[2] is not None else -1 for row in trade_rows], dtype=np.int8)
+        minute_of_day = np.array([row[3] if row[3] is not None else -1 for row in trade_rows], dtype=np.int16)
+
+        symbols, symbol_codes = np.unique(np.array([row[4] for row in trade_rows], dtype=str), return_inverse=True)
+        outcome_index = {outcome: code for code, outcome in enumerate(TRADE_OUTCOMES)}
+        outcome_codes = np.array([outcome_index.get(row[5], -1) for row in trade_rows], dtype=np.int8)
+        profit_cents = np.array([row[6] if row[6] is not None else 0 for row in trade_rows], dtype=np.int64)
+
+        unscaled_profit_rows = []
+        unscaled_profit_amounts = []
+        for index, row in enumerate(trade_rows):
+            if row[6] is None and row[7] not in (None, ''):
+                try:
+                    unscaled_profit_amounts.append(Decimal(row[7]))
+                    unscaled_profit_rows.append(index)
+                except InvalidOperation:
+                    pass
+
+        # ماتریس عضویت خطاها: ستون‌ها فقط خطاهایی هستند که در این تریدها دیده شده‌اند
+        error_ids = sorted({error_id for _, error_id in error_links})
+        error_column = {error_id: column for column, error_id in enumerate(error_ids)}
+        error_bitmap = np.zeros((len(trade_rows), len(error_ids)), dtype=bool)
+        if error_links and len(trade_ids):
+            id_order = np.argsort(trade_ids)
+            link_trade_ids = np.array([trade_id for trade_id, _ in error_links], dtype=np.int64)
+            positions = np.searchsorted(trade_ids, link_trade_ids, sorter=id_order)
+            positions = np.minimum(positions, len(trade_ids) - 1)
+            row_indices = id_order[positions]
+            known = trade_ids[row_indices] == link_trade_ids
+            columns = np.array([error_column[error_id] for _, error_id in error_links], dtype=np.int64)
+            error_bitmap[row_indices[known], columns[known]] = True
+
+        return cls(trade_ids, opened_at_utc, weekday, minute_of_day, symbol_codes.astype(np.int32), list(symbols),
+                   outcome_codes, profit_cents, error_bitmap, [error_names_by_id[error_id] for error_id in error_ids],
+                   np.array(unscaled_profit_rows, dtype=np.int64), unscaled_profit_amounts, profit_scale_digits)
+
+    def __len__(self):
+        return len(self.trade_ids)
+
+    def _mask_or_all(self, mask):
+        return np.ones(len(self), dtype=bool) if mask is None else mask
+
+    def minute_mask(self, start_time_str, end_time_str):
+        """
+        تریدهایی که زمان محلی آن‌ها در بازه [start, end) است (بازه‌های شبانه مثل 22:00-04:00 هم پشتیبانی می‌شوند).
+        """
+        start_minutes = _time_to_minutes(start_time_str)
+        end_minutes = _time_to_minutes(end_time_str)
+        known = self.minute_of_day >= 0
+        if start_minutes <= end_minutes:
+            return known & (self.minute_of_day >= start_minutes) & (self.minute_of_day < end_minutes)
+        return known & ((self.minute_of_day >= start_minutes) | (self.minute_of_day < end_minutes))
+
+    def outcome_counts(self, mask=None):
+        """
+        Returns:
+            dict: {'Profit': تعداد, 'Loss': تعداد, 'RF': تعداد}
+        """
+        counts = np.bincount(self.outcome_codes[self._mask_or_all(mask)] + 1, minlength=len(TRADE_OUTCOMES) + 1)
+        return {outcome: int(counts[code + 1]) for code, outcome in enumerate(TRADE_OUTCOMES)}
+
+    def win_rate(self, mask=None):
+        """درصد تریدهای سودده از مجموع تریدهای سودده و زیان‌ده."""
+        counts = self.outcome_counts(mask)
+        decisive_trades = counts['Profit'] + counts['Loss']
+        return (counts['Profit'] / decisive_trades * 100) if decisive_trades > 0 else 0
+
+    def total_profit(self, mask=None):
+        """جمع دقیق سود/ضرر (Decimal)."""
+        selected = self._mask_or_all(mask)
+        total = Decimal(int(self.profit_cents[selected].sum())).scaleb(-self.profit_scale_digits)
+        for row_index, amount in zip(self.unscaled_profit_rows, self.unscaled_profit_amounts):
+            if selected[row_index]:
+                total += amount
+        return total
+
+    def error_frequencies(self, mask=None):
+        """
+        تعداد تریدهای دارای هر خطا (هر خطا در هر ترید یک بار شمرده می‌شود).
+        Returns:
+            Counter: {عنوان خطا: تعداد}؛ خطاهای با تعداد صفر حذف می‌شوند.
+        """
+        if mask is None:
+            if None not in self._error_frequency_results:
+                self._error_frequency_results[None] = self._error_counter(self.error_bitmap.sum(axis=0))
+            return Counter(self._error_frequency_results[None])
+        return self._error_counter(self.error_bitmap[mask].sum(axis=0))
+
+    def _error_counter(self, column_counts):
+        return Counter({name: int(count) for name, count in zip(self.error_names, column_counts) if count})
+
+    def minute_error_counts(self):
+        """
+        تعداد تریدهای دارای هر خطا در هر دقیقه روز (زمان محلی)، با یک گذر روی عضویت خطاها.
+        یک بار برای هر TradeFrame محاسبه و نگه داشته می‌شود.
+        Returns:
+            numpy.ndarray: ماتریس (1440 × تعداد خطاها)
+        """
+        if self._minute_error_counts is None:
+            trade_rows, error_columns = np.nonzero(self.error_bitmap)
+            trade_minutes = self.minute_of_day[trade_rows].astype(np.int64)
+            known = trade_minutes >= 0
+            error_count = len(self.error_names)
+            cells = trade_minutes[known] * error_count + error_columns[known]
+            self._minute_error_counts = np.bincount(cells, minlength=MINUTES_PER_DAY * error_count) \
+                .reshape(MINUTES_PER_DAY, error_count)
+        return self._minute_error_counts
+
+    def error_frequencies_by_interval(self, intervals, exclusive=False):
+        """
+        فراوانی خطاها برای همه بازه‌های زمانی (سشن‌ها، بخش‌ها یا بازه‌های ساعتی/یک‌ربعی) به یکباره:
+        جدول دقیقه → بازه (interval_minute_lookup) در شمارش خطاهای هر دقیقه ضرب می‌شود،
+        پس هزینه به تعداد بازه‌ها × تعداد تریدها بستگی ندارد.
+        Args:
+            intervals (list): زوج‌های (start, end) به صورت 'HH:MM'.
+            exclusive (bool): هر ترید فقط در اولین بازه شامل زمان آن شمرده شود.
+        Returns:
+            list: یک Counter ({عنوان خطا: تعداد}) برای هر بازه، به همان ترتیب intervals.
+        """
+        if not intervals:
+            return []
+        result_key = (tuple(tuple(interval) for interval in intervals), exclusive)
+        if result_key not in self._error_frequency_results:
+            interval_counts = interval_minute_lookup(intervals, exclusive).astype(np.int64) @ self.minute_error_counts()
+            self._error_frequency_results[result_key] = [self._error_counter(column_counts) for column_counts in interval_counts]
+        return [Counter(error_counts) for error_counts in self._error_frequency_results[result_key]]
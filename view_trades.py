@@ -3,6 +3,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog 
 import db_manager 
+from virtual_treeview import VirtualTreeview
 from decimal import Decimal 
 import json 
 import os 
@@ -12,50 +13,56 @@ from datetime import datetime
 # تابع اصلی برای نمایش پنجره تریدها
 def show_trades_window(root, refresh_main_errors_callback=None, update_main_timezone_display=None, open_toplevel_windows_list=None): # اضافه شدن آرگومان‌ها
     def load_trades():
-        tree.delete(*tree.get_children())
-        
         # دریافت تایم زون فعال از db_manager برای نمایش
         current_display_timezone = db_manager.get_default_timezone()
         display_message = f"{current_display_timezone} :منطقه زمانی فعال (برای تغییر، به تنظیمات برنامه بروید. تریدها با این منطقه زمانی نمایش داده میشن)"
         current_display_timezone_label.config(text=display_message)
 
-        trades = db_manager.get_all_trades(current_display_timezone) # ارسال تایم زون نمایش
-        for row in trades:
-            display_values = []
-            display_values.append(row['id'])
-            display_values.append(row['position_id'] if row['position_id'] is not None else '') 
-            display_values.append(row['date'])
-            display_values.append(row['time'])
-            display_values.append(row['symbol'])
-            display_values.append(row['type'] if row['type'] is not None else '') 
-            
-            size_val = row['size']
-            display_values.append(f"{size_val:.2f}" if isinstance(size_val, Decimal) else (''))
+        # فقط ردیف‌های قابل مشاهده از دیتابیس خوانده می‌شوند (صفحه‌بندی keyset در VirtualTreeview)
+        trades_view.reload()
 
-            entry_val = row['entry']
-            display_values.append(f"{entry_val:.2f}" if isinstance(entry_val, Decimal) else (''))
+    def fetch_trades_page(sort_key, descending, **page_kwargs):
+        return db_manager.get_trades_page(db_manager.get_default_timezone(), None, sort_key, descending, **page_kwargs)
 
-            exit_val = row['exit']
-            display_values.append(f"{exit_val:.2f}" if isinstance(exit_val, Decimal) else (''))
-            
-            display_values.append(row['profit'])
-            display_values.append(row['errors'] if row['errors'] is not None else '')
+    def count_all_trades():
+        return db_manager.count_trades(db_manager.get_default_timezone())
 
-            tree.insert('', tk.END, values=display_values) 
+    def trade_row_values(row):
+        display_values = []
+        display_values.append(row['id'])
+        display_values.append(row['position_id'] if row['position_id'] is not None else '') 
+        display_values.append(row['date'])
+        display_values.append(row['time'])
+        display_values.append(row['symbol'])
+        display_values.append(row['type'] if row['type'] is not None else '') 
+        
+        size_val = row['size']
+        display_values.append(f"{size_val:.2f}" if isinstance(size_val, Decimal) else (''))
+
+        entry_val = row['entry']
+        display_values.append(f"{entry_val:.2f}" if isinstance(entry_val, Decimal) else (''))
+
+        exit_val = row['exit']
+        display_values.append(f"{exit_val:.2f}" if isinstance(exit_val, Decimal) else (''))
+        
+        display_values.append(row['profit'])
+        display_values.append(row['errors'] if row['errors'] is not None else '')
+
+        return display_values
 
     def delete_selected():
-        selected_items = tree.selection()
-        if not selected_items:
+        selected_trade_ids = trades_view.selected_ids()
+        if not selected_trade_ids:
             messagebox.showwarning("هشدار", "هیچ رکوردی انتخاب نشده است.")
             return
         confirm = messagebox.askyesno("تأیید حذف", "آیا از حذف رکوردهای انتخاب‌شده مطمئن هستید؟")
         if confirm:
-            for item in selected_items:
-                trade_id = tree.item(item)['values'][0]
+            for trade_id in selected_trade_ids:
                 if db_manager.delete_trade(trade_id):
                     pass 
                 else:
                     messagebox.showerror("خطا", f"خطا در حذف ترید با شناسه {trade_id} رخ داد.")
+            trades_view.clear_selection()
             load_trades() 
 
     def show_edit_errors_popup(parent_window, selected_trade_ids, current_errors_for_single_trade=None):
@@ -139,15 +146,11 @@ def show_trades_window(root, refresh_main_errors_callback=None, update_main_time
         popup.wait_window(popup)
 
     def edit_selected_errors():
-        selected_items = tree.selection()
-        if not selected_items:
+        # شامل ردیف‌های انتخاب شده‌ای که به خاطر اسکرول دیده نمی‌شوند
+        selected_trade_ids = trades_view.selected_ids()
+        if not selected_trade_ids:
             messagebox.showwarning("هشدار", "هیچ رکوردی انتخاب نشده است.")
             return
-
-        selected_trade_ids = []
-        for item in selected_items:
-            trade_id = tree.item(item)['values'][0]
-            selected_trade_ids.append(trade_id)
         
         if len(selected_trade_ids) == 1:
             trade_id = selected_trade_ids[0]
@@ -280,11 +283,11 @@ def show_trades_window(root, refresh_main_errors_callback=None, update_main_time
 
     # --- تابع جدید برای هندل کردن دابل کلیک ---
     def on_double_click(event):
-        item = tree.selection() # آیتم(های) انتخاب شده رو بگیر
-        if item:
+        selected_ids = trades_view.selected_ids() # ID تریدهای انتخاب شده (حتی ردیف‌های اسکرول شده)
+        if selected_ids:
             # اگر فقط یک آیتم انتخاب شده باشه (دابل کلیک روی یک ردیف)
-            if len(item) == 1:
-                trade_id = tree.item(item[0])['values'][0] # ID ترید رو از ستون اول بگیر
+            if len(selected_ids) == 1:
+                trade_id = selected_ids[0]
                 current_errors = db_manager.get_trade_errors_by_id(trade_id) # خطاهای فعلی ترید رو بگیر
                 show_edit_errors_popup(trades_win, [trade_id], current_errors)
             else:
@@ -318,8 +321,7 @@ def show_trades_window(root, refresh_main_errors_callback=None, update_main_time
     columns = ("id", "position_id", "date", "time", "symbol", "type", "size", "entry", "exit", "profit", "errors") 
     tree = ttk.Treeview(tree_frame, columns=columns, show="headings", selectmode="extended")
 
-    vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
-    tree.configure(yscrollcommand=vsb.set)
+    vsb = ttk.Scrollbar(tree_frame, orient="vertical")
 
     tree.grid(row=0, column=0, sticky="nsew")
     vsb.grid(row=0, column=1, sticky="ns")
@@ -354,6 +356,13 @@ def show_trades_window(root, refresh_main_errors_callback=None, update_main_time
         else:
             tree.column(col, width=80, anchor="center") 
     
+    # مرتب‌سازی با کلیک روی عنوان ستون‌ها در خود SQLite انجام می‌شود
+    trades_view = VirtualTreeview(
+        tree, vsb, fetch_trades_page, count_all_trades, trade_row_values,
+        sort_columns={"id": "id", "position_id": "position_id", "date": "time", "time": "time", "symbol": "symbol",
+                      "type": "type", "size": "size", "entry": "entry", "exit": "exit", "profit": "profit", "errors": "errors"},
+    )
+
     # --- اتصال تابع on_double_click به رویداد دابل کلیک روی Treeview ---
     tree.bind("<Double-1>", on_double_click)
 
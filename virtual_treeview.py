@@ -0,0 +1,236 @@
+# virtual_treeview.py
+
+# بیت‌های event.state در Tk
+_SHIFT_MASK = 0x0001
+_CONTROL_MASK = 0x0004
+
+
+class VirtualTreeview:
+    """
+    یک ttk.Treeview موجود را مجازی می‌کند: فقط ردیف‌های قابل مشاهده در Treeview درج می‌شوند
+    و ردیف‌ها تکه به تکه با صفحه‌بندی keyset از منبع داده خوانده می‌شوند. اسکرول‌بار بر اساس
+    تعداد کل ردیف‌ها تنظیم می‌شود و کلیک روی عنوان ستون‌ها مرتب‌سازی را به منبع داده (SQL) می‌سپارد.
+
+    Args:
+        tree (ttk.Treeview): Treeview با show="headings".
+        scrollbar: اسکرول‌بار عمودی (ttk.Scrollbar یا CTkScrollbar).
+        fetch_page (callable): fetch_page(sort_key, descending, after=None, before=None, offset=0, limit=...)
+                               که لیستی از زوج‌های (کلید صفحه‌بندی, رکورد) به ترتیب نمایش برمی‌گرداند.
+        count_rows (callable): تعداد کل ردیف‌ها را برمی‌گرداند.
+        row_values (callable): مقادیر ستون‌های Treeview برای یک رکورد.
+        sort_columns (dict): {ستون Treeview: کلید مرتب‌سازی منبع داده}؛ ستون‌های دیگر قابل مرتب‌سازی نیستند.
+        default_sort (tuple): (کلید مرتب‌سازی, نزولی)
+        row_id (callable): شناسه یکتای رکورد (برای حفظ انتخاب ردیف‌ها هنگام اسکرول).
+    """
+
+    def __init__(self, tree, scrollbar, fetch_page, count_rows, row_values, sort_columns=None,
+                 default_sort=('time', False), row_id=lambda record: record['id'], chunk_size=200):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fetch_page = fetch_page
+        self.count_rows = count_rows
+        self.row_values = row_values
+        self.sort_columns = sort_columns or {}
+        self.sort_key, self.descending = default_sort
+        self.row_id = row_id
+        self.chunk_size = chunk_size
+
+        self.total_rows = 0
+        self.top = 0 # اندیس اولین ردیف قابل مشاهده
+        self.visible_rows = max(1, int(tree.cget("height")))
+        self._cache_start = 0
+        self._cache = [] # زوج‌های (کلید, رکورد) برای ردیف‌های [_cache_start, _cache_start + len)
+        self._selected_ids = set()
+        self._iid_to_id = {}
+        self._heading_texts = {column: tree.heading(column, "text") for column in self.sort_columns}
+
+        self.scrollbar.configure(command=self.yview)
+        self.tree.configure(yscrollcommand="")
+        for column in self.sort_columns:
+            self.tree.heading(column, command=lambda c=column: self.sort_by_column(c))
+
+        self.tree.bind("<Configure>", self._on_configure, add="+")
+        self.tree.bind("<<TreeviewSelect>>", self._on_select, add="+")
+        self.tree.bind("<Button-1>", self._on_click, add="+")
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self._scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda event: self._scroll_by(3))
+        self.tree.bind("<Up>", lambda event: self._on_arrow_key(event, -1))
+        self.tree.bind("<Down>", lambda event: self._on_arrow_key(event, 1))
+        self.tree.bind("<Prior>", lambda event: self._scroll_by(-self.visible_rows))
+        self.tree.bind("<Next>", lambda event: self._scroll_by(self.visible_rows))
+        self.tree.bind("<Home>", lambda event: self._scroll_to(0))
+        self.tree.bind("<End>", lambda event: self._scroll_to(self.total_rows))
+        self._update_sort_indicator()
+
+    # --- API عمومی ---
+
+    def reload(self, keep_position=True, total_rows=None, first_rows=None):
+        """
+        تعداد ردیف‌ها را دوباره می‌خواند و ردیف‌های قابل مشاهده را از منبع داده بازیابی می‌کند
+        (مثلاً بعد از حذف/ویرایش تریدها یا تغییر فیلترها).
+        Args:
+            total_rows (int, optional): تعداد ردیف‌ها، اگر از قبل (مثلاً در ترد پس‌زمینه) شمرده شده باشد.
+            first_rows (list, optional): اولین صفحه (خروجی fetch_page با مرتب‌سازی فعلی و offset=0) اگر از قبل خوانده شده باشد.
+        """
+        self.total_rows = self.count_rows() if total_rows is None else total_rows
+        self._cache_start, self._cache = 0, list(first_rows or [])
+        if not keep_position:
+            self.top = 0
+            self._selected_ids.clear()
+        self._render()
+
+    def clear_selection(self):
+        self._selected_ids.clear()
+        self.tree.selection_remove(*self.tree.selection())
+
+    def selected_ids(self):
+        """شناسه همه ردیف‌های انتخاب شده، از جمله ردیف‌هایی که به خاطر اسکرول دیده نمی‌شوند."""
+        return list(self._selected_ids)
+
+    def sort_by_column(self, column):
+        sort_key = self.sort_columns[column]
+        if sort_key == self.sort_key:
+            self.descending = not self.descending
+        else:
+            self.sort_key, self.descending = sort_key, False
+        self._update_sort_indicator()
+        self.reload(keep_position=False)
+
+    def yview(self, *args):
+        """پروتکل دستور اسکرول‌بار Tk: ('moveto', fraction) یا ('scroll', n, 'units'|'pages')."""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._scroll_to(int(float(args[1]) * self.total_rows))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            self._scroll_by(amount * self.visible_rows if len(args) > 2 and args[2] == "pages" else amount)
+
+    # --- اسکرول ---
+
+    def _scroll_to(self, top):
+        top = max(0, min(top, self.total_rows - self.visible_rows))
+        if top != self.top:
+            self.top = top
+            self._render()
+        return "break"
+
+    def _scroll_by(self, delta):
+        return self._scroll_to(self.top + delta)
+
+    def _on_mousewheel(self, event):
+        return self._scroll_by(-3 if event.delta > 0 else 3)
+
+    def _on_arrow_key(self, event, direction):
+        # در ردیف اول/آخر صفحه، به جای خروج از صفحه یک ردیف اسکرول می‌شود
+        if not event.state & _SHIFT_MASK:
+            self._forget_hidden_selection()
+        children = self.tree.get_children()
+        if not children:
+            return "break"
+        edge_item = children[-1] if direction > 0 else children[0]
+        if self.tree.focus() != edge_item:
+            return None # رفتار پیش‌فرض Treeview
+        self._scroll_by(direction)
+        children = self.tree.get_children()
+        if children:
+            edge_item = children[-1] if direction > 0 else children[0]
+            self.tree.focus(edge_item)
+            self.tree.selection_set(edge_item)
+        return "break"
+
+    def _on_configure(self, event=None):
+        children = self.tree.get_children()
+        bbox = self.tree.bbox(children[0]) if children else None
+        if not bbox:
+            return
+        _, first_row_y, _, row_height = bbox
+        visible_rows = max(1, (self.tree.winfo_height() - first_row_y) // max(1, row_height))
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self._render()
+
+    # --- داده ---
+
+    def _fetch(self, **kwargs):
+        return self.fetch_page(self.sort_key, self.descending, limit=self.chunk_size, **kwargs)
+
+    def _ensure_rows(self, start, end):
+        """ردیف‌های [start, end) را در کش قرار می‌دهد؛ حرکت‌های کوچک با keyset و پرش‌های بزرگ با offset."""
+        cache_end = self._cache_start + len(self._cache)
+        if not self._cache or start >= cache_end + self.chunk_size or end <= self._cache_start - self.chunk_size:
+            jump_start = max(0, start - self.chunk_size // 4)
+            self._cache_start, self._cache = jump_start, self._fetch(offset=jump_start)
+            cache_end = self._cache_start + len(self._cache)
+
+        while end > cache_end and self._cache:
+            page = self._fetch(after=self._cache[-1][0])
+            if not page:
+                # داده‌ها در این فاصله کم شده‌اند
+                self.total_rows = cache_end
+                break
+            self._cache.extend(page)
+            cache_end += len(page)
+
+        while start < self._cache_start and self._cache:
+            page = self._fetch(before=self._cache[0][0])
+            if not page:
+                self._cache_start = 0
+                break
+            self._cache[:0] = page
+            self._cache_start -= len(page)
+
+        # فقط چند تکه اطراف ناحیه قابل مشاهده نگه داشته می‌شود
+        max_cached_rows = self.chunk_size * 4
+        if len(self._cache) > max_cached_rows:
+            keep_from = max(0, min(start - self._cache_start - self.chunk_size, len(self._cache) - max_cached_rows))
+            self._cache = self._cache[keep_from:keep_from + max_cached_rows]
+            self._cache_start += keep_from
+
+    def _render(self):
+        self.top = max(0, min(self.top, self.total_rows - self.visible_rows))
+        end = min(self.top + self.visible_rows, self.total_rows)
+        if end > self.top:
+            self._ensure_rows(self.top, end)
+
+        self.tree.delete(*self.tree.get_children())
+        self._iid_to_id = {}
+        visible_selection = []
+        first = self.top - self._cache_start
+        for key, record in self._cache[max(0, first):max(0, first) + (end - self.top)]:
+            record_id = self.row_id(record)
+            iid = self.tree.insert("", "end", values=self.row_values(record))
+            self._iid_to_id[iid] = record_id
+            if record_id in self._selected_ids:
+                visible_selection.append(iid)
+        if visible_selection:
+            self.tree.selection_set(visible_selection)
+
+        if self.total_rows > 0:
+            self.scrollbar.set(self.top / self.total_rows, min(1.0, end / self.total_rows))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _on_click(self, event):
+        # کلیک ساده (بدون Shift/Control) انتخاب قبلی را، حتی در ردیف‌های خارج از دید، کنار می‌گذارد
+        if not event.state & (_SHIFT_MASK | _CONTROL_MASK) and self.tree.identify_region(event.x, event.y) in ("cell", "tree"):
+            self._forget_hidden_selection()
+
+    def _forget_hidden_selection(self):
+        # انتخاب ردیف‌های قابل مشاهده را <<TreeviewSelect>> به‌روز می‌کند
+        self._selected_ids.intersection_update(self._iid_to_id.values())
+
+    def _on_select(self, event=None):
+        selected_iids = set(self.tree.selection())
+        for iid, record_id in self._iid_to_id.items():
+            if iid in selected_iids:
+                self._selected_ids.add(record_id)
+            else:
+                self._selected_ids.discard(record_id)
+
+    def _update_sort_indicator(self):
+        for column, text in self._heading_texts.items():
+            if self.sort_columns[column] == self.sort_key:
+                text = f"{text} {'▼' if self.descending else '▲'}"
+            self.tree.heading(column, text=text)